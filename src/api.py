@@ -0,0 +1,335 @@
+"""
+The API
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+from datetime import datetime
+from json import dumps, loads
+from threading import Thread
+from urllib.parse import parse_qs, urlsplit
+from gi.repository.GLib import idle_add
+from helpers import UNSET, ZONE_INSPECTOR_COLUMN_TYPES, getPlaylistNameFromPath
+from delta import applyDelta, getInverseDelta
+from jobs import MODEL
+from tracing import span
+from validator import START_TIME_FORMAT
+
+
+""" A local HTTP/JSON API over the Model, for scripts.
+
+    GET  /state      The Model's contents, as returned by Model.getState.
+    GET  /problems   The problems that would abort an export.
+    GET  /on-air     The zone on air now, or ?at= an ISO 8601 time.
+    GET  /upcoming   The next ?n= zone starts (default 5), from now or ?at=.
+    GET  /jobs       The background jobs (import, export, ...) queued or running.
+    POST /mutations  Apply {"mutations": [[operation, args], ...]}.
+
+Mutations take the form passed to the Model's mutation listeners (see
+Model.applyMutation), so rows are identified by their values. The mutations
+of a request are applied as one transaction, in a single main loop callback:
+if one fails, the Model is restored and none of them is kept. Mutations are
+refused while a background job reads or writes the Model.
+
+The server runs an asyncio loop on its own thread. Everything that touches
+the Model is marshalled onto the GLib main loop, so the GUI stays live and
+consistent. On-air lookups are answered on the server's thread, from the
+OnAirIndex, which is safe to read from any thread.
+"""
+
+# Operations that can be requested. applyMutation must not be given anything else.
+MUTATIONS = {'addZoneToDatabase', 'removeZoneFromDatabase', 'editZoneNameInDatabase',
+             'editZoneInDatabase', 'addPlaylistToDatabase', 'editPlaylistInDatabase',
+             'removePlaylistFromDatabase', 'addZoneToSchedule', 'removeZoneFromSchedule',
+             'editZoneInSchedule', 'addPlaylistToZone', 'removePlaylistFromZone',
+             'editPlaylistInZone'}
+
+# Number of upcoming zone starts returned, unless ?n= is given
+DEFAULT_UPCOMING = 5
+
+# Largest request body accepted
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class ApiError(Exception):
+    """ A request that cannot be served, with the HTTP status to answer. """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ApiServer:
+    """ Serve the API on localhost, on a background thread. """
+
+    def __init__(self, model, view, validator, onAirIndex, jobs, port):
+        self.model = model
+        self.view = view
+        self.validator = validator
+        self.onAirIndex = onAirIndex
+        self.jobs = jobs
+        self.port = port
+        self.loop = None
+        self.stopped = None
+        self.thread = None
+
+
+    # Public methods
+
+    def start(self):
+        """ Start serving. """
+        self.thread = Thread(target=asyncio.run, args=(self.serve(),), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """ Stop serving, if the server is running. """
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+
+    # Private methods
+
+    async def serve(self):
+        """ Accept connections until stopped. """
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        try:
+            server = await asyncio.start_server(self.handleConnection, '127.0.0.1',
+                                                self.port)
+        except OSError as e:
+            print('Failed to start the API server.\n' + str(e))
+            return
+        print('API listening on http://127.0.0.1:' + str(self.port))
+        async with server:
+            await self.stopped.wait()
+
+    async def handleConnection(self, reader, writer):
+        """ Serve the requests of a connection, until the client closes it. """
+        try:
+            while True:
+                requestLine = await reader.readline()
+                if not requestLine:
+                    break
+                keepAlive = True
+                try:
+                    method, path, headers, body = await self.readRequest(requestLine,
+                                                                         reader)
+                    keepAlive = headers.get('connection', '').lower() != 'close'
+                    status, response = 200, await self.handleRequest(method, path, body)
+                except ApiError as e:
+                    status, response = e.status, {'error': str(e)}
+                    # The rest of the request may be unread
+                    keepAlive = keepAlive and e.status not in (400, 413)
+                except Exception as e:
+                    status, response = 500, {'error': str(e)}
+                data = dumps(response, separators=(',', ':')).encode('utf-8')
+                writer.write(('HTTP/1.1 ' + str(status) + ' ' + REASONS[status] + '\r\n' +
+                              'Content-Type: application/json\r\n' +
+                              'Content-Length: ' + str(len(data)) + '\r\n' +
+                              ('' if keepAlive else 'Connection: close\r\n') +
+                              '\r\n').encode('ascii') + data)
+                await writer.drain()
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def readRequest(self, requestLine, reader):
+        """ Return the method, path, headers and body of a request. """
+        try:
+            method, path, _ = requestLine.decode('ascii').split(' ', 2)
+        except ValueError:
+            raise ApiError(400, 'malformed request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            raise ApiError(400, 'malformed Content-Length')
+        if length > MAX_REQUEST_BYTES:
+            raise ApiError(413, 'request body is larger than ' + str(MAX_REQUEST_BYTES) +
+                                ' bytes')
+        body = await reader.readexactly(length) if length > 0 else b''
+        return method, path, headers, body
+
+    async def handleRequest(self, method, target, body):
+        """ Return the response to a request, as a JSON-serializable object. """
+        parts = urlsplit(target)
+        path = parts.path
+        query = parse_qs(parts.query)
+        if path in ('/on-air', '/upcoming'):
+            if method != 'GET':
+                raise ApiError(405, 'use GET')
+            try:
+                moment = (datetime.fromisoformat(query['at'][0]) if 'at' in query
+                          else datetime.now())
+                count = int(query['n'][0]) if 'n' in query else DEFAULT_UPCOMING
+            except ValueError as e:
+                raise ApiError(400, str(e))
+            if path == '/on-air':
+                return {'at': moment.isoformat(), 'zone': self.onAirIndex.zoneAt(moment)}
+            return {'upcoming': [{'start': start.isoformat(), 'zone': zoneName}
+                                 for start, zoneName in
+                                 self.onAirIndex.upcoming(max(0, count), moment)]}
+        if path == '/jobs':
+            if method != 'GET':
+                raise ApiError(405, 'use GET')
+            return {'jobs': [{'name': name, 'status': status}
+                             for name, status in self.jobs.getJobs()]}
+        if path == '/state':
+            if method != 'GET':
+                raise ApiError(405, 'use GET')
+            return await self.callInMainLoop(self.model.getState)
+        if path == '/problems':
+            if method != 'GET':
+                raise ApiError(405, 'use GET')
+            return {'problems': await self.callInMainLoop(self.validator.getProblems)}
+        if path == '/mutations':
+            if method != 'POST':
+                raise ApiError(405, 'use POST')
+            mutations = parseMutations(body)
+            applied = await self.callInMainLoop(self.applyTransaction, mutations)
+            return {'applied': applied}
+        raise ApiError(404, 'no such resource: ' + path)
+
+    async def callInMainLoop(self, function, *args):
+        """ Call function in the GLib main loop and return its result. """
+        future = self.loop.create_future()
+        def setResult(result):
+            if not future.done():
+                future.set_result(result)
+        def setException(exception):
+            if not future.done():
+                future.set_exception(exception)
+        def call():
+            try:
+                result = function(*args)
+            except Exception as e:
+                self.loop.call_soon_threadsafe(setException, e)
+            else:
+                self.loop.call_soon_threadsafe(setResult, result)
+            return False
+        idle_add(call)
+        return await future
+
+    def applyTransaction(self, mutations):
+        """ Apply every mutation, or none of them. Return their number.
+
+        If a mutation fails, the ones applied before it are undone, in reverse
+        order (see delta.getInverseDelta). Runs in the main loop.
+        """
+        if self.jobs.isBusy(MODEL):
+            raise ApiError(409, 'a background job is using the schedule, try again later')
+        # The deltas that undo the mutations applied so far, in order
+        inverseDeltas = []
+        with span('api-transaction', 'api'), self.view.bulkChanges(len(mutations)):
+            for index, (operation, args) in enumerate(mutations):
+                try:
+                    self.checkMutation(operation, args)
+                    inverseDelta = getInverseDelta(self.model, operation, args)
+                    self.model.applyMutation(operation, args)
+                    inverseDeltas.append(inverseDelta)
+                except Exception as e:
+                    for inverseDelta in reversed(inverseDeltas):
+                        applyDelta(self.model, inverseDelta)
+                    self.validator.validateAll()
+                    self.view.queue_draw()
+                    raise ApiError(409, 'mutation ' + str(index) + ' (' + operation +
+                                        ') failed, nothing was applied: ' +
+                                        (str(e) or e.__class__.__name__))
+        self.validator.validateAll()
+        self.view.queue_draw()
+        return len(mutations)
+
+    def checkMutation(self, operation, args):
+        """ Enforce what the GUI enforces before it mutates the Model.
+
+        Raise ValueError if the mutation is not allowed.
+        Settings given as JSON numbers are converted to their column's type.
+        """
+        if operation == 'addZoneToDatabase' and self.model.zoneExistsInDatabase(args[0]):
+            raise ValueError('zone "' + str(args[0]) + '" already exists')
+        if (operation == 'editZoneNameInDatabase' and
+                self.model.zoneExistsInDatabase(args[1])):
+            raise ValueError('zone "' + str(args[1]) + '" already exists')
+        if (operation == 'addPlaylistToDatabase' and
+                self.model.playlistExistsInDatabase(getPlaylistNameFromPath(args[0]))):
+            raise ValueError('playlist of "' + str(args[0]) + '" already exists')
+        if operation == 'editPlaylistInZone' and args[2] >= 2:
+            columnType = ZONE_INSPECTOR_COLUMN_TYPES[args[2]]
+            if columnType is bool and not isinstance(args[3], bool):
+                raise ValueError('value of column ' + str(args[2]) + ' must be a boolean')
+            if columnType is not bool and (isinstance(args[3], bool) or
+                                           not isinstance(args[3], (int, float))):
+                raise ValueError('value of column ' + str(args[2]) + ' must be a number')
+            if columnType is int and args[3] != int(args[3]):
+                raise ValueError('value of column ' + str(args[2]) + ' must be an integer')
+            if args[3] < 0 and args[3] != UNSET:
+                raise ValueError('value of column ' + str(args[2]) +
+                                 ' must not be negative, unless unset (' + str(UNSET) + ')')
+            args[3] = columnType(args[3])
+        if (operation == 'editPlaylistInZone' and args[2] == 0 and
+                not self.model.playlistExistsInDatabase(args[3])):
+            raise ValueError('playlist "' + str(args[3]) + '" does not exist')
+        if operation == 'addZoneToSchedule':
+            self.checkScheduleValue(1, args[1])
+            self.checkScheduleValue(0, args[2])
+        if operation == 'editZoneInSchedule':
+            self.checkScheduleValue(args[2], args[3])
+        if operation == 'addPlaylistToZone':
+            if not self.model.zoneExistsInDatabase(args[0]):
+                raise ValueError('zone "' + str(args[0]) + '" does not exist')
+            if not self.model.playlistExistsInDatabase(args[1][0]):
+                raise ValueError('playlist "' + str(args[1][0]) + '" does not exist')
+
+    def checkScheduleValue(self, column, value):
+        """ Raise ValueError if value can't go in column of a Flow Schedule row. """
+        if column == 1 and not self.model.zoneExistsInDatabase(value):
+            raise ValueError('zone "' + str(value) + '" does not exist')
+        if column == 0 and (not isinstance(value, str) or
+                            START_TIME_FORMAT.match(value) is None):
+            raise ValueError('start time "' + str(value) + '" must be formatted as HH:MM')
+
+
+# Functions
+
+def parseMutations(body):
+    """ Return the mutations of a POST /mutations body. Raise ApiError if malformed. """
+    try:
+        mutations = loads(body.decode('utf-8'))['mutations']
+    except (ValueError, KeyError, TypeError):
+        raise ApiError(400, 'expected a JSON object with a "mutations" list')
+    if not isinstance(mutations, list):
+        raise ApiError(400, '"mutations" must be a list')
+    for index, mutation in enumerate(mutations):
+        if (not isinstance(mutation, list) or len(mutation) != 2 or
+                not isinstance(mutation[1], list)):
+            raise ApiError(400, 'mutation ' + str(index) + ' must be [operation, args]')
+        if mutation[0] not in MUTATIONS:
+            raise ApiError(400, 'mutation ' + str(index) + ': unknown operation ' +
+                                str(mutation[0]))
+    return mutations
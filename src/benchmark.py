@@ -0,0 +1,233 @@
+"""
+Benchmarks
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+""" Time the import, export and Model paths against synthetic schedules of increasing size.
+
+Runs headless: the Model's ListStores need no display. If GTK refuses to load
+without one, run under a virtual display, e.g. `xvfb-run python3 ./src/benchmark.py`.
+
+Results are written as JSON, one entry per size, so that scaling curves can be
+plotted or compared between revisions.
+"""
+
+import gi
+gi.require_version('Gtk', '3.0')
+from argparse import ArgumentParser
+from json import dumps
+from os.path import join
+from platform import python_version
+from random import Random
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from lxml import etree as ET
+
+from helpers import WEEK, XSD_SCHEMA_FALLBACK, getPlaylistNameFromPath
+from controller import Controller
+from model import Model
+from validator import Validator
+
+
+# Number of calls timed for each Model operation, at each size
+MODEL_OPERATION_CALLS = 20
+
+
+# Schedule generator
+
+def generateSchedule(numZones, numPlaylists, occurrencesPerDay, seed=0):
+    """ Return a valid WeekSchedule element.
+
+    It has numZones zones that use numPlaylists playlists,
+    with occurrencesPerDay zone occurrences on each day.
+    """
+    playlistPaths = ['/music/playlists/playlist_' + str(i) + '.m3u'
+                     for i in range(numPlaylists)]
+    zoneNames = ['Zone ' + str(i) for i in range(numZones)]
+    weekElement = ET.Element('WeekSchedule')
+    occurrence = 0
+    for day in WEEK:
+        dayElement = ET.SubElement(weekElement, day[:3])
+        for i in range(occurrencesPerDay):
+            startMinute = i * 1440 // occurrencesPerDay
+            zoneIndex = occurrence % numZones
+            occurrence += 1
+            generateZone(dayElement, zoneNames[zoneIndex], startMinute,
+                         playlistPaths, Random(seed + zoneIndex))
+    return weekElement
+
+def generateZone(dayElement, zoneName, startMinute, playlistPaths, random):
+    """ Add a zone occurrence to dayElement.
+
+    Every occurrence of a zone is identical, as random is seeded per zone.
+    """
+    zoneElement = ET.SubElement(dayElement, 'Zone')
+    zoneElement.set('Name', zoneName)
+    zoneElement.set('Start', str(startMinute // 60).zfill(2) + ':' +
+                             str(startMinute % 60).zfill(2) + ':00')
+    ET.SubElement(zoneElement, 'Maintainer').text = 'Maintainer of ' + zoneName
+    ET.SubElement(zoneElement, 'Description').text = 'Description of ' + zoneName
+    ET.SubElement(zoneElement, 'Comment').text = 'Comment on ' + zoneName
+    playlistTypes = ['Main', 'Fallback'] + ['Intermediate'] * random.randint(0, 4)
+    for playlistType, playlistPath in zip(playlistTypes, random.sample(
+                                          playlistPaths, min(len(playlistTypes),
+                                                             len(playlistPaths)))):
+        playlistElement = ET.SubElement(zoneElement, playlistType)
+        if playlistType == 'Intermediate':
+            playlistElement.set('Name', getPlaylistNameFromPath(playlistPath))
+        ET.SubElement(playlistElement, 'Path').text = playlistPath
+        ET.SubElement(playlistElement, 'Shuffle').text = random.choice(['true', 'false'])
+        faderElement = ET.SubElement(playlistElement, 'Fader')
+        ET.SubElement(faderElement, 'FadeInDurationSecs').text = str(random.randint(0, 10))
+        ET.SubElement(faderElement, 'FadeOutDurationSecs').text = str(random.randint(0, 10))
+        ET.SubElement(faderElement, 'MinLevel').text = '0.0'
+        ET.SubElement(faderElement, 'MaxLevel').text = '1.0'
+        if playlistType == 'Intermediate':
+            ET.SubElement(playlistElement, 'SchedIntervalMins').text =\
+                str(random.randint(10, 90))
+            ET.SubElement(playlistElement, 'NumSchedItems').text = str(random.randint(1, 3))
+
+def writeSchedule(weekElement, path):
+    """ Write the generated schedule to path. """
+    ET.ElementTree(weekElement).write(path, encoding='UTF-8', xml_declaration=True,
+                                      pretty_print=True)
+
+
+# Benchmarks
+
+def timeCall(function, repeat):
+    """ Call function repeat times and return the fastest run, in seconds. """
+    best = None
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        elapsed = perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def importIntoNewModel(xml, xmlPath, validate=False):
+    """ Import the schedule in xmlPath into a fresh Model. Return the Model.
+
+    If validate, the document is checked against the schema first, as Import does.
+    """
+    model = Model()
+    xml.model = model
+    xml.validator.model = model
+    root = xml.parseXML(xmlPath).getroot()
+    if validate:
+        xml.xmlSchema.assertValid(root)
+    xml.importDocument(root)
+    return model
+
+def benchmarkSize(numZones, numPlaylists, occurrencesPerDay, repeat, directory):
+    """ Run every benchmark against a schedule of the given size.
+
+    Return a dictionary of timings in seconds. Model operations are timed
+    per call, averaged over up to MODEL_OPERATION_CALLS calls.
+    """
+    xmlPath = join(directory, 'schedule.xml')
+    writeSchedule(generateSchedule(numZones, numPlaylists, occurrencesPerDay), xmlPath)
+    xml = Controller.XML(None, None, Validator(None))
+    xml.xmlSchema = ET.XMLSchema(ET.fromstring(XSD_SCHEMA_FALLBACK.encode('utf-8')))
+    timings = {}
+
+    # What Import does, without its job, its progress bar's pauses and the views
+    timings['importXML'] = timeCall(lambda: importIntoNewModel(xml, xmlPath, True), repeat)
+    timings['importSchedule'] = timeCall(lambda: importIntoNewModel(xml, xmlPath), repeat)
+    model = importIntoNewModel(xml, xmlPath)
+    timings['validateAll'] = timeCall(xml.validator.validateAll, repeat)
+
+    def exportXML():
+        weekElement = xml.exportSchedule(model.getSnapshot())
+        xml.xmlSchema.assertValid(weekElement)
+        xml.writeXML(weekElement, join(directory, 'export.xml'))
+    timings['exportXML'] = timeCall(exportXML, repeat)
+
+    def exportCompactXML():
+        libraryElement = xml.exportLibrary(model.getSnapshot())
+        xml.assertValid(libraryElement)
+        xml.writeXML(libraryElement, join(directory, 'export.compact.xml'))
+    timings['exportCompactXML'] = timeCall(exportCompactXML, repeat)
+
+    zoneNames = [zone[0] for zone in model.zones]
+    playlistNames = [playlist[0] for playlist in model.playlists]
+    calls = min(MODEL_OPERATION_CALLS, len(zoneNames), len(playlistNames))
+
+    def lookUpCompletions():
+        for zoneName, playlistName in zip(zoneNames[-calls:], playlistNames[-calls:]):
+            model.zoneExistsInDatabase(zoneName)
+            model.playlistExistsInDatabase(playlistName)
+    timings['completionLookups'] = timeCall(lookUpCompletions, repeat) / calls
+
+    def editZoneNames():
+        for zoneName in zoneNames[:calls]:
+            model.editZoneNameInDatabase(zoneName, zoneName + ' (renamed)')
+        for zoneName in zoneNames[:calls]:
+            model.editZoneNameInDatabase(zoneName + ' (renamed)', zoneName)
+    timings['editZoneNameInDatabase'] = timeCall(editZoneNames, repeat) / (2 * calls)
+
+    start = perf_counter()
+    for zoneName in zoneNames[:calls]:
+        model.removeZoneFromDatabase(model.getZoneRow(zoneName))
+    timings['removeZoneFromDatabase'] = (perf_counter() - start) / calls
+
+    start = perf_counter()
+    for playlistName in playlistNames[:calls]:
+        model.removePlaylistFromDatabase(model.getPlaylistRow(playlistName))
+    timings['removePlaylistFromDatabase'] = (perf_counter() - start) / calls
+
+    return timings
+
+def main():
+    argumentParser = ArgumentParser(description='Benchmark flow-dashboard against '
+                                                'synthetic schedules of increasing size.')
+    argumentParser.add_argument('--zones', default='25,50,100,200,400',
+                                help='comma-separated numbers of zones, one run per number')
+    argumentParser.add_argument('--playlists-per-zone', type=float, default=1.0,
+                                help='number of playlists relative to number of zones')
+    argumentParser.add_argument('--occurrences', type=int, default=0,
+                                help='zone occurrences per day (default: one per zone, '
+                                     'at most 96)')
+    argumentParser.add_argument('--repeat', type=int, default=3,
+                                help='runs per benchmark; the fastest one is reported')
+    argumentParser.add_argument('--output', help='write results to this file, '
+                                                 'instead of the standard output')
+    arguments = argumentParser.parse_args()
+
+    results = []
+    with TemporaryDirectory() as directory:
+        for numZones in (int(n) for n in arguments.zones.split(',')):
+            numPlaylists = max(6, int(numZones * arguments.playlists_per_zone))
+            occurrencesPerDay = arguments.occurrences or min(numZones, 96)
+            timings = benchmarkSize(numZones, numPlaylists, occurrencesPerDay,
+                                    arguments.repeat, directory)
+            results.append({'zones': numZones, 'playlists': numPlaylists,
+                            'occurrencesPerDay': occurrencesPerDay,
+                            'timingsSecs': timings})
+
+    report = dumps({'python': python_version(), 'repeat': arguments.repeat,
+                    'results': results}, indent=2)
+    if arguments.output:
+        with open(arguments.output, 'w') as outputFile:
+            outputFile.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
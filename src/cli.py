@@ -0,0 +1,219 @@
+"""
+Command line interface
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+""" Query a schedule without the GUI.
+
+The schedule is read from an XML file (week or compact schedule) given with
+--file, or else from the session that the GUI autosaves. Runs headless: the
+Model's ListStores need no display.
+"""
+
+import gi
+gi.require_version('Gtk', '3.0')
+from argparse import ArgumentParser
+from datetime import datetime
+from sys import exit
+
+from helpers import SESSION_DIR, SIMULATION_ITEM_MINS, PLAY_LOG_CACHE_DIR, HISTORY_DIR
+from model import Model
+from onair import OnAirIndex
+
+
+# Functions
+
+def loadModel(path, sessionDirectory=SESSION_DIR):
+    """ Return a Model of the schedule in the XML file in path or, if path is None,
+    of the session in sessionDirectory.
+    """
+    model = Model()
+    if path is not None:
+        from controller import Controller
+        xml = Controller.XML(model, None, None)
+        xml.importDocument(xml.parseXML(path).getroot())
+    else:
+        from journal import Journal
+        # Recovery only reads the session, so the GUI may keep running
+        Journal(model, sessionDirectory).recover()
+    return model
+
+def parseMoment(text):
+    """ Return the datetime of an ISO 8601 text, or now if text is None. """
+    return datetime.now() if text is None else datetime.fromisoformat(text)
+
+def printOnAir(onAirIndex, arguments):
+    moment = parseMoment(arguments.at)
+    zoneName = onAirIndex.zoneAt(moment)
+    if zoneName is None:
+        print('The schedule is empty.')
+        return 1
+    print(zoneName)
+    return 0
+
+def printUpcoming(onAirIndex, arguments):
+    for start, zoneName in onAirIndex.upcoming(arguments.n, parseMoment(arguments.at)):
+        print(start.strftime('%a %Y-%m-%d %H:%M') + '  ' + zoneName)
+    return 0
+
+def printSimulation(onAirIndex, arguments):
+    try:
+        from simulation import formatReport, simulateWeek
+    except ImportError:
+        print('The simulation needs NumPy.')
+        return 1
+    variant = {}
+    for whatIf in arguments.what_if:
+        try:
+            target, _, settings = whatIf.rpartition('=')
+            zoneName, _, playlistName = target.rpartition('/')
+            interval, numItems = (int(setting) for setting in settings.split(','))
+        except ValueError:
+            raise ValueError('Malformed --what-if: ' + whatIf)
+        variant[(zoneName or None, playlistName)] = (interval, numItems)
+    simulation = simulateWeek(onAirIndex.model.getState(), [variant] if variant else [],
+                              arguments.item_mins)
+    print(formatReport(simulation))
+    if variant:
+        print('\nWhat if:\n' + formatReport(simulation, 1))
+    return 0
+
+def printAirtime(onAirIndex, arguments):
+    from playlog import PlayLogs, formatTotals
+    playLogs = PlayLogs(arguments.cache)
+    playLogs.load(arguments.logs)
+    totals = playLogs.total(onAirIndex.model.getSnapshot())
+    print('Zones:')
+    for zoneName in sorted(totals.zoneSecs):
+        unplannedTracks = totals.unplannedTracks.get(zoneName, 0)
+        print('  ' + zoneName + '  ' +
+              formatTotals(totals.zoneSecs[zoneName], totals.zoneTracks[zoneName]) +
+              (' (' + str(unplannedTracks) + ' unplanned)' if unplannedTracks > 0 else ''))
+    print('Playlists:')
+    for playlistName in sorted(totals.playlistSecs):
+        print('  ' + playlistName + '  ' +
+              formatTotals(totals.playlistSecs[playlistName],
+                           totals.playlistTracks[playlistName]))
+    return 0
+
+def printHistory(onAirIndex, arguments):
+    from history import History
+    history = History(arguments.history)
+    for path in arguments.add:
+        from os.path import getmtime
+        fileModel = loadModel(path)
+        versionId = history.record(fileModel.getSnapshot(), path,
+                                   datetime.fromtimestamp(getmtime(path)))
+        print('Recorded ' + path + ' as ' + versionId[:12])
+    if arguments.add:
+        return 0
+    if arguments.zone is not None:
+        for change in history.getZoneHistory(arguments.zone):
+            print(change['time'] + '  ' + change['version'][:12] + '  ' + change['change'])
+        return 0
+    for version in history.getVersions():
+        print(version['time'] + '  ' + version['version'][:12] + '  ' +
+              str(version['changes']).rjust(4) + ' zone changes  ' + version['label'])
+    return 0
+
+def printMemory(onAirIndex, arguments):
+    from memory import MemoryDiff, formatDiff, formatReport, getMemoryReport, getTreeSize
+    from usage import UsageIndex
+    model = onAirIndex.model
+    extras = [('On-air index', onAirIndex), ('Usage index', UsageIndex(model))]
+    report = getMemoryReport(model, extras)
+    if arguments.file is None:
+        print(formatReport(report))
+        return 0
+    # Import and export the file again, to see how they grow memory
+    from controller import Controller
+    with MemoryDiff('import') as importDiff:
+        xml = Controller.XML(Model(), None, None)
+        tree = xml.parseXML(arguments.file)
+        xml.importDocument(tree.getroot())
+    report.append(('Parsed XML tree', *getTreeSize(tree.getroot())))
+    del tree
+    with MemoryDiff('export') as exportDiff:
+        xml.serializeXML(xml.exportSchedule(xml.model.getSnapshot()))
+    print(formatReport(report))
+    print()
+    print(formatDiff(importDiff.record))
+    print(formatDiff(exportDiff.record))
+    return 0
+
+def main():
+    argumentParser = ArgumentParser(description='Query a flow-dashboard schedule.')
+    source = argumentParser.add_mutually_exclusive_group()
+    source.add_argument('--file', help='read the schedule from this XML file')
+    source.add_argument('--session', default=SESSION_DIR,
+                        help='read the schedule from this session directory '
+                             '(default: %(default)s)')
+    commands = argumentParser.add_subparsers(dest='command', required=True)
+    onAirParser = commands.add_parser('on-air', help='print the zone on air')
+    onAirParser.add_argument('--at', help='ISO 8601 time (default: now)')
+    onAirParser.set_defaults(function=printOnAir)
+    upcomingParser = commands.add_parser('upcoming', help='print the next zone starts')
+    upcomingParser.add_argument('-n', type=int, default=5,
+                                help='number of zone starts (default: %(default)s)')
+    upcomingParser.add_argument('--at', help='ISO 8601 time (default: now)')
+    upcomingParser.set_defaults(function=printUpcoming)
+    simulateParser = commands.add_parser('simulate', help='print the inserts and airtime '
+                                                          'of a simulated week')
+    simulateParser.add_argument('--item-mins', type=float, default=SIMULATION_ITEM_MINS,
+                                help='assumed length of an inserted item '
+                                     '(default: %(default)s)')
+    simulateParser.add_argument('--what-if', action='append', default=[],
+                                metavar='[ZONE/]PLAYLIST=INTERVAL,ITEMS',
+                                help='also simulate other Intermediate settings '
+                                     '(repeatable; without ZONE, in every zone)')
+    simulateParser.set_defaults(function=printSimulation)
+    airtimeParser = commands.add_parser('airtime', help='print the airtime and tracks of '
+                                                        'each zone and playlist in play logs')
+    airtimeParser.add_argument('logs', nargs='+', metavar='LOG',
+                               help='play log (plain, gzip or xz compressed)')
+    airtimeParser.add_argument('--cache', default=PLAY_LOG_CACHE_DIR,
+                               help='where the reductions of the logs are cached '
+                                    '(default: %(default)s)')
+    airtimeParser.set_defaults(function=printAirtime)
+    historyParser = commands.add_parser('history', help='print the recorded weeks, '
+                                                        'or the changes of a zone')
+    historyParser.add_argument('--history', default=HISTORY_DIR,
+                               help='history directory (default: %(default)s)')
+    historyParser.add_argument('--zone', help='print the changes of this zone')
+    historyParser.add_argument('--add', nargs='+', default=[], metavar='XML',
+                               help='record these exported files, oldest first')
+    historyParser.set_defaults(function=printHistory)
+    memoryParser = commands.add_parser('memory', help='print the estimated memory of the '
+                                                      'schedule, and with --file, how '
+                                                      'importing and exporting it grow memory')
+    memoryParser.set_defaults(function=printMemory)
+    arguments = argumentParser.parse_args()
+
+    try:
+        onAirIndex = OnAirIndex(loadModel(arguments.file, arguments.session))
+    except Exception as e:
+        print('Failed to load the schedule.\n' + str(e))
+        return 1
+    try:
+        return arguments.function(onAirIndex, arguments)
+    except (ValueError, OSError) as e:
+        print(e)
+        return 2
+
+
+if __name__ == '__main__':
+    exit(main())
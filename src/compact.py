@@ -0,0 +1,131 @@
+"""
+Compact schedules
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+""" The compact schedule format, and its expansion to the Audio Scheduler format.
+
+In a WeekSchedule, every occurrence of a zone repeats the zone's whole
+definition. In a compact schedule, each zone is defined once, in a library,
+and the days only refer to it:
+
+    <FlowSchedule>
+        <Zones>
+            <Zone Name="Morning"> ...as in a WeekSchedule, without Start... </Zone>
+        </Zones>
+        <Week>
+            <Mon><Occurrence Zone="Morning" Start="08:00:00"/></Mon>
+            ...
+        </Week>
+    </FlowSchedule>
+
+Expanding it copies each zone's element once per occurrence, which is much
+faster than building the element again. It can also be run from the command
+line: `python3 src/compact.py <compact schedule> <output WeekSchedule>`.
+"""
+
+from copy import deepcopy
+from re import compile as compileRegex
+from sys import argv, exit
+from lxml import etree as ET
+from helpers import WEEK, LIBRARY_TAG, openScheduleFile, compressingWriter
+
+
+START_FORMAT = compileRegex(r'^([01][0-9]|2[0-3]):[0-5][0-9]:[0-5][0-9]$')
+
+
+# Functions
+
+def getZoneElements(libraryElement):
+    """ Return a dictionary of the library's zone elements, by zone name. """
+    zonesElement = libraryElement.find('Zones')
+    if zonesElement is None:
+        return {}
+    return {zoneElement.get('Name'): zoneElement for zoneElement in zonesElement}
+
+def getOccurrenceElements(libraryElement, dayIndex):
+    """ Return the occurrence elements of the day that corresponds to dayIndex. """
+    dayElement = libraryElement.find('Week/' + WEEK[dayIndex][:3])
+    if dayElement is None:
+        return []
+    return list(dayElement)
+
+def expandLibrary(libraryElement):
+    """ Return the WeekSchedule element that libraryElement stands for. """
+    zoneElements = getZoneElements(libraryElement)
+    weekElement = ET.Element('WeekSchedule')
+    for dayIndex, day in enumerate(WEEK):
+        dayElement = ET.SubElement(weekElement, day[:3])
+        for occurrenceElement in getOccurrenceElements(libraryElement, dayIndex):
+            zoneElement = deepcopy(zoneElements[occurrenceElement.get('Zone')])
+            zoneElement.set('Start', occurrenceElement.get('Start'))
+            dayElement.append(zoneElement)
+    return weekElement
+
+def assertValidLibrary(libraryElement, xmlSchema):
+    """ Check libraryElement against the WeekSchedule xmlSchema, without expanding it.
+
+    Each zone is validated once, as if it occurred at midnight. Zone names must
+    be unique, and every day, like a WeekSchedule's, must have an occurrence.
+    Raise an exception that describes the first problem found.
+    """
+    zoneElements = getZoneElements(libraryElement)
+    zonesElement = libraryElement.find('Zones')
+    if zonesElement is not None and len(zonesElement) != len(zoneElements):
+        zoneNames = set()
+        for zoneElement in zonesElement:
+            zoneName = zoneElement.get('Name')
+            if zoneName in zoneNames:
+                raise ValueError('Zone "' + str(zoneName) + '" is defined more than once')
+            zoneNames.add(zoneName)
+    for zoneName, zoneElement in zoneElements.items():
+        zoneElement = deepcopy(zoneElement)
+        zoneElement.set('Start', '00:00:00')
+        try:
+            xmlSchema.assertValid(zoneElement)
+        except ET.DocumentInvalid as e:
+            raise ValueError('Zone "' + str(zoneName) + '": ' + str(e))
+    for dayIndex in range(7):
+        occurrenceElements = getOccurrenceElements(libraryElement, dayIndex)
+        if not occurrenceElements:
+            raise ValueError(WEEK[dayIndex] + ': a day must have at least one zone')
+        for occurrenceElement in occurrenceElements:
+            zoneName = occurrenceElement.get('Zone')
+            start = occurrenceElement.get('Start')
+            if zoneName not in zoneElements:
+                raise ValueError(WEEK[dayIndex] + ': zone "' + str(zoneName) +
+                                 '" is not defined')
+            if start is None or START_FORMAT.match(start) is None:
+                raise ValueError(WEEK[dayIndex] + ', zone "' + zoneName +
+                                 '": start time must be formatted as HH:MM:SS')
+
+def main():
+    if len(argv) != 3:
+        print('Usage: compact.py <compact schedule> <output WeekSchedule>')
+        exit(2)
+    with openScheduleFile(argv[1]) as libraryFile:
+        libraryElement = ET.parse(libraryFile, ET.XMLParser(remove_comments=True)).getroot()
+    if libraryElement.tag != LIBRARY_TAG:
+        print(argv[1] + ' is not a compact schedule.')
+        exit(1)
+    with open(argv[2], 'wb') as outputFile, compressingWriter(argv[2], outputFile) as writer:
+        ET.ElementTree(expandLibrary(libraryElement)).write(
+            writer, encoding='UTF-8', xml_declaration=True, pretty_print=True)
+
+
+if __name__ == '__main__':
+    main()
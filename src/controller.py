@@ -20,19 +20,54 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository.Gtk import Application, Builder, Entry, MessageType, ResponseType,\
-                              EntryCompletion
+                              EntryCompletion, TreeModelSort
 from gi.repository.Gio import SimpleAction
-from gi.repository.GLib import idle_add
-from lxml import etree as ET
-from xml.dom.minidom import parseString
-from urllib.request import urlopen
-from threading import Thread
-from time import sleep
+from gi.repository.GLib import idle_add, timeout_add_seconds
+from time import perf_counter, sleep
 
 from helpers import Playlist, getPlaylistNameFromPath, addPlaylistToZone,\
-                    MENU, XSD_SCHEMA_URL, XSD_SCHEMA_FALLBACK, WEEK, APP_TITLE, getHoursModel
+                    MENU, XSD_SCHEMA_URL, XSD_SCHEMA_FALLBACK, WEEK, APP_TITLE, getHoursModel,\
+                    INVALID_CELL_COLOR, SESSION_DIR, AUTOSAVE_INTERVAL_SECS, MEASURE_STARTUP,\
+                    parseSetting, formatSetting, LIBRARY_TAG, PUBLISH_TARGETS, PUBLISH_FILE_NAME,\
+                    API_PORT, openScheduleFile, JOB_WORKERS, HISTORY_DIR, SIGNAL_STATS,\
+                    LARGE_DATASET_ROWS, tracked
 from view import View
 from model import Model
+from validator import Validator
+from journal import Journal
+from delta import REPLACE, diffStates, applyDelta
+from reloader import Reloader
+from onair import OnAirIndex
+from usage import UsageIndex
+from jobs import JobScheduler, MODEL, QUEUED
+from tracing import span, traced, instant
+
+
+# Number of validation problems listed in a message popup
+MAX_REPORTED_PROBLEMS = 10
+
+# lxml's etree. It is slow to import, so it is imported on first use (see importLxml).
+ET = None
+
+def importLxml():
+    """ Import lxml's etree, unless it is already imported. """
+    global ET
+    if ET is None:
+        from lxml import etree
+        ET = etree
+
+def indentXML(rootElement):
+    """ Indent the elements of rootElement with tabs, as exports have always been. """
+    ET.indent(rootElement, space='\t')
+
+def formatProblems(problems):
+    """ Return the first MAX_REPORTED_PROBLEMS of problems, one per line,
+    and how many more there are.
+    """
+    text = '\n'.join(problems[:MAX_REPORTED_PROBLEMS])
+    if len(problems) > MAX_REPORTED_PROBLEMS:
+        text += '\n\u2026 and ' + str(len(problems) - MAX_REPORTED_PROBLEMS) + ' more'
+    return text
 
 
 class Controller(Application):
@@ -45,8 +80,10 @@ class Controller(Application):
     whenever the model changes.
     """
 
-    def __init__(self):
+    def __init__(self, startupTime=None):
+        """ startupTime is the perf_counter value at which the app started. """
         super().__init__()
+        self.startupTime = startupTime
 
     def do_startup(self):
         """ Perform startup operations.
@@ -70,10 +107,61 @@ class Controller(Application):
         # multiple models or views cannot exist.
         self.view = View(application=self, title=APP_TITLE)
         self.model = Model()
+        self.validator = Validator(self.model)
+
+        # Run imports, exports and other long work in the background, one Model job at a time
+        self.jobs = JobScheduler(JOB_WORKERS)
+
+        # Recover the previous session and record every edit from now on.
+        # Jobs mutate the Model off the main loop, so autosave does not compact under them.
+        self.journal = Journal(self.model, SESSION_DIR, lambda: self.jobs.isBusy(MODEL))
+        recoveredRecords = self.journal.recover()
+        try:
+            self.journal.open()
+        except OSError as e:
+            print('Failed to open the edit journal. Edits will not be autosaved.\n' +
+                  str(e))
+        else:
+            self.model.addMutationListener(self.journal.record)
+            timeout_add_seconds(AUTOSAVE_INTERVAL_SECS, self.journal.autosave)
+        if recoveredRecords > 0:
+            print('Recovered previous session (' + str(recoveredRecords) + ' edits).')
+        self.validator.validateAll()
+
+        # Know which playlists are used where, for the Playlists pane
+        self.usageIndex = UsageIndex(self.model)
+        self.usageIndex.addChangeListener(self.onUsageChanged)
 
         # Pass view all the callbacks, to assign each one to the appropriate GUI object.
-        self.view.setCallbacks(self.Callbacks(self.model, self.view, self.XML(
-                                              self.model, self.view)))
+        xml = self.XML(self.model, self.view, self.validator)
+        xml.jobs = self.jobs
+        self.callbacks = self.Callbacks(self.model, self.view, self.validator, xml,
+                                        self.usageIndex, self.jobs)
+        # Count the signals and redraws of each user operation, if asked to
+        self.signalStats = None
+        if SIGNAL_STATS:
+            from signalstats import SignalStats
+            self.signalStats = SignalStats(self.jobs)
+            self.callbacks.signalStats = self.signalStats
+            self.view.setCallbacks(self.signalStats.instrumentCallbacks(self.callbacks))
+        else:
+            self.view.setCallbacks(self.callbacks)
+        self.model.subscribe(self.callbacks.onModelChanged)
+
+        # Reload the imported (or exported) file whenever it changes on disk
+        self.reloader = Reloader(self.model, self.view, self.validator, xml, self.jobs)
+        xml.reloader = self.reloader
+
+        # Know what is on air at any time, for the API
+        self.onAirIndex = OnAirIndex(self.model)
+
+        # Let local scripts read and edit the Model
+        self.apiServer = None
+        if API_PORT is not None:
+            from api import ApiServer
+            self.apiServer = ApiServer(self.model, self.view, self.validator, self.onAirIndex,
+                                       self.jobs, int(API_PORT))
+            self.apiServer.start()
 
         # Initialize the GUI
         self.view.initGUI()
@@ -84,16 +172,47 @@ class Controller(Application):
         self.view.playlists.set_model(self.model.playlists)
         for dayIndex in range(7):
             self.view.schedule[dayIndex].set_model(self.model.schedule[dayIndex])
+        if self.signalStats is not None:
+            self.signalStats.instrumentStore('Zones', self.model.zones)
+            self.signalStats.instrumentView('Zones', self.view.zones)
+            self.signalStats.instrumentStore('Playlists', self.model.playlists)
+            self.signalStats.instrumentView('Playlists', self.view.playlists)
+            for dayIndex in range(7):
+                self.signalStats.instrumentStore(WEEK[dayIndex],
+                                                 self.model.schedule[dayIndex])
+                self.signalStats.instrumentView(WEEK[dayIndex], self.view.schedule[dayIndex])
+        # A recovered session may already be large
+        self.callbacks.updateLargeDatasetMode()
 
         # Set app title and logo in gnome's top bar
         self.view.set_wmclass('Flow Dashboard', 'Flow Dashboard')
         self.view.set_icon_from_file('src/resources/logo.png')
 
-        # Make the GUI visible
+        # Make the GUI visible.
+        # Zone Inspector's view is built (and shown) once a zone is selected.
         self.view.show_all()
+        self.firstFrameHandler = self.view.connect_after('draw', self.onFirstFrameDrawn)
+
+    def onFirstFrameDrawn(self, widget, context):
+        """ Report the time it took to draw the first frame.
 
-        # Zone Inspector is set initially invisible, until a zone is selected
-        self.view.zoneInspector.hide()
+        In startup measurement mode, quit right after reporting it.
+        """
+        self.view.disconnect(self.firstFrameHandler)
+        instant('first-frame', 'startup')
+        if self.startupTime is not None and MEASURE_STARTUP:
+            print('Time to first frame: ' +
+                  str(round((perf_counter() - self.startupTime) * 1000)) + ' ms')
+            idle_add(self.quit)
+        return False
+
+    def onUsageChanged(self):
+        """ Refilter the Playlists pane, if it is filtered, and redraw its usage column.
+
+        Called in the main loop, once per batch of Model changes.
+        """
+        self.callbacks.refilterPlaylists()
+        self.view.playlists.queue_draw()
 
     def do_activate(self):
         """ Perform activation operations.
@@ -104,6 +223,19 @@ class Controller(Application):
         # Give app the keyboard focus
         self.view.present()
 
+    def do_shutdown(self):
+        """ Perform shutdown operations.
+
+        Called once, when the application is about to exit.
+        """
+        self.reloader.stop()
+        if self.apiServer is not None:
+            self.apiServer.stop()
+        self.jobs.shutdown()
+        if self.journal.isRecording():
+            self.journal.close()
+        Application.do_shutdown(self)
+
     def on_quit(self, action, param):
         """ Perform cleanup operations.
 
@@ -121,11 +253,24 @@ class Controller(Application):
         to fulfill the request that corresponds to that action.
         """
 
-        def __init__(self, model, view, xml):
+        def __init__(self, model, view, validator, xml, usageIndex, jobs):
             self.model = model
             self.view = view
+            self.validator = validator
             self.xml = xml
+            self.usageIndex = usageIndex
+            self.jobs = jobs
+            # The filter of the Playlists pane, while only unused playlists are shown
+            self.playlistFilter = None
             self.progressBarWindow = None
+            # Created on first publish
+            self.publisher = None
+            # Counts the signals and redraws of each operation, if set (see signalstats.py)
+            self.signalStats = None
+            # Created on first play log import (see playlog.py)
+            self.playLogs = None
+            # The job that totals the play logs against the Model, while it waits to run
+            self.playLogTotalsJob = None
 
         def onAddZoneButtonClicked(self, button):
             """
@@ -147,6 +292,9 @@ class Controller(Application):
                         # Αdd it and try to load it with the default playlists.
                         self.model.addZoneToDatabase(zoneName)
                         self.model.attemptToAddDefaultPlaylistsToZone(zoneName)
+                        self.validator.validateZone(zoneName)
+                        self.validator.validateInvalidDays()
+                        self.view.queue_draw()
                         break
                     else:
                         # Zone already exists in database.
@@ -167,7 +315,12 @@ class Controller(Application):
             # If no Zones row is selected, nothing happens.
             rowToRemove = self.view.zones.get_selection().get_selected()[1]
             if rowToRemove is not None:
+                zoneName = self.model.zones[rowToRemove][0]
                 self.model.removeZoneFromDatabase(rowToRemove)
+                self.validator.forgetZone(zoneName)
+                for dayIndex in range(7):
+                    self.validator.validateDay(dayIndex)
+                self.view.queue_draw()
 
         def onAddPlaylistButtonClicked(self, button):
             """
@@ -188,6 +341,8 @@ class Controller(Application):
                     playlistName = getPlaylistNameFromPath(playlistPath)
                     if not self.model.playlistExistsInDatabase(playlistName):
                         self.model.addPlaylistToDatabase(playlistPath)
+                self.validator.validateInvalidZones()
+                self.view.queue_draw()
             addPlaylistDialog.destroy()
 
         def onRemovePlaylistButtonClicked(self, button):
@@ -198,9 +353,12 @@ class Controller(Application):
             """
             # Remove the selected Playlists row.
             # If no Playlists row is selected, nothing happens.
-            rowToRemove = self.view.playlists.get_selection().get_selected()[1]
+            rowToRemove = self.getSelectedPlaylistRow()
             if rowToRemove is not None:
                 self.model.removePlaylistFromDatabase(rowToRemove)
+                for zone in self.model.zones:
+                    self.validator.validateZone(zone[0])
+                self.view.queue_draw()
 
         def onAddZoneToScheduleButtonClicked(self, button):
             """ Add selected zone to the selected day of the Flow Schedule.
@@ -217,6 +375,7 @@ class Controller(Application):
                            ][0]
                 selectedDayIndex = self.view.scheduleNotebook.get_current_page()
                 self.model.addZoneToSchedule(selectedDayIndex, zoneName)
+                self.validator.validateDay(selectedDayIndex)
 
         def onRemoveZoneFromScheduleButtonClicked(self, button):
             """ Remove selected occurrence of a zone in the Flow Schedule.
@@ -231,6 +390,8 @@ class Controller(Application):
                           selectedDayIndex].get_selection().get_selected()[1]
             if rowToRemove is not None:
                 self.model.removeZoneFromSchedule(selectedDayIndex, rowToRemove)
+                self.validator.validateDay(selectedDayIndex)
+                self.view.queue_draw()
 
         def onAddPlaylistToZoneButtonClicked(self, button):
             """ Add selected playlist to selected zone.
@@ -240,15 +401,15 @@ class Controller(Application):
             """
             # Add the selected Playlist to Zone Inspector.
             # If no Playlist row is selected, nothing happens.
-            playlistToAdd = self.view.playlists.get_selection().get_selected()[1]
+            playlistToAdd = self.getSelectedPlaylistRow()
             if playlistToAdd is not None:
-                playlistName = self.model.playlists[
-                               self.view.playlists.get_selection().get_selected()[1]
-                               ][0]
+                playlistName = self.model.playlists[playlistToAdd][0]
                 zoneName = self.model.zones[
                            self.view.zones.get_selection().get_selected()[1]
                            ][0]
                 addPlaylistToZone(playlistName, zoneName, self.model)
+                self.validator.validateZone(zoneName)
+                self.view.queue_draw()
 
         def onRemovePlaylistFromZoneButtonClicked(self, button):
             """ Remove selected playlist from selected zone.
@@ -264,6 +425,8 @@ class Controller(Application):
                            self.view.zones.get_selection().get_selected()[1]
                            ][0]
                 self.model.removePlaylistFromZone(zoneName, rowToRemove)
+                self.validator.validateZone(zoneName)
+                self.view.queue_draw()
 
         def onScheduleRowEditingStarted(self, renderer, editable, path, column):
             """ Activate autocompletion in the Flow Schedule cell that is being edited.
@@ -285,7 +448,7 @@ class Controller(Application):
             """
             if column != 1:
                 # Update the model accordingly.
-                self.model.schedule[dayIndex][path][column] = newString
+                self.model.editZoneInSchedule(dayIndex, path, column, newString)
             elif not self.model.zoneExistsInDatabase(newString):
                 # New zone does not exist in database. Notify the user.
                 self.view.dialogs.MessagePopup(self.view, MessageType.ERROR, 'Error',
@@ -293,7 +456,9 @@ class Controller(Application):
             elif self.model.schedule[dayIndex][path][column] != newString:
                 # User changes a zone's name in Flow Schedule.
                 # Update the model accordingly.
-                self.model.schedule[dayIndex][path][column] = newString
+                self.model.editZoneInSchedule(dayIndex, path, column, newString)
+            self.validator.validateDay(dayIndex)
+            self.view.queue_draw()
 
         def onZoneRowEdited(self, renderer, path, newString, column):
             """ Handle user input and update the model.
@@ -303,11 +468,12 @@ class Controller(Application):
             """
             if column != 0:
                 # Update the model accordingly.
-                self.model.zones[path][column] = newString
+                self.model.editZoneInDatabase(path, column, newString)
             elif not self.model.zoneExistsInDatabase(newString):
                 # User changes a zone's name in Zones.
                 oldZoneName = self.model.zones[path][column]
                 self.model.editZoneNameInDatabase(oldZoneName, newString)
+                self.validator.renameZone(oldZoneName, newString)
             elif self.model.zones[path][column] != newString:
                 # New zone already exists in database. Notify the user.
                 self.view.dialogs.MessagePopup(self.view, MessageType.ERROR, 'Error',
@@ -334,17 +500,28 @@ class Controller(Application):
             zoneSelected = self.model.zones[
                            self.view.zones.get_selection().get_selected()[1]
                            ][0]
-            if column != 0:
+            if column >= 3:
+                try:
+                    value = parseSetting(column, newString)
+                except ValueError:
+                    self.view.dialogs.MessagePopup(self.view, MessageType.ERROR, 'Error',
+                                                   'Value must be a non-negative number.').show()
+                    return
+                # Update the model accordingly.
+                self.model.editPlaylistInZone(zoneSelected, path, column, value)
+            elif column != 0:
                 # Update the model accordingly.
-                self.model.zoneInspector[zoneSelected][path][column] = newString
+                self.model.editPlaylistInZone(zoneSelected, path, column, newString)
             elif not self.model.playlistExistsInDatabase(newString):
                 # New playlist does not exist in database. Notify the user.
                 self.view.dialogs.MessagePopup(self.view, MessageType.ERROR, 'Error',
                                                'Playlist does not exist in database.').show()
-            elif self.model.zoneInspector[zoneSelected][path][column] != newString:
+            elif self.model.getZoneInspectorValue(zoneSelected, path, column) != newString:
                 # User changes a playlist's name in Zone Inspector.
                 # Update the model accordingly.
-                self.model.zoneInspector[zoneSelected][path][column] = newString
+                self.model.editPlaylistInZone(zoneSelected, path, column, newString)
+            self.validator.validateZone(zoneSelected)
+            self.view.queue_draw()
 
         def onPlaylistTypeChanged(self, widget, path, newPlaylistType):
             """ Update the model.
@@ -356,7 +533,9 @@ class Controller(Application):
             zoneSelected = self.model.zones[
                            self.view.zones.get_selection().get_selected()[1]
                            ][0]
-            self.model.zoneInspector[zoneSelected][path][1] = newPlaylistType
+            self.model.editPlaylistInZone(zoneSelected, path, 1, newPlaylistType)
+            self.validator.validateZone(zoneSelected)
+            self.view.queue_draw()
 
         def onShuffleToggled(self, renderer, path, column):
             """ Update the model.
@@ -368,8 +547,8 @@ class Controller(Application):
             zoneSelected = self.model.zones[
                            self.view.zones.get_selection().get_selected()[1]
                            ][0]
-            self.model.zoneInspector[zoneSelected][path][column] = not\
-            self.model.zoneInspector[zoneSelected][path][column]
+            shuffle = self.model.getZoneInspectorValue(zoneSelected, path, column)
+            self.model.editPlaylistInZone(zoneSelected, path, column, not shuffle)
 
         def onZoneRowSelected(self, selection):
             """ Update the GUI.
@@ -383,10 +562,11 @@ class Controller(Application):
                 # Do this by connecting Zone Inspector's view with selected
                 # zone's model
                 zoneSelected = self.model.zones[zoneRowSelected][0]
-                self.view.zoneInspector.set_model(self.model.zoneInspector[zoneSelected])
-                # Show Zone Inspector
-                if not self.view.zoneInspector.get_visible():
-                    self.view.zoneInspector.show()
+                zoneInspectorStore = self.model.getZoneInspectorStore(zoneSelected)
+                self.view.showZoneInspector(zoneInspectorStore)
+                if self.signalStats is not None:
+                    self.signalStats.instrumentStore('Zone Inspector', zoneInspectorStore)
+                    self.signalStats.instrumentView('Zone Inspector', self.view.zoneInspector)
                 # Enable "-" button in Zones header bar
                 self.view.removeZoneButton.set_sensitive(True)
                 # Enable "+" button in Zone Inspector header bar, if there is a selected playlist
@@ -398,7 +578,7 @@ class Controller(Application):
             else:
                 # No zone is selected
                 # Hide Zone Inspector
-                self.view.zoneInspector.hide()
+                self.view.hideZoneInspector()
                 # Disable "-" button in Zones header bar
                 self.view.removeZoneButton.set_sensitive(False)
                 # Disable "+" button in Zone Inspector header bar
@@ -426,6 +606,36 @@ class Controller(Application):
                 # Disable "+" button in Zone Inspector header bar
                 self.view.addPlaylistToZoneButton.set_sensitive(False)
 
+        def onUnusedPlaylistsToggled(self, button):
+            """ Show only the playlists that no zone includes, or all of them again.
+
+            Trigger:
+                User toggles the "Unused" button in Playlists header bar.
+            """
+            if button.get_active():
+                self.playlistFilter = self.model.playlists.filter_new()
+                self.playlistFilter.set_visible_func(
+                    lambda model, treeiter, data: self.usageIndex.isUnused(model[treeiter][0]))
+                # The filter cannot be sorted by itself, so the view's columns sort a copy
+                self.view.playlists.set_model(TreeModelSort(model=self.playlistFilter))
+            else:
+                self.playlistFilter = None
+                self.view.playlists.set_model(self.model.playlists)
+
+        def refilterPlaylists(self):
+            """ Apply the filter of the Playlists pane anew, if there is one. """
+            if self.playlistFilter is not None:
+                self.playlistFilter.refilter()
+
+        def getSelectedPlaylistRow(self):
+            """ Return the selected row of the Playlists database, or None. """
+            model, treeiter = self.view.playlists.get_selection().get_selected()
+            if treeiter is None or model is self.model.playlists:
+                return treeiter
+            # The pane shows the playlists through a filter and a sorted copy
+            return self.playlistFilter.convert_iter_to_child_iter(
+                model.convert_iter_to_child_iter(treeiter))
+
         def onScheduleRowSelected(self, selection):
             """ Update the GUI.
 
@@ -469,6 +679,87 @@ class Controller(Application):
                 # Disable "-" button in Zone Inspector header bar
                 self.view.removePlaylistFromZoneButton.set_sensitive(False)
 
+        def onScheduleCellDataRequested(self, column, renderer, model, treeiter, data):
+            """ Highlight the Flow Schedule cell if it is invalid.
+
+            Trigger:
+                A Flow Schedule cell is about to be drawn.
+            """
+            dayIndex, columnIndex = data
+            problem = self.validator.getScheduleCellProblem(dayIndex, tuple(model[treeiter]),
+                                                            columnIndex)
+            renderer.set_property('cell-background',
+                                  INVALID_CELL_COLOR if problem is not None else None)
+
+        def onZoneCellDataRequested(self, column, renderer, model, treeiter, columnIndex):
+            """ Highlight the Zones cell if its zone is invalid.
+
+            Trigger:
+                A Zones cell is about to be drawn.
+            """
+            zoneIsValid = self.validator.zoneIsValid(model[treeiter][0])
+            renderer.set_property('cell-background',
+                                  INVALID_CELL_COLOR if not zoneIsValid else None)
+
+        def onPlaylistUsageDataRequested(self, column, renderer, model, treeiter, data):
+            """ Render the number of zones that include the playlist, and their weekly airings.
+
+            Trigger:
+                A Playlists usage cell is about to be drawn.
+            """
+            zones, airings = self.usageIndex.getUsage(model[treeiter][0])
+            renderer.set_property('text', 'unused' if zones == 0 else
+                                  str(zones) + (' zone, ' if zones == 1 else ' zones, ') +
+                                  str(airings) + '/week')
+
+        def onZoneAiredDataRequested(self, column, renderer, model, treeiter, data):
+            """ Render the zone's airtime and tracks in the imported play logs.
+
+            Trigger:
+                A Zones aired cell is about to be drawn.
+            """
+            from playlog import formatTotals
+            totals = None
+            if self.playLogs is not None:
+                totals = self.playLogs.getZoneTotals(model[treeiter][0])
+            if totals is None:
+                renderer.set_property('text', '')
+                return
+            secs, tracks, unplannedTracks = totals
+            renderer.set_property('text', formatTotals(secs, tracks) +
+                                  (' (' + str(unplannedTracks) + ' unplanned)'
+                                   if unplannedTracks > 0 else ''))
+
+        def onPlaylistAiredDataRequested(self, column, renderer, model, treeiter, data):
+            """ Render the playlist's airtime and tracks in the imported play logs.
+
+            Trigger:
+                A Playlists aired cell is about to be drawn.
+            """
+            from playlog import formatTotals
+            totals = None
+            if self.playLogs is not None:
+                totals = self.playLogs.getPlaylistTotals(model[treeiter][0])
+            renderer.set_property('text', '' if totals is None else formatTotals(*totals))
+
+        def onZoneInspectorCellDataRequested(self, column, renderer, model, treeiter,
+                                             columnIndex):
+            """ Render numeric settings as text and highlight the cell if it is invalid.
+
+            Trigger:
+                A Zone Inspector cell is about to be drawn.
+            """
+            if columnIndex >= 3:
+                renderer.set_property('text', formatSetting(model[treeiter][columnIndex]))
+            zoneRowSelected = self.view.zones.get_selection().get_selected()[1]
+            problem = None
+            if zoneRowSelected is not None:
+                zoneSelected = self.model.zones[zoneRowSelected][0]
+                problem = self.validator.getZoneInspectorCellProblem(
+                          zoneSelected, tuple(model[treeiter]), columnIndex)
+            renderer.set_property('cell-background',
+                                  INVALID_CELL_COLOR if problem is not None else None)
+
         def onImportXMLMenuOptionSelected(self, action, value):
             """
             1) Display a file chooser dialog where the user can select an XML file.
@@ -477,23 +768,27 @@ class Controller(Application):
             Trigger:
                 User clicks the Import XML menu option.
             """
-            # Create a dialog to let user select the xml file to import
-            importXMLDialog = self.view.dialogs.ImportXML(self.view)
+            # Create a dialog to let user select the xml file to import.
+            # If the session is not empty, also let them choose how to re-import.
+            importXMLDialog = self.view.dialogs.ImportXML(self.view,
+                                                          not self.model.isEmpty())
             # Show the dialog
             response = importXMLDialog.run()
             if response == ResponseType.OK:
                 # User clicks the dialog's Import button
                 # Get the file path of the XML file to be imported
                 xmlPath = importXMLDialog.get_filename()
+                importMode = importXMLDialog.getImportMode()
                 # Create and show the progress bar
                 self.progressBarWindow = self.view.Windows.ProgressBar(
                                          self.view, 'Import Progress')
                 self.progressBarWindow.show_all()
-                # Execute import in a seperate thread, to let the main thread
-                # handle GUI activity
-                Thread(target=self.xml.importXML, args=(xmlPath,
-                       self.progressBarWindow.update,
-                       self.progressBarWindow.destroy)).start()
+                # Execute import in the background, to let the main thread
+                # handle GUI activity. It waits for any other job on the Model.
+                self.jobs.submit('Import', self.xml.importXML, xmlPath,
+                                 self.progressBarWindow.update,
+                                 self.progressBarWindow.destroy, importMode,
+                                 resources=(MODEL,))
             importXMLDialog.destroy()
 
         def onExportXMLMenuOptionSelected(self, action, value):
@@ -511,53 +806,332 @@ class Controller(Application):
             if response == ResponseType.OK:
                 # User clicks the dialog's Export button
                 # Get the file path of the XML file to be exported
-                xmlPath = exportXMLDialog.get_filename()
+                xmlPath = exportXMLDialog.getFileName()
+                compact = exportXMLDialog.isCompact()
                 # Create and show the progress bar
                 self.progressBarWindow = self.view.Windows.ProgressBar(
                                          self.view, 'Export Progress')
                 self.progressBarWindow.show_all()
-                # Execute export in a seperate thread, to let the main thread
-                # handle GUI activity
-                Thread(target=self.xml.exportXML, args=(xmlPath,
-                       self.progressBarWindow.update,
-                       self.progressBarWindow.destroy)).start()
+                # Execute export in the background, to let the main thread
+                # handle GUI activity. It waits for any other job on the Model.
+                self.jobs.submit('Export', self.xml.exportXML, xmlPath,
+                                 self.progressBarWindow.update,
+                                 self.progressBarWindow.destroy, compact,
+                                 resources=(MODEL,))
             exportXMLDialog.destroy()
 
+        def onPublishMenuOptionSelected(self, action, value):
+            """ Initiate the publishing of the schedule to the configured targets.
+
+            Trigger:
+                User clicks the Publish menu option.
+            """
+            from publisher import Publisher, parseTargets
+            targets = parseTargets(PUBLISH_TARGETS)
+            if not targets:
+                self.view.dialogs.MessagePopup(self.view, MessageType.INFO, 'Info',
+                    'No publish targets are configured.',
+                    'Set FLOW_DASHBOARD_PUBLISH_TARGETS to a list of directories '
+                    'and http(s) URLs.').show()
+                return
+            # Keep one publisher, so that its HTTP connections are reused
+            if self.publisher is None:
+                self.publisher = Publisher(targets, PUBLISH_FILE_NAME)
+            # Create and show the progress bar
+            self.progressBarWindow = self.view.Windows.ProgressBar(
+                                     self.view, 'Publish Progress')
+            self.progressBarWindow.show_all()
+            # Execute publish in the background, to let the main thread
+            # handle GUI activity. It waits for any other job on the Model.
+            self.jobs.submit('Publish', self.xml.publishXML, self.publisher,
+                             self.progressBarWindow.update,
+                             self.progressBarWindow.destroy, resources=(MODEL,))
+
+        def onLoadZonesMenuOptionSelected(self, action, value):
+            """
+            1) Display a file chooser dialog where the user can select a CSV or TSV table of zones.
+            2) Initiate the loading of its zones into the database.
+
+            Trigger:
+                User clicks the Load Zones menu option.
+            """
+            loadZonesDialog = self.view.dialogs.LoadZones(self.view)
+            response = loadZonesDialog.run()
+            if response == ResponseType.OK:
+                # The table is read in the background, and its zones are added
+                # in the main loop, all at once. It waits for any other job on the Model.
+                self.jobs.submit('Load zones', self.loadZoneTable,
+                                 loadZonesDialog.get_filename(),
+                                 resources=(MODEL,), onDone=self.onZoneTableLoaded)
+            loadZonesDialog.destroy()
+
+        def loadZoneTable(self, tablePath):
+            """ Add the zones of the table in tablePath to the database. Runs in a job.
+
+            Return the number of zones added.
+            """
+            from zoneloader import readZoneTable
+            numberedRows = readZoneTable(tablePath)
+            return self.jobs.callInMainLoop(self.addZoneTable, numberedRows)
+
+        def addZoneTable(self, numberedRows):
+            """ Add the zones of a zone table to the database, all or none. Runs in the main loop.
+
+            Return the number of zones added.
+            """
+            from zoneloader import getZoneTableDelta
+            state = self.model.getState()
+            delta = getZoneTableDelta(numberedRows, state)
+            try:
+                with span('zone-table', 'model'), self.view.bulkChanges(len(delta)):
+                    applyDelta(self.model, delta)
+            except Exception:
+                self.model.loadState(state)
+                self.validator.validateAll()
+                self.view.queue_draw()
+                raise
+            zoneNames = [args[0] for operation, args in delta
+                         if operation == 'addZoneToDatabase']
+            for zoneName in zoneNames:
+                self.validator.validateZone(zoneName)
+            self.validator.validateInvalidDays()
+            self.view.queue_draw()
+            return len(zoneNames)
+
+        def onZoneTableLoaded(self, job):
+            """ Report how many zones were loaded, or every problem of the table.
+
+            Trigger:
+                The zone loading job ended.
+            """
+            from zoneloader import ZoneTableError
+            if isinstance(job.error, ZoneTableError):
+                self.view.dialogs.MessagePopup(self.view, MessageType.ERROR, 'Error',
+                    'The table has ' + str(len(job.error.problems)) + ' problem(s).',
+                    formatProblems(job.error.problems), 'No zones were loaded.').show()
+            elif job.error is not None:
+                self.view.dialogs.MessagePopup(self.view, MessageType.ERROR, 'Error',
+                    'Failed to load the zones.', str(job.error),
+                    'No zones were loaded.').show()
+            else:
+                self.view.dialogs.MessagePopup(self.view, MessageType.INFO, 'Info',
+                    str(job.result) + ' zone(s) loaded.').show()
+
+        def onHistoryMenuOptionSelected(self, action, value):
+            """
+            1) Display the exported weeks, or the changes of the selected zone.
+            2) Initiate the checkout of the selected week into the Model.
+
+            Trigger:
+                User clicks the History menu option.
+            """
+            history = self.xml.getHistory()
+            zoneRowSelected = self.view.zones.get_selection().get_selected()[1]
+            if zoneRowSelected is not None:
+                zoneName = self.model.zones[zoneRowSelected][0]
+                title = 'History of zone ' + zoneName
+                entries = [(change['time'], change['change'], change['version'])
+                           for change in history.getZoneHistory(zoneName)]
+            else:
+                title = 'History'
+                entries = [(version['time'],
+                            version['label'] + ' (' + str(version['changes']) +
+                            ' zone change' + ('' if version['changes'] == 1 else 's') + ')',
+                            version['version'])
+                           for version in history.getVersions()]
+            historyDialog = self.view.dialogs.History(self.view, title, reversed(entries))
+            response = historyDialog.run()
+            versionId = historyDialog.getSelectedVersion()
+            historyDialog.destroy()
+            if response == ResponseType.OK and versionId is not None:
+                # The version is read in the background, and applied in the main loop
+                # at once. It waits for any other job on the Model.
+                self.jobs.submit('Checkout', self.checkoutVersion, history, versionId,
+                                 resources=(MODEL,), onDone=self.onVersionCheckedOut)
+
+        def checkoutVersion(self, history, versionId):
+            """ Replace the contents of the Model with a version of the history. Runs in a job.
+
+            Return the number of changes applied.
+            """
+            with span('checkout', 'history'):
+                state = history.checkout(versionId)
+            return self.jobs.callInMainLoop(self.applyCheckout, state)
+
+        def applyCheckout(self, state):
+            """ Bring the Model in line with state. Runs in the main loop.
+
+            Only what differs is changed, so that the edits are journaled
+            and undone like any other. Return the number of changes.
+            """
+            delta = diffStates(self.model.getState(), state, REPLACE)
+            with span('delta-application', 'history'), self.view.bulkChanges(len(delta)):
+                applyDelta(self.model, delta)
+            self.validator.validateAll()
+            self.view.queue_draw()
+            return len(delta)
+
+        def onVersionCheckedOut(self, job):
+            """ Report the outcome of a checkout.
+
+            Trigger:
+                The checkout job ended.
+            """
+            if job.error is not None:
+                self.view.dialogs.MessagePopup(self.view, MessageType.ERROR, 'Error',
+                    'Failed to check out the week.', str(job.error)).show()
+            else:
+                print('Checkout applied ' + str(job.result) + ' changes.')
+
+        def onMemoryUsageMenuOptionSelected(self, action, value):
+            """ Report the estimated memory of the Model, its stores, caches and indices.
+
+            Trigger:
+                User clicks the Memory Usage menu option.
+            """
+            from memory import formatReport, getMemoryReport
+            extras = [('Validator', self.validator), ('Usage index', self.usageIndex)]
+            if self.playLogs is not None:
+                extras.append(('Play logs', self.playLogs))
+            if self.xml.history is not None:
+                extras.append(('History cache', self.xml.history))
+            if self.xml.reloader is not None:
+                extras.append(('Reloader base state', self.xml.reloader.baseState))
+            with span('memory-report', 'diagnostics'):
+                report = formatReport(getMemoryReport(self.model, extras))
+            print(report)
+            self.view.dialogs.MessagePopup(self.view, MessageType.INFO, 'Memory usage',
+                'Estimated bytes held by each part of the application.', report).show()
+
+        def onImportPlayLogsMenuOptionSelected(self, action, value):
+            """
+            1) Display a file chooser dialog where the user can select play logs.
+            2) Initiate their import, and the totalling of their airtime per zone and playlist.
+
+            Trigger:
+                User clicks the Import Play Logs menu option.
+            """
+            importPlayLogsDialog = self.view.dialogs.ImportPlayLogs(self.view)
+            response = importPlayLogsDialog.run()
+            if response == ResponseType.OK:
+                from playlog import PlayLogs
+                if self.playLogs is None:
+                    self.playLogs = PlayLogs()
+                # Logs are read in the background. They do not lock the Model,
+                # which is only snapshotted when they are totalled.
+                self.jobs.submit('Import play logs', self.playLogs.load,
+                                 importPlayLogsDialog.get_filenames(),
+                                 onDone=self.onPlayLogsImported)
+            importPlayLogsDialog.destroy()
+
+        def onPlayLogsImported(self, job):
+            """ Report a failed import, and total what is loaded.
+
+            Trigger:
+                The play log import job ended.
+            """
+            if job.error is not None:
+                self.view.dialogs.MessagePopup(self.view, MessageType.ERROR, 'Error',
+                    'Failed to import the play logs.', str(job.error)).show()
+            self.totalPlayLogs()
+
+        def onModelChanged(self, events):
+            """ Total the play logs again, as the plan they are compared with changed,
+            and switch the views to or from large-dataset mode.
+
+            Trigger:
+                A batch of Model changes.
+            """
+            if self.playLogs is not None and self.playLogs.isLoaded():
+                self.totalPlayLogs()
+            self.updateLargeDatasetMode()
+
+        def updateLargeDatasetMode(self):
+            """ Put Zones and Playlists in large-dataset mode while they have
+            LARGE_DATASET_ROWS rows or more.
+            """
+            self.view.setLargeDataset(self.view.zones,
+                                      len(self.model.zones) >= LARGE_DATASET_ROWS)
+            self.view.setLargeDataset(self.view.playlists,
+                                      len(self.model.playlists) >= LARGE_DATASET_ROWS)
+
+        def totalPlayLogs(self):
+            """ Total the play logs against the Model in the background, and redraw the totals. """
+            # A job that has not started yet will snapshot the latest Model anyway
+            if self.playLogTotalsJob is not None and self.playLogTotalsJob.status == QUEUED:
+                return
+            self.playLogTotalsJob = self.jobs.submit(
+                'Total play logs', self.computePlayLogTotals, onDone=self.onPlayLogsTotalled)
+
+        def computePlayLogTotals(self):
+            """ Total the play logs against a snapshot of the Model. Runs in a job. """
+            return self.playLogs.total(self.jobs.callInMainLoop(self.model.getSnapshot))
+
+        def onPlayLogsTotalled(self, job):
+            """ Redraw the aired columns.
+
+            Trigger:
+                The play log totalling job ended.
+            """
+            self.view.zones.queue_draw()
+            self.view.playlists.queue_draw()
+
 
     class XML:
         """ Perform XML-related operations. """
 
-        def __init__(self, model, view):
+        def __init__(self, model, view, validator):
             self.model = model
             self.view = view
+            self.validator = validator
             self.xmlSchema = None
+            # Watches the imported or exported file, if set
+            self.reloader = None
+            # Runs the background jobs and delivers their requests to the main loop, if set
+            self.jobs = None
+            # Keeps every exported week. Created on first use.
+            self.history = None
+
+        def post(self, function, *args):
+            """ Call function in the main loop, through the job scheduler if there is one. """
+            if self.jobs is not None:
+                self.jobs.post(function, *args)
+            else:
+                idle_add(function, *args)
 
-        def importXML(self, inputXmlPath, updateProgressBar, destroyProgressBar):
+        @traced('import')
+        @tracked('import')
+        def importXML(self, inputXmlPath, updateProgressBar, destroyProgressBar,
+                      importMode=None):
             """ Import the XML file selected by the user.
 
-            Use idle_add to make non-blocking requests
+            If importMode is given, re-import the file into the current session:
+            only the differences between the file and the Model are applied,
+            in that mode (see delta.diffStates).
+
+            Use post to make non-blocking requests
             for GUI-related operations to the main thread.
             """
             # Parse input XML file
-            parser = ET.XMLParser(remove_comments=True)
-            with open(inputXmlPath) as inputXmlFile:
-                try:
-                    tree = ET.parse(inputXmlFile, parser)
-                except Exception as e:
-                    print('Failed to parse input XML.\n' + str(e))
-                    idle_add(self.view.dialogs.MessagePopup(self.view,
-                             MessageType.ERROR, 'Error',
-                             'Failed to parse input XML.',
-                             str(e), 'Import aborted.').show)
-                    idle_add(destroyProgressBar)
-                    return
-            idle_add(updateProgressBar)
+            try:
+                with span('parse', 'import'):
+                    tree = self.parseXML(inputXmlPath)
+            except Exception as e:
+                print('Failed to parse input XML.\n' + str(e))
+                self.post(self.view.dialogs.MessagePopup(self.view,
+                          MessageType.ERROR, 'Error',
+                          'Failed to parse input XML.',
+                          str(e), 'Import aborted.').show)
+                self.post(destroyProgressBar)
+                return
+            self.post(updateProgressBar)
             sleep(0.1)
 
             # Download and parse XSD schema
             if self.xmlSchema is None:
-                self.downloadAndParseXSDSchema()
-            idle_add(updateProgressBar)
+                with span('schema', 'import'):
+                    self.downloadAndParseXSDSchema()
+            self.post(updateProgressBar)
             sleep(0.1)
 
             # Validate input XML file against schema
@@ -565,31 +1139,164 @@ class Controller(Application):
             if self.xmlSchema is not None:
                 print('Validating input XML ...')
                 failureMessage = 'Import aborted.'
-                if not self.validateXML(root, failureMessage):
-                    idle_add(destroyProgressBar)
+                with span('validation', 'import'):
+                    valid = self.validateXML(root, failureMessage)
+                if not valid:
+                    self.post(destroyProgressBar)
                     return
             else:
                 print('Validation of input won\'t be performed.')
-                idle_add(self.view.dialogs.MessagePopup(self.view,
-                         MessageType.WARNING, 'Warning',
-                         'Validation of input won\'t be performed.').show)
-            idle_add(updateProgressBar)
+                self.post(self.view.dialogs.MessagePopup(self.view,
+                          MessageType.WARNING, 'Warning',
+                          'Validation of input won\'t be performed.').show)
+            self.post(updateProgressBar)
             sleep(0.1)
 
             # Do import
+            def onDayImported():
+                self.post(updateProgressBar)
+                sleep(0.1)
+            # Settings are only known to be numbers if the input was validated,
+            # so a bad one is reported like any other import failure
+            try:
+                if importMode is None:
+                    # The session is empty, so the views have nothing to keep
+                    # and follow the new rows only once they are all in
+                    models = self.jobs.callInMainLoop(self.view.detachModels)
+                    try:
+                        with span('model-population', 'import'):
+                            self.importDocument(root, onDayImported)
+                    finally:
+                        self.post(self.view.attachModels, models)
+                    # Check the imported rows, to highlight the invalid ones
+                    self.post(self.validator.validateAll)
+                    self.post(self.view.queue_draw)
+                    fileState = self.model.getState()
+                else:
+                    with span('diff', 'import'):
+                        fileState = self.readState(root, onDayImported)
+                        # The main loop may be editing the Model meanwhile
+                        currentState = self.jobs.callInMainLoop(self.model.getState)
+                        delta = diffStates(currentState, fileState, importMode)
+                    # Apply the whole delta in one go, in the main thread
+                    self.post(self.applyReimport, delta)
+            except ValueError as e:
+                print('Failed to import input XML.\n' + str(e))
+                self.post(self.view.dialogs.MessagePopup(self.view,
+                          MessageType.ERROR, 'Error',
+                          'Failed to import input XML.',
+                          str(e), 'Import aborted.').show)
+                self.post(destroyProgressBar)
+                return
+            if self.reloader is not None:
+                self.post(self.reloader.watch, inputXmlPath, fileState)
+
+            # Add imported file's location to main window title
+            self.view.set_title(inputXmlPath + ' \u2014 ' + APP_TITLE)
+            self.post(destroyProgressBar)
+
+        def readState(self, root, onDayImported=None):
+            """ Return the document in root as a Model state (see Model.getState),
+            leaving the Model as is.
+
+            If given, call onDayImported after each day is read.
+            """
+            state = {'zones': [], 'playlists': [], 'zoneInspector': {},
+                     'schedule': [[] for dayIndex in range(7)]}
+            playlistNames = set()
+
+            def readZoneDefinition(zoneElement):
+                # Like importZoneDefinition, every zone is read once
+                zoneName = zoneElement.get('Name')
+                if zoneName in state['zoneInspector']:
+                    return
+                zoneMaintainers, zoneDescription, zoneComments =\
+                    self.readZoneMetadata(zoneElement)
+                state['zones'].append([zoneName, zoneDescription, zoneMaintainers,
+                                       zoneComments])
+                rows = state['zoneInspector'][zoneName] = []
+                for zoneChild in zoneElement.getchildren():
+                    if zoneChild.tag in ['Main', 'Intermediate', 'Fallback']:
+                        playlist, playlistPath = self.readPlaylist(zoneChild)
+                        if playlistPath is not None and playlist.name not in playlistNames:
+                            playlistNames.add(playlist.name)
+                            state['playlists'].append([playlist.name, playlistPath])
+                        rows.append(list(playlist.toRow()))
+
+            if root.tag == LIBRARY_TAG:
+                from compact import getZoneElements, getOccurrenceElements
+                for zoneElement in getZoneElements(root).values():
+                    readZoneDefinition(zoneElement)
+                for dayIndex in range(7):
+                    for occurrenceElement in getOccurrenceElements(root, dayIndex):
+                        state['schedule'][dayIndex].append(
+                            [occurrenceElement.get('Start')[:-3],
+                             occurrenceElement.get('Zone')])
+                    if onDayImported is not None:
+                        onDayImported()
+            else:
+                for dayIndex, day in enumerate(root.getchildren()):
+                    for zoneElement in day.getchildren():
+                        state['schedule'][dayIndex].append(
+                            [zoneElement.get('Start')[:-3], zoneElement.get('Name')])
+                        readZoneDefinition(zoneElement)
+                    if onDayImported is not None:
+                        onDayImported()
+            return state
+
+        def applyReimport(self, delta):
+            """ Apply the delta of a re-import to the Model and update the GUI. """
+            with span('delta-application', 'import'), self.view.bulkChanges(len(delta)):
+                applyDelta(self.model, delta)
+            self.validator.validateAll()
+            self.view.queue_draw()
+            print('Re-import applied ' + str(len(delta)) + ' changes.')
+
+        def parseXML(self, inputXmlPath):
+            """ Parse the XML file in inputXmlPath and return its tree. """
+            importLxml()
+            parser = ET.XMLParser(remove_comments=True)
+            # Compressed files are decompressed while they are parsed
+            with openScheduleFile(inputXmlPath) as inputXmlFile:
+                return ET.parse(inputXmlFile, parser)
+
+        def importDocument(self, root, onDayImported=None):
+            """ Import root, be it a week schedule or a compact schedule. """
+            if root.tag == LIBRARY_TAG:
+                self.importLibrary(root, onDayImported)
+            else:
+                self.importSchedule(root, onDayImported)
+
+        def importLibrary(self, root, onDayImported=None):
+            """ Import the compact schedule in root.
 
+            Its zones are defined once, so each one is parsed once.
+            If given, call onDayImported after each day is imported.
+            """
+            from compact import getZoneElements, getOccurrenceElements
+            for zoneElement in getZoneElements(root).values():
+                self.importZoneDefinition(zoneElement)
+            for dayIndex in range(7):
+                for occurrenceElement in getOccurrenceElements(root, dayIndex):
+                    # Use -3 to ignore seconds
+                    self.model.addZoneToSchedule(dayIndex, occurrenceElement.get('Zone'),
+                                                 occurrenceElement.get('Start')[:-3])
+                if onDayImported is not None:
+                    onDayImported()
+
+        def importSchedule(self, root, onDayImported=None):
+            """ Import the days of the week schedule in root.
+
+            If given, call onDayImported after each day is imported.
+            """
             # Get a day of the week
             for dayIndex, day in enumerate(root.getchildren()):
 
                 # Import its zones one by one
                 for zone in day.getchildren():
                     self.importZone(zone, dayIndex)
-                idle_add(updateProgressBar)
-                sleep(0.1)
-
-            # Add imported file's location to main window title
-            self.view.set_title(inputXmlPath + ' \u2014 ' + APP_TITLE)
-            idle_add(destroyProgressBar)
+                if onDayImported is not None:
+                    onDayImported()
 
         def importZone(self, zoneElement, dayIndex):
             """
@@ -601,6 +1308,11 @@ class Controller(Application):
             zoneName = zoneElement.get('Name')
             zoneStartTime = zoneElement.get('Start')[:-3]    # Use -3 to ignore seconds
             self.model.addZoneToSchedule(dayIndex, zoneName, zoneStartTime)
+            self.importZoneDefinition(zoneElement)
+
+        def importZoneDefinition(self, zoneElement):
+            """ Add the zone of zoneElement to the Zones database and import its playlists. """
+            zoneName = zoneElement.get('Name')
 
             # Do not parse this zone element if the zone is
             # already (parsed and) added to the database.
@@ -610,16 +1322,8 @@ class Controller(Application):
             if not self.model.zoneExistsInDatabase(zoneName):
 
                 # Get the zone's metadata and add it to the database
-                zoneMaintainers = zoneDescription = zoneComments = ''
-                maintainerElement = zoneElement.find('Maintainer')
-                if maintainerElement is not None:
-                        zoneMaintainers = maintainerElement.text
-                descriptionElement = zoneElement.find('Description')
-                if descriptionElement is not None:
-                        zoneDescription = descriptionElement.text
-                commentElement = zoneElement.find('Comment')
-                if commentElement is not None:
-                        zoneComments = commentElement.text
+                zoneMaintainers, zoneDescription, zoneComments =\
+                    self.readZoneMetadata(zoneElement)
                 self.model.addZoneToDatabase(zoneName, zoneMaintainers,
                                              zoneDescription, zoneComments)
 
@@ -628,6 +1332,20 @@ class Controller(Application):
                     if zoneChild.tag in ['Main', 'Intermediate', 'Fallback']:
                         self.importPlaylist(zoneName, zoneChild)
 
+        def readZoneMetadata(self, zoneElement):
+            """ Return the maintainers, description and comments of zoneElement. """
+            zoneMaintainers = zoneDescription = zoneComments = ''
+            maintainerElement = zoneElement.find('Maintainer')
+            if maintainerElement is not None:
+                    zoneMaintainers = maintainerElement.text
+            descriptionElement = zoneElement.find('Description')
+            if descriptionElement is not None:
+                    zoneDescription = descriptionElement.text
+            commentElement = zoneElement.find('Comment')
+            if commentElement is not None:
+                    zoneComments = commentElement.text
+            return zoneMaintainers, zoneDescription, zoneComments
+
         def importPlaylist(self, zoneName, playlistElement):
             """
             1) Add playlist to zoneName's inspector.
@@ -637,129 +1355,285 @@ class Controller(Application):
             # Note that, unlike the zones, it has to be parsed every time it is
             # encountered because its configuration settings may differ
             # depending on the zone it appears in.
+            playlist, playlistPath = self.readPlaylist(playlistElement)
+
+            # In case it is the first time this playlist is encountered,
+            # add it to the database.
+            if playlistPath is not None and not self.model.playlistExistsInDatabase(
+                                                                         playlist.name):
+                self.model.addPlaylistToDatabase(playlistPath)
+            self.model.addPlaylistToZone(zoneName, playlist)
+
+        def readPlaylist(self, playlistElement):
+            """ Return the playlist of playlistElement and its path. """
             playlist = Playlist()
             playlist.type = playlistElement.tag
+            playlistPath = None
             for playlistChild in playlistElement.getchildren():
                 if playlistChild.tag == 'Path':
                     playlist.name = getPlaylistNameFromPath(playlistChild.text)
-
-                    # In case it is the first time this playlist is encountered,
-                    # add it to the database.
-                    if not self.model.playlistExistsInDatabase(playlist.name):
-                        self.model.addPlaylistToDatabase(playlistChild.text)
-
+                    playlistPath = playlistChild.text
                 if playlistChild.tag == 'Shuffle':
-                    playlist.shuffle = (playlistChild.text == 'true')
+                    playlist.shuffle = playlistChild.text in ('true', '1')
                 if playlistChild.tag == 'Fader':
                     for faderChild in playlistChild.getchildren():
                         if faderChild.tag == 'FadeInDurationSecs':
-                            playlist.fadeInSecs = faderChild.text
+                            playlist.fadeInSecs = parseSetting(5, faderChild.text)
                         if faderChild.tag == 'FadeOutDurationSecs':
-                            playlist.fadeOutSecs = faderChild.text
+                            playlist.fadeOutSecs = parseSetting(6, faderChild.text)
                         if faderChild.tag == 'MinLevel':
-                            playlist.minLevel = faderChild.text
+                            playlist.minLevel = parseSetting(7, faderChild.text)
                         if faderChild.tag == 'MaxLevel':
-                            playlist.maxLevel = faderChild.text
+                            playlist.maxLevel = parseSetting(8, faderChild.text)
                 if playlistChild.tag == 'SchedIntervalMins':
-                    playlist.schedIntervalMins = playlistChild.text
+                    playlist.schedIntervalMins = parseSetting(3, playlistChild.text)
                 if playlistChild.tag == 'NumSchedItems':
-                    playlist.numSchedItems = playlistChild.text
-            self.model.addPlaylistToZone(zoneName, playlist)
+                    playlist.numSchedItems = parseSetting(4, playlistChild.text)
+            return playlist, playlistPath
 
-        def exportXML(self, outputXmlPath, updateProgressBar, destroyProgressBar):
+        @traced('export')
+        @tracked('export')
+        def exportXML(self, outputXmlPath, updateProgressBar, destroyProgressBar,
+                      compact=False):
             """ Export the GUI content to an XML file.
 
-            Use idle_add to make non-blocking requests
+            If compact is true, write a compact schedule (see compact.py),
+            instead of a week schedule.
+
+            Use post to make non-blocking requests
             for GUI-related operations to the main thread.
             """
-            # Create week element
-            weekElement = ET.Element('WeekSchedule')
+            built = self.buildValidDocument(compact, updateProgressBar, 'Export aborted.')
+            if built is None:
+                self.post(destroyProgressBar)
+                return
+            snapshot, weekElement = built
 
-            # Add days to week
-            for dayIndex, day in enumerate(WEEK):
-                dayElement = ET.SubElement(weekElement, day[:3])
+            # Output XML data to file
+            self.writeXML(weekElement, outputXmlPath)
+            self.recordHistory(snapshot, outputXmlPath)
+            if self.reloader is not None:
+                self.post(self.reloader.watch, outputXmlPath, self.readState(weekElement))
+            self.post(self.view.dialogs.MessagePopup(self.view,
+                      MessageType.INFO, 'Info', 'Export successful.').show)
+            self.post(updateProgressBar)
+            sleep(0.1)
+            self.post(destroyProgressBar)
 
-                # Add zones to day
-                for scheduleRow in self.model.schedule[dayIndex]:
-                    self.exportZone(scheduleRow, dayElement)
-                idle_add(updateProgressBar)
-                sleep(0.1)
+        @traced('publish')
+        @tracked('publish')
+        def publishXML(self, publisher, updateProgressBar, destroyProgressBar):
+            """ Publish the week schedule to publisher's targets.
 
-            # Remove empty elements
-            self.clearEmptyElements(weekElement)
+            The schedule is serialized once and written to every target in parallel.
+            Report the outcome of each target to the user.
+            """
+            built = self.buildValidDocument(False, updateProgressBar, 'Publish aborted.')
+            if built is None:
+                self.post(destroyProgressBar)
+                return
+            snapshot, weekElement = built
+            data = self.serializeXML(weekElement)
+            results = publisher.publish(data)
+            if any(result.succeeded for result in results):
+                self.recordHistory(snapshot, 'publish')
+            report = '\n'.join(str(result) for result in results)
+            print('Publish results:\n' + report)
+            if all(result.succeeded for result in results):
+                self.post(self.view.dialogs.MessagePopup(self.view,
+                          MessageType.INFO, 'Info', 'Publish successful.', report).show)
+            else:
+                self.post(self.view.dialogs.MessagePopup(self.view,
+                          MessageType.ERROR, 'Error', 'Publish failed for some targets.',
+                          report).show)
+            self.post(updateProgressBar)
+            sleep(0.1)
+            self.post(destroyProgressBar)
+
+        def buildValidDocument(self, compact, updateProgressBar, failureMessage):
+            """ Build the document to export, and validate it.
+
+            If compact is true, build a compact schedule, else a week schedule.
+            Return the snapshot of the Model it is built from and the document,
+            or None if it is invalid, after notifying the user with failureMessage.
+            """
+            # Copy the Model in the main loop, once the jobs before this one are applied.
+            # The document is then built from the copy, while the user keeps editing.
+            with span('snapshot', 'export'):
+                snapshot, problems = self.takeSnapshot()
+
+            # Check the rows before building anything.
+            # The validator keeps track of every problem as the user edits,
+            # so a known problem aborts the export at no cost.
+            if problems:
+                print('Validation failed.\n' + '\n'.join(problems))
+                self.post(self.view.dialogs.MessagePopup(self.view,
+                          MessageType.ERROR, 'Error', 'Validation failed.',
+                          formatProblems(problems), failureMessage).show)
+                return None
+
+            # Create document element
+            def onDayExported():
+                self.post(updateProgressBar)
+                sleep(0.1)
+            with span('build', 'export'):
+                if compact:
+                    weekElement = self.exportLibrary(snapshot, onDayExported)
+                else:
+                    weekElement = self.exportSchedule(snapshot, onDayExported)
 
             # Download and parse XSD schema
             if self.xmlSchema is None:
-                self.downloadAndParseXSDSchema()
-            idle_add(updateProgressBar)
+                with span('schema', 'export'):
+                    self.downloadAndParseXSDSchema()
+            self.post(updateProgressBar)
             sleep(0.1)
 
             # Validate output XML data against schema
             if self.xmlSchema is not None:
                 print('Validating output XML ...')
-                failureMessage = 'Export aborted.'
-                if not self.validateXML(weekElement, failureMessage):
-                    idle_add(destroyProgressBar)
-                    return
+                with span('validation', 'export'):
+                    valid = self.validateXML(weekElement, failureMessage)
+                if not valid:
+                    return None
             else:
                 print('Validation of output won\'t be performed.')
-                idle_add(self.view.dialogs.MessagePopup(self.view,
-                         MessageType.WARNING, 'Warning',
-                         'Validation of output won\'t be performed.').show)
-            idle_add(updateProgressBar)
+                self.post(self.view.dialogs.MessagePopup(self.view,
+                          MessageType.WARNING, 'Warning',
+                          'Validation of output won\'t be performed.').show)
+            self.post(updateProgressBar)
             sleep(0.1)
+            return snapshot, weekElement
 
-            # Output XML data to file
-            with open(outputXmlPath, 'w') as f:
-                dom = parseString(ET.tostring(weekElement))
-                f.write(dom.toprettyxml(indent='\t', encoding='UTF-8').decode())
-                idle_add(self.view.dialogs.MessagePopup(self.view,
-                         MessageType.INFO, 'Info', 'Export successful.').show)
-            idle_add(updateProgressBar)
-            sleep(0.1)
-            idle_add(destroyProgressBar)
+        def getHistory(self):
+            """ Return the history of exported weeks (see history.py). """
+            if self.history is None:
+                from history import History
+                self.history = History(HISTORY_DIR)
+            return self.history
 
-        def exportZone(self, scheduleRow, dayElement):
+        def recordHistory(self, snapshot, label):
+            """ Record snapshot in the history. A failure is reported, but fails nothing. """
+            try:
+                with span('history', 'export'):
+                    self.getHistory().record(snapshot, label)
+            except OSError as e:
+                print('Failed to record the schedule in the history.\n' + str(e))
+
+        def takeSnapshot(self):
+            """ Return a snapshot of the Model and the problems that affect its export.
+
+            Both are taken in the main loop. Call it from a job, or without a job scheduler.
+            """
+            def take():
+                return self.model.getSnapshot(), self.validator.getProblems()
+            if self.jobs is None:
+                return take()
+            return self.jobs.callInMainLoop(take)
+
+        def exportSchedule(self, snapshot, onDayExported=None):
+            """ Create and return the week schedule element of snapshot, a ModelSnapshot.
+
+            If given, call onDayExported after each day is exported.
+            """
+            # Build each zone once, then copy it to each of its occurrences
+            from compact import expandLibrary
+            libraryElement = self.exportLibrary(snapshot, onDayExported)
+            with span('expansion', 'export'):
+                return expandLibrary(libraryElement)
+
+        def exportLibrary(self, snapshot, onDayExported=None):
+            """ Create and return the compact schedule element of snapshot, a ModelSnapshot.
+
+            Only the zones that appear in the Flow Schedule are defined.
+            If given, call onDayExported after each day is exported.
+            """
+            importLxml()
+            libraryElement = ET.Element(LIBRARY_TAG)
+            zonesElement = ET.SubElement(libraryElement, 'Zones')
+            weekElement = ET.SubElement(libraryElement, 'Week')
+            exportedZones = set()
+
+            # Add days to week
+            for dayIndex, day in enumerate(WEEK):
+                dayElement = ET.SubElement(weekElement, day[:3])
+
+                # Refer to zones from the day, and define each zone once
+                for scheduleRow in snapshot.schedule[dayIndex]:
+                    zoneStartTime = scheduleRow[0]
+                    zoneName = scheduleRow[1]
+                    occurrenceElement = ET.SubElement(dayElement, 'Occurrence')
+                    occurrenceElement.set('Zone', zoneName)
+                    occurrenceElement.set('Start', zoneStartTime + ':00')
+                    if zoneName not in exportedZones:
+                        exportedZones.add(zoneName)
+                        self.exportZone(snapshot, zoneName, zonesElement)
+                if onDayExported is not None:
+                    onDayExported()
+            return libraryElement
+
+        def writeXML(self, rootElement, outputXmlPath):
+            """ Write rootElement to the file in outputXmlPath.
+
+            The file is replaced atomically, so that its readers never see it half-written.
+            It is compressed if outputXmlPath ends with .gz or .xz. The document is
+            serialized straight into the file (and its compressor), without a copy
+            of it in memory.
+            """
+            from publisher import openAtomically
+            importLxml()
+            indentXML(rootElement)
+            with span('write', 'export'), openAtomically(outputXmlPath) as writer:
+                ET.ElementTree(rootElement).write(writer, encoding='UTF-8',
+                                                  xml_declaration=True)
+
+        def serializeXML(self, rootElement):
+            """ Return rootElement as indented, UTF-8 encoded bytes. """
+            importLxml()
+            indentXML(rootElement)
+            with span('serialization', 'export'):
+                return ET.tostring(rootElement, encoding='UTF-8', xml_declaration=True)
+
+        def exportZone(self, snapshot, zoneName, zonesElement):
             """
-            1) Add scheduleRow's zone with its metadata to dayElement
+            1) Add zoneName with its metadata to zonesElement
             2) Export its playlists
             """
-            zoneStartTime = scheduleRow[0]
-            zoneName = scheduleRow[1]
-            zoneElement = ET.SubElement(dayElement, 'Zone')
+            zoneElement = ET.SubElement(zonesElement, 'Zone')
             zoneElement.set('Name', zoneName)
-            zoneElement.set('Start', zoneStartTime + ':00')
-            zoneRow = self.model.getZoneRow(zoneName)
-            ET.SubElement(zoneElement, 'Maintainer').text = self.model.zones[zoneRow][2]
-            ET.SubElement(zoneElement, 'Description').text = self.model.zones[zoneRow][1]
-            ET.SubElement(zoneElement, 'Comment').text = self.model.zones[zoneRow][3]
+            zone = snapshot.getZone(zoneName)
+            ET.SubElement(zoneElement, 'Maintainer').text = zone[2]
+            ET.SubElement(zoneElement, 'Description').text = zone[1]
+            ET.SubElement(zoneElement, 'Comment').text = zone[3]
 
             # Add playlists to zone
-            self.exportPlaylists(zoneName, zoneElement)
+            self.exportPlaylists(snapshot, zoneName, zoneElement)
 
-        def exportPlaylists(self, zoneName, zoneElement):
+            # Remove empty elements
+            self.clearEmptyElements(zoneElement)
+
+        def exportPlaylists(self, snapshot, zoneName, zoneElement):
             """ Add zoneName's playlists to zoneElement """
             # Add Main
-            mainPlaylistRow = self.model.getMainPlaylistRow(zoneName)
+            mainPlaylistRow = snapshot.getPlaylistRowOfType(zoneName, 'Main')
             if mainPlaylistRow is not None:
                 playlistElement = ET.SubElement(zoneElement, 'Main')
-                self.fillPlaylistElement(playlistElement, self.model.zoneInspector[
-                                                           zoneName][mainPlaylistRow])
+                self.fillPlaylistElement(snapshot, playlistElement, mainPlaylistRow)
 
             # Add Fallback
-            fallbackPlaylistRow = self.model.getFallbackPlaylistRow(zoneName)
+            fallbackPlaylistRow = snapshot.getPlaylistRowOfType(zoneName, 'Fallback')
             if fallbackPlaylistRow is not None:
                 playlistElement = ET.SubElement(zoneElement, 'Fallback')
-                self.fillPlaylistElement(playlistElement, self.model.zoneInspector[
-                                                           zoneName][fallbackPlaylistRow])
+                self.fillPlaylistElement(snapshot, playlistElement, fallbackPlaylistRow)
 
             # Add Intermediates
-            for zoneInspectorRow in self.model.zoneInspector[zoneName]:
+            for zoneInspectorRow in snapshot.getZoneInspectorRows(zoneName):
                 if zoneInspectorRow[1] == 'Intermediate':
                     intermediatePlaylistRow = zoneInspectorRow
                     playlistElement = ET.SubElement(zoneElement, 'Intermediate')
                     playlistElement.set('Name', intermediatePlaylistRow[0])
-                    self.fillPlaylistElement(playlistElement, intermediatePlaylistRow)
+                    self.fillPlaylistElement(snapshot, playlistElement,
+                                             intermediatePlaylistRow)
 
         def downloadAndParseXSDSchema(self):
             """ Download XSD schema from the web and parse it.
@@ -767,6 +1641,8 @@ class Controller(Application):
             In case of download failure, use the hardcoded schema.
             In case of parse failure, notify the user.
             """
+            importLxml()
+            from urllib.request import urlopen
             try:
                 xsdSchemaFile = urlopen(XSD_SCHEMA_URL, timeout=3)
             except Exception as e:
@@ -777,18 +1653,18 @@ class Controller(Application):
                                      XSD_SCHEMA_FALLBACK.encode('utf-8')))
                 except Exception as e:
                     print('Failed to parse XSD schema.\n' + str(e))
-                    idle_add(self.view.dialogs.MessagePopup(self.view,
-                             MessageType.ERROR, 'Error',
-                             'Failed to parse XSD schema.', str(e)).show)
+                    self.post(self.view.dialogs.MessagePopup(self.view,
+                              MessageType.ERROR, 'Error',
+                              'Failed to parse XSD schema.', str(e)).show)
             else:
                 print('Got XSD Schema from', XSD_SCHEMA_URL)
                 try:
                     self.xmlSchema = ET.XMLSchema(ET.parse(xsdSchemaFile))
                 except Exception as e:
                     print('Failed to parse XSD schema.\n' + str(e))
-                    idle_add(self.view.dialogs.MessagePopup(self.view,
-                             MessageType.ERROR, 'Error',
-                             'Failed to parse XSD schema.', str(e)).show)
+                    self.post(self.view.dialogs.MessagePopup(self.view,
+                              MessageType.ERROR, 'Error',
+                              'Failed to parse XSD schema.', str(e)).show)
 
         def validateXML(self, rootElement, failureMessage):
             """ Validate the contents of rootElement.
@@ -796,31 +1672,42 @@ class Controller(Application):
             In case of validation failure, notify the user with failureMessage.
             """
             try:
-                self.xmlSchema.assertValid(rootElement)
+                self.assertValid(rootElement)
             except Exception as e:
                 print('Validation failed.\n' + str(e))
-                idle_add(self.view.dialogs.MessagePopup(self.view,
-                MessageType.ERROR, 'Error', 'Validation failed.',
-                    str(e), failureMessage).show)
+                self.post(self.view.dialogs.MessagePopup(self.view,
+                 MessageType.ERROR, 'Error', 'Validation failed.',
+                     str(e), failureMessage).show)
                 return False
             else:
                 print('Validation successful.')
             return True
 
-        def fillPlaylistElement(self, playlistElement, zoneInspectorRow):
+        def assertValid(self, rootElement):
+            """ Check rootElement against the XSD schema. Raise an exception if invalid. """
+            if rootElement.tag == LIBRARY_TAG:
+                from compact import assertValidLibrary
+                assertValidLibrary(rootElement, self.xmlSchema)
+            else:
+                self.xmlSchema.assertValid(rootElement)
+
+        def fillPlaylistElement(self, snapshot, playlistElement, zoneInspectorRow):
             """ Construct a playlist element from zoneInspectorRow contents. """
-            playlistRow = self.model.getPlaylistRow(zoneInspectorRow[0])
-            ET.SubElement(playlistElement, 'Path').text = self.model.playlists[
-                                                             playlistRow][1]
+            ET.SubElement(playlistElement, 'Path').text = snapshot.getPlaylistPath(
+                                                             zoneInspectorRow[0])
             ET.SubElement(playlistElement, 'Shuffle').text =\
                 'true' if zoneInspectorRow[2] else 'false'
             faderElement = ET.SubElement(playlistElement, 'Fader')
-            ET.SubElement(faderElement, 'FadeInDurationSecs').text = zoneInspectorRow[5]
-            ET.SubElement(faderElement, 'FadeOutDurationSecs').text = zoneInspectorRow[6]
-            ET.SubElement(faderElement, 'MinLevel').text = zoneInspectorRow[7]
-            ET.SubElement(faderElement, 'MaxLevel').text = zoneInspectorRow[8]
-            ET.SubElement(playlistElement, 'SchedIntervalMins').text = zoneInspectorRow[3]
-            ET.SubElement(playlistElement, 'NumSchedItems').text = zoneInspectorRow[4]
+            ET.SubElement(faderElement, 'FadeInDurationSecs').text =\
+                formatSetting(zoneInspectorRow[5])
+            ET.SubElement(faderElement, 'FadeOutDurationSecs').text =\
+                formatSetting(zoneInspectorRow[6])
+            ET.SubElement(faderElement, 'MinLevel').text = formatSetting(zoneInspectorRow[7])
+            ET.SubElement(faderElement, 'MaxLevel').text = formatSetting(zoneInspectorRow[8])
+            ET.SubElement(playlistElement, 'SchedIntervalMins').text =\
+                formatSetting(zoneInspectorRow[3])
+            ET.SubElement(playlistElement, 'NumSchedItems').text =\
+                formatSetting(zoneInspectorRow[4])
 
         def clearEmptyElements(self, root):
             """ Remove root's empty children. """
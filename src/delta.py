@@ -0,0 +1,239 @@
+"""
+Deltas
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import Counter
+from helpers import Playlist, WEEK, getPlaylistNameFromPath
+
+
+""" Differences between two Model states, as lists of Model mutations.
+
+A delta is a list of [operation, args] pairs, in the form passed to the
+Model's mutation listeners, so that it can be applied with applyMutation and
+recorded by the Journal like any other edit. States are the plain dictionaries
+returned by Model.getState.
+
+Zones are matched by name, schedule rows by day, start time and zone, and
+playlist rows by playlist name, in the order they appear in their zone.
+"""
+
+# Keep everything that the incoming state does not mention
+MERGE = 'merge'
+# Also remove everything that the incoming state does not mention
+REPLACE = 'replace'
+
+
+# Functions
+
+def diffStates(currentState, incomingState, mode=MERGE):
+    """ Return the delta that brings currentState in line with incomingState.
+
+    In both modes, the zones and playlists of incomingState are added or
+    updated, and each incoming zone gets exactly the playlists it has in
+    incomingState. In REPLACE mode, zones, playlists and schedule rows that
+    are missing from incomingState are removed too.
+    """
+    delta = []
+    currentPlaylists = {playlist[0]: playlist for playlist in currentState['playlists']}
+    incomingPlaylists = {playlist[0]: playlist for playlist in incomingState['playlists']}
+    currentZones = {zone[0]: zone for zone in currentState['zones']}
+    incomingZones = {zone[0]: zone for zone in incomingState['zones']}
+
+    # Playlists database
+    for playlistName, playlist in incomingPlaylists.items():
+        currentPlaylist = currentPlaylists.get(playlistName)
+        if currentPlaylist is None:
+            delta.append(['addPlaylistToDatabase', [playlist[1]]])
+        elif currentPlaylist[1] != playlist[1]:
+            delta.append(['editPlaylistInDatabase', [playlistName, 1, playlist[1]]])
+
+    # Zones database and Zone Inspector
+    for zoneName, zone in incomingZones.items():
+        currentZone = currentZones.get(zoneName)
+        if currentZone is None:
+            delta.append(['addZoneToDatabase', [zoneName, zone[2], zone[1], zone[3]]])
+        else:
+            for column in range(1, 4):
+                if currentZone[column] != zone[column]:
+                    delta.append(['editZoneInDatabase', [zoneName, column, zone[column]]])
+        delta.extend(diffZoneInspector(zoneName,
+                                       currentState['zoneInspector'].get(zoneName, []),
+                                       incomingState['zoneInspector'].get(zoneName, [])))
+
+    # Flow Schedule
+    for dayIndex in range(7):
+        currentRows = Counter(tuple(row) for row in currentState['schedule'][dayIndex])
+        incomingRows = Counter(tuple(row) for row in incomingState['schedule'][dayIndex])
+        for row in (incomingRows - currentRows).elements():
+            delta.append(['addZoneToSchedule', [dayIndex, row[1], row[0]]])
+        if mode == REPLACE:
+            for row in (currentRows - incomingRows).elements():
+                # Rows of removed zones go away with their zone
+                if row[1] in incomingZones or row[1] not in currentZones:
+                    delta.append(['removeZoneFromSchedule', [dayIndex, list(row)]])
+
+    if mode == REPLACE:
+        for zoneName in currentZones:
+            if zoneName not in incomingZones:
+                delta.append(['removeZoneFromDatabase', [zoneName]])
+        for playlistName in currentPlaylists:
+            if playlistName not in incomingPlaylists:
+                delta.append(['removePlaylistFromDatabase', [playlistName]])
+    return delta
+
+def diffZoneInspector(zoneName, currentRows, incomingRows):
+    """ Return the delta that turns the playlist rows of zoneName into incomingRows.
+
+    A playlist that appears in both lists is edited in place, column by column,
+    so that only its changed settings are recorded.
+    """
+    delta = []
+    # playlistName -> current rows of that playlist that are not matched yet
+    unmatchedRows = {}
+    for row in currentRows:
+        unmatchedRows.setdefault(row[0], []).append(Playlist.fromRow(row).toRow())
+    additions = []
+    for row in incomingRows:
+        row = Playlist.fromRow(row).toRow()
+        candidates = unmatchedRows.get(row[0])
+        if not candidates:
+            additions.append(row)
+            continue
+        # Prefer an identical row, so that reordered duplicates cost nothing
+        currentRow = row if row in candidates else candidates[0]
+        candidates.remove(currentRow)
+        editedRow = list(currentRow)
+        for column in range(1, len(row)):
+            if editedRow[column] != row[column]:
+                delta.append(['editPlaylistInZone',
+                              [zoneName, list(editedRow), column, row[column]]])
+                editedRow[column] = row[column]
+    for rows in unmatchedRows.values():
+        for row in rows:
+            delta.append(['removePlaylistFromZone', [zoneName, list(row)]])
+    for row in additions:
+        delta.append(['addPlaylistToZone', [zoneName, list(row)]])
+    return delta
+
+def applyDelta(model, delta):
+    """ Apply every mutation of delta to model, in order. """
+    for operation, args in delta:
+        model.applyMutation(operation, args)
+
+def getInverseDelta(model, operation, args):
+    """ Return the delta that undoes a mutation, before it is applied to model.
+
+    Removals are undone by adding back what they take with them: a zone's
+    playlists and schedule rows, or a playlist's rows in every zone.
+    Return an empty delta if the mutation refers to something missing,
+    in which case it fails without changing model.
+    """
+    if operation == 'addZoneToDatabase':
+        return [['removeZoneFromDatabase', [args[0]]]]
+    if operation == 'removeZoneFromDatabase':
+        zoneRow = model.getZoneRow(args[0])
+        if zoneRow is None:
+            return []
+        zone = model.zones[zoneRow]
+        delta = [['addZoneToDatabase', [zone[0], zone[2], zone[1], zone[3]]]]
+        delta.extend(['addPlaylistToZone', [zone[0], list(row)]]
+                     for row in model.zoneInspector.getRows(zone[0]))
+        for dayIndex in range(7):
+            delta.extend(['addZoneToSchedule', [dayIndex, row[1], row[0]]]
+                         for row in model.schedule[dayIndex] if row[1] == zone[0])
+        return delta
+    if operation == 'editZoneNameInDatabase':
+        return [['editZoneNameInDatabase', [args[1], args[0]]]]
+    if operation == 'editZoneInDatabase':
+        zoneRow = model.getZoneRow(args[0])
+        if zoneRow is None:
+            return []
+        return [['editZoneInDatabase', [args[0], args[1], model.zones[zoneRow][args[1]]]]]
+    if operation == 'addPlaylistToDatabase':
+        playlistName = getPlaylistNameFromPath(args[0])
+        # Removing the playlist also removes it from the zones that had it before
+        return [['removePlaylistFromDatabase', [playlistName]]] +\
+            getZoneRowsDelta(model, playlistName)
+    if operation == 'editPlaylistInDatabase':
+        playlistRow = model.getPlaylistRow(args[0])
+        if playlistRow is None:
+            return []
+        return [['editPlaylistInDatabase',
+                 [args[0], args[1], model.playlists[playlistRow][args[1]]]]]
+    if operation == 'removePlaylistFromDatabase':
+        playlistRow = model.getPlaylistRow(args[0])
+        if playlistRow is None:
+            return []
+        return [['addPlaylistToDatabase', [model.playlists[playlistRow][1]]]] +\
+            getZoneRowsDelta(model, args[0])
+    if operation == 'addZoneToSchedule':
+        return [['removeZoneFromSchedule', [args[0], [args[2], args[1]]]]]
+    if operation == 'removeZoneFromSchedule':
+        return [['addZoneToSchedule', [args[0], args[1][1], args[1][0]]]]
+    if operation == 'editZoneInSchedule':
+        editedRow = list(args[1])
+        editedRow[args[2]] = args[3]
+        return [['editZoneInSchedule', [args[0], editedRow, args[2], args[1][args[2]]]]]
+    if operation == 'addPlaylistToZone':
+        return [['removePlaylistFromZone',
+                 [args[0], list(Playlist.fromRow(args[1]).toRow())]]]
+    if operation == 'removePlaylistFromZone':
+        return [['addPlaylistToZone', [args[0], list(args[1])]]]
+    if operation == 'editPlaylistInZone':
+        if args[0] not in model.zoneInspector:
+            return []
+        rowReference = model.zoneInspector.findRow(args[0], args[1])
+        if rowReference is None:
+            return []
+        # The row as the Model holds it, with its values typed like its columns
+        row = list(model.zoneInspector.getRow(args[0], rowReference))
+        editedRow = list(row)
+        editedRow[args[2]] = args[3]
+        return [['editPlaylistInZone', [args[0], editedRow, args[2], row[args[2]]]]]
+    raise ValueError('unknown operation ' + str(operation))
+
+def getZoneRowsDelta(model, playlistName):
+    """ Return the delta that adds back the rows of playlistName in every zone. """
+    return [['addPlaylistToZone', [zoneName, list(row)]]
+            for zoneName in model.zoneInspector
+            for row in model.zoneInspector.getRows(zoneName) if row[0] == playlistName]
+
+def getMutationKey(mutation):
+    """ Return a key for the part of the Model that a mutation of a delta touches.
+
+    Two deltas of the same state conflict where their keys meet.
+    """
+    operation, args = mutation
+    if operation == 'addPlaylistToDatabase':
+        return ('playlist', getPlaylistNameFromPath(args[0]))
+    if operation in ('editPlaylistInDatabase', 'removePlaylistFromDatabase'):
+        return ('playlist', args[0])
+    if operation == 'addZoneToSchedule':
+        return ('schedule', args[0], args[2], args[1])
+    if operation == 'removeZoneFromSchedule':
+        return ('schedule', args[0], args[1][0], args[1][1])
+    # The rest touch a zone or its playlists
+    return ('zone', args[0])
+
+def describeKey(key):
+    """ Return a readable description of a key returned by getMutationKey. """
+    if key[0] == 'playlist':
+        return 'Playlist "' + key[1] + '"'
+    if key[0] == 'schedule':
+        return WEEK[key[1]] + ', zone "' + key[3] + '" at ' + key[2]
+    return 'Zone "' + key[1] + '"'
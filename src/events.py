@@ -0,0 +1,228 @@
+"""
+Change events
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from threading import Lock
+from gi.repository.GLib import idle_add
+from helpers import getPlaylistNameFromPath
+
+
+""" Typed events that describe how the Model changed, and the bus that carries them.
+
+Rows in events are tuples of values. A row changed event holds the row before
+the change (None if it was added) and after it (None if it was removed).
+Events that remove or rename a zone or a playlist stand for the rows they
+remove or rename too, in the Flow Schedule and the Zone Inspector.
+"""
+
+
+class ChangeEvent:
+    """ The base of every change event. """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                all(getattr(self, name) == getattr(other, name) for name in self.__slots__))
+
+    def __repr__(self):
+        return (type(self).__name__ + '(' +
+                ', '.join(repr(getattr(self, name)) for name in self.__slots__) + ')')
+
+
+class ZoneAdded(ChangeEvent):
+    __slots__ = ('zoneName',)
+
+    def __init__(self, zoneName):
+        self.zoneName = zoneName
+
+
+class ZoneRenamed(ChangeEvent):
+    __slots__ = ('oldZoneName', 'newZoneName')
+
+    def __init__(self, oldZoneName, newZoneName):
+        self.oldZoneName = oldZoneName
+        self.newZoneName = newZoneName
+
+
+class ZoneEdited(ChangeEvent):
+    """ A zone's metadata (anything but its name) changed. """
+
+    __slots__ = ('zoneName', 'column', 'value')
+
+    def __init__(self, zoneName, column, value):
+        self.zoneName = zoneName
+        self.column = column
+        self.value = value
+
+
+class ZoneRemoved(ChangeEvent):
+    __slots__ = ('zoneName',)
+
+    def __init__(self, zoneName):
+        self.zoneName = zoneName
+
+
+class PlaylistAdded(ChangeEvent):
+    __slots__ = ('playlistName', 'playlistPath')
+
+    def __init__(self, playlistName, playlistPath):
+        self.playlistName = playlistName
+        self.playlistPath = playlistPath
+
+
+class PlaylistEdited(ChangeEvent):
+    """ A playlist's path changed. """
+
+    __slots__ = ('playlistName', 'column', 'value')
+
+    def __init__(self, playlistName, column, value):
+        self.playlistName = playlistName
+        self.column = column
+        self.value = value
+
+
+class PlaylistRemoved(ChangeEvent):
+    __slots__ = ('playlistName',)
+
+    def __init__(self, playlistName):
+        self.playlistName = playlistName
+
+
+class InspectorRowChanged(ChangeEvent):
+    __slots__ = ('zoneName', 'oldRow', 'newRow')
+
+    def __init__(self, zoneName, oldRow, newRow):
+        self.zoneName = zoneName
+        self.oldRow = oldRow
+        self.newRow = newRow
+
+
+class ScheduleRowChanged(ChangeEvent):
+    __slots__ = ('dayIndex', 'oldRow', 'newRow')
+
+    def __init__(self, dayIndex, oldRow, newRow):
+        self.dayIndex = dayIndex
+        self.oldRow = oldRow
+        self.newRow = newRow
+
+
+class StateLoaded(ChangeEvent):
+    """ The whole Model was replaced by state, as returned by Model.getState. """
+
+    __slots__ = ('state',)
+
+    def __init__(self, state):
+        self.state = state
+
+
+class ChangeBus:
+    """ Deliver change events to subscribers.
+
+    An immediate subscriber is called with each event, as a list of one, in
+    the thread that changed the Model. A batched subscriber is called in the
+    main loop with the list of every event since its last call, so a burst of
+    changes, e.g. an import, costs it one call.
+    """
+
+    def __init__(self):
+        self.immediateSubscribers = []
+        self.batchedSubscribers = []
+        # Events not yet delivered to the batched subscribers
+        self.pendingEvents = []
+        self.lock = Lock()
+
+
+    # Public methods
+
+    def subscribe(self, subscriber, batched=True):
+        """ Call subscriber with lists of change events. """
+        if batched:
+            self.batchedSubscribers.append(subscriber)
+        else:
+            self.immediateSubscribers.append(subscriber)
+
+    def hasSubscribers(self):
+        """ Return true if anyone is subscribed. """
+        return bool(self.immediateSubscribers or self.batchedSubscribers)
+
+    def publish(self, event):
+        """ Deliver event. Callable from any thread. """
+        for subscriber in self.immediateSubscribers:
+            subscriber([event])
+        if not self.batchedSubscribers:
+            return
+        with self.lock:
+            self.pendingEvents.append(event)
+            if len(self.pendingEvents) > 1:
+                # A delivery is already scheduled
+                return
+        idle_add(self.deliver)
+
+
+    # Private methods
+
+    def deliver(self):
+        """ Deliver the pending events to the batched subscribers. Runs in the main loop. """
+        with self.lock:
+            events = self.pendingEvents
+            self.pendingEvents = []
+        for subscriber in self.batchedSubscribers:
+            subscriber(events)
+        return False
+
+
+# Functions
+
+def getChangeEvent(operation, args):
+    """ Return the change event of a Model mutation, as passed to its mutation listeners. """
+    if operation == 'addZoneToDatabase':
+        return ZoneAdded(args[0])
+    if operation == 'editZoneNameInDatabase':
+        return ZoneRenamed(args[0], args[1])
+    if operation == 'editZoneInDatabase':
+        return ZoneEdited(args[0], args[1], args[2])
+    if operation == 'removeZoneFromDatabase':
+        return ZoneRemoved(args[0])
+    if operation == 'addPlaylistToDatabase':
+        return PlaylistAdded(getPlaylistNameFromPath(args[0]), args[0])
+    if operation == 'editPlaylistInDatabase':
+        return PlaylistEdited(args[0], args[1], args[2])
+    if operation == 'removePlaylistFromDatabase':
+        return PlaylistRemoved(args[0])
+    if operation == 'addZoneToSchedule':
+        return ScheduleRowChanged(args[0], None, (args[2], args[1]))
+    if operation == 'removeZoneFromSchedule':
+        return ScheduleRowChanged(args[0], tuple(args[1]), None)
+    if operation == 'editZoneInSchedule':
+        return ScheduleRowChanged(args[0], tuple(args[1]), getEditedRow(args[1], args[2],
+                                                                         args[3]))
+    if operation == 'addPlaylistToZone':
+        return InspectorRowChanged(args[0], None, tuple(args[1]))
+    if operation == 'removePlaylistFromZone':
+        return InspectorRowChanged(args[0], tuple(args[1]), None)
+    if operation == 'editPlaylistInZone':
+        return InspectorRowChanged(args[0], tuple(args[1]), getEditedRow(args[1], args[2],
+                                                                         args[3]))
+    if operation == 'loadState':
+        return StateLoaded(args[0])
+    raise ValueError('unknown mutation: ' + operation)
+
+def getEditedRow(row, column, value):
+    """ Return row, as a tuple, with value in column. """
+    return tuple(row[:column]) + (value,) + tuple(row[column + 1:])
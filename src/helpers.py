@@ -17,6 +17,7 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from os import environ
 from os.path import basename, splitext
 from gi.repository.Gtk import ListStore, SortType
 
@@ -29,9 +30,76 @@ APP_TITLE = 'Autopilot Schedule'
 
 WEEK = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
 
+ZONE_INSPECTOR_COLUMNS = ['Name', 'Type', 'Shuffle', 'SchedIntervalMins', 'NumSchedItems',
+                          'FadeInSecs', 'FadeOutSecs', 'MinLevel', 'MaxLevel']
+
+ZONE_INSPECTOR_COLUMN_TYPES = (str, str, bool, int, int, int, int, float, float)
+
+# Value of a numeric playlist setting that is not set
+UNSET = -1
+
+INVALID_CELL_COLOR = 'darkred'
+
+# Number of zones whose Zone Inspector store is kept after it is displayed
+ZONE_INSPECTOR_CACHE_SIZE = 16
+
+# Where the edit journal and its snapshots are kept.
+# By default, it lives in the directory shared with the host (see ./run),
+# so that the session survives a crash of the container.
+SESSION_DIR = environ.get('FLOW_DASHBOARD_SESSION_DIR', 'schedules/.session')
+
+AUTOSAVE_INTERVAL_SECS = 2
+
+# Where the trace of the hot paths is written. Tracing is disabled if unset.
+TRACE_PATH = environ.get('FLOW_DASHBOARD_TRACE')
+
+# Where imports and exports log how they grow memory. Memory tracking is disabled if unset.
+MEMORY_LOG_PATH = environ.get('FLOW_DASHBOARD_MEMORY_LOG')
+
+# If set, count the signals of the Model's stores and time the redraws of their views,
+# per user operation (see signalstats.py)
+SIGNAL_STATS = environ.get('FLOW_DASHBOARD_SIGNAL_STATS') is not None
+
+# Rows from which the Zones and Playlists views switch to their large-dataset mode,
+# and changes from which bulk changes are applied with the models detached from the views
+LARGE_DATASET_ROWS = int(environ.get('FLOW_DASHBOARD_LARGE_DATASET_ROWS', '2000'))
+
+# If set, report the time to the first frame and quit
+MEASURE_STARTUP = environ.get('FLOW_DASHBOARD_MEASURE_STARTUP') is not None
+
+# If set, serve the local HTTP/JSON API (see api.py) on this port
+API_PORT = environ.get('FLOW_DASHBOARD_API_PORT')
+
+# Worker threads of background jobs (import, export, publish, reload)
+JOB_WORKERS = int(environ.get('FLOW_DASHBOARD_JOB_WORKERS', '2'))
+
 XSD_SCHEMA_URL =\
 'https://raw.githubusercontent.com/UoC-Radio/audio-scheduler/master/config_schema.xsd'
 
+# Where Publish writes the schedule: directories and http(s) URLs,
+# separated by commas or whitespace
+PUBLISH_TARGETS = environ.get('FLOW_DASHBOARD_PUBLISH_TARGETS', '')
+
+# Name of the published file, in directories and in URLs that end with a slash
+PUBLISH_FILE_NAME = environ.get('FLOW_DASHBOARD_PUBLISH_FILE_NAME', 'schedule.xml')
+
+# Root element of compact schedules, where each zone is defined once (see compact.py)
+LIBRARY_TAG = 'FlowSchedule'
+
+# Assumed length of an inserted item, in playout simulations (see simulation.py)
+SIMULATION_ITEM_MINS = 3.0
+
+# Where the reductions of play logs are cached (see playlog.py)
+PLAY_LOG_CACHE_DIR = environ.get('FLOW_DASHBOARD_PLAY_LOG_CACHE_DIR',
+                                 SESSION_DIR + '/playlogs')
+
+# Where every exported or published week is kept, deduplicated (see history.py)
+HISTORY_DIR = environ.get('FLOW_DASHBOARD_HISTORY_DIR', 'schedules/.history')
+
+# Leading bytes of gzip and xz compressed files
+GZIP_MAGIC = b'\x1f\x8b'
+XZ_MAGIC = b'\xfd7zXZ\x00'
+
 
 # Functions
 
@@ -52,22 +120,99 @@ def getPlaylistNameFromPath(playlistPath):
 def addPlaylistToZone(playlistName, zoneName, model):
     # Add playlist to selected zone as Main playlist.
     # If the zone has already a Main playlist, add it as Intermediate.
-    if not model.zoneHasMainPlaylist(zoneName):
-        playlist = Playlist(playlistName,
-                            'Main', True, '', '', '1', '1', '0', '1')
-    else:
-        playlist = Playlist(playlistName,
-                            'Intermediate', True, '30', '1', '1', '1',
-                            '0', '1')
-    model.addPlaylistToZone(zoneName, playlist)
+    model.addPlaylistToZone(zoneName,
+                            getZonePlaylist(playlistName, model.zoneHasMainPlaylist(zoneName)))
+
+def getZonePlaylist(playlistName, zoneHasMainPlaylist):
+    # Return the playlist that addPlaylistToZone adds to a zone.
+    if not zoneHasMainPlaylist:
+        return Playlist(playlistName,
+                        'Main', True, UNSET, UNSET, 1, 1, 0.0, 1.0)
+    return Playlist(playlistName,
+                    'Intermediate', True, 30, 1, 1, 1,
+                    0.0, 1.0)
+
+def tracked(label):
+    # Return a decorator that records how memory grows in every call of the decorated
+    # function (see memory.py). memory.py, and tracemalloc with it, is imported only
+    # if memory tracking is enabled, so that it does not slow down every startup.
+    def decorator(function):
+        if MEMORY_LOG_PATH is None:
+            return function
+        from memory import tracked as trackedByMemory
+        return trackedByMemory(label)(function)
+    return decorator
+
+def getDefaultPlaylists(playlistNames):
+    # Return the playlists that a new zone starts with, among playlistNames (a set),
+    # so that the database is scanned once for all of them.
+    defaultPlaylists = []
+    if 'fallback' in playlistNames:
+        defaultPlaylists.append(Playlist('fallback', 'Fallback', True, UNSET, UNSET, 2, 2,
+                                         0.0, 1.0))
+    if 'Spots' in playlistNames:
+        defaultPlaylists.append(Playlist('Spots', 'Intermediate', True, 70, 1))
+    if 'Jingles' in playlistNames:
+        defaultPlaylists.append(Playlist('Jingles', 'Intermediate', True, 40, 1))
+    return defaultPlaylists
+
+def parseSetting(column, text):
+    # Convert the text of a playlist setting to the type of its Zone Inspector column.
+    # Empty text stands for an unset setting. Raise ValueError if text is not a number,
+    # or if it is negative: no setting can be, so UNSET is never a real value.
+    text = text.strip() if text is not None else ''
+    if text == '':
+        return UNSET
+    value = ZONE_INSPECTOR_COLUMN_TYPES[column](text)
+    if value < 0:
+        raise ValueError('Playlist settings cannot be negative: ' + text)
+    return value
+
+def formatSetting(value):
+    # Convert a numeric playlist setting to text. Unset settings become empty text.
+    return '' if value == UNSET else str(value)
+
+def openScheduleFile(path):
+    # Open a schedule file for binary reading.
+    # Gzip and xz compressed files are decompressed as they are read, whatever their name.
+    with open(path, 'rb') as scheduleFile:
+        magic = scheduleFile.read(len(XZ_MAGIC))
+    if magic.startswith(GZIP_MAGIC):
+        from gzip import open as openGzip
+        return openGzip(path, 'rb')
+    if magic == XZ_MAGIC:
+        from lzma import open as openXz
+        return openXz(path, 'rb')
+    return open(path, 'rb')
+
+def compressingWriter(path, outputFile):
+    # Return a binary writer to outputFile, which compresses what it is given
+    # if path ends with .gz or .xz. Closing the writer leaves outputFile open.
+    if path.endswith('.gz'):
+        from gzip import GzipFile
+        return GzipFile(basename(path)[:-len('.gz')], 'wb', fileobj=outputFile)
+    if path.endswith('.xz'):
+        from lzma import LZMAFile
+        return LZMAFile(outputFile, 'wb')
+    from contextlib import nullcontext
+    return nullcontext(outputFile)
 
 
 # Classes
 
 class Playlist:
+    """ A zone's playlist and its settings.
+
+    Its fields are typed like the Zone Inspector's columns.
+    Numeric settings that are not set hold UNSET.
+    """
+
+    __slots__ = ('name', 'type', 'shuffle', 'schedIntervalMins', 'numSchedItems',
+                 'fadeInSecs', 'fadeOutSecs', 'minLevel', 'maxLevel')
 
-    def __init__(self, name='', type='', shuffle='', schedIntervalMins='', numSchedItems='',
-                 fadeInSecs='', fadeOutSecs='', minLevel='', maxLevel=''):
+    def __init__(self, name='', type='', shuffle=False, schedIntervalMins=UNSET,
+                 numSchedItems=UNSET, fadeInSecs=UNSET, fadeOutSecs=UNSET, minLevel=UNSET,
+                 maxLevel=UNSET):
         self.name = name
         self.type = type
         self.shuffle = shuffle
@@ -78,6 +223,26 @@ class Playlist:
         self.minLevel = minLevel
         self.maxLevel = maxLevel
 
+    @classmethod
+    def fromRow(cls, row):
+        """ Create a playlist from a Zone Inspector row.
+
+        Settings given as text are converted, so that rows saved before
+        the columns were typed can still be loaded.
+        """
+        values = list(row)
+        values[2] = bool(values[2])
+        for column in range(3, len(values)):
+            if isinstance(values[column], str):
+                values[column] = parseSetting(column, values[column])
+        return cls(*values)
+
+    def toRow(self):
+        """ Return the playlist as a Zone Inspector row. """
+        return (self.name, self.type, self.shuffle, self.schedIntervalMins,
+                self.numSchedItems, self.fadeInSecs, self.fadeOutSecs, self.minLevel,
+                self.maxLevel)
+
 
 # Embedded files
 
@@ -115,6 +280,26 @@ MENU = """<?xml version="1.0" encoding="UTF-8"?>
           <attribute name="action">win.export_xml</attribute>
           <attribute name="label" translatable="yes">Export Schedule ...</attribute>
         </item>
+        <item>
+          <attribute name="action">win.publish</attribute>
+          <attribute name="label" translatable="yes">Publish</attribute>
+        </item>
+        <item>
+          <attribute name="action">win.history</attribute>
+          <attribute name="label" translatable="yes">History ...</attribute>
+        </item>
+        <item>
+          <attribute name="action">win.load_zones</attribute>
+          <attribute name="label" translatable="yes">Load Zones ...</attribute>
+        </item>
+        <item>
+          <attribute name="action">win.import_play_logs</attribute>
+          <attribute name="label" translatable="yes">Import Play Logs ...</attribute>
+        </item>
+        <item>
+          <attribute name="action">win.memory_usage</attribute>
+          <attribute name="label" translatable="yes">Memory Usage</attribute>
+        </item>
       </section>
   </menu>
 </interface>
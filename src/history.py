@@ -0,0 +1,236 @@
+"""
+The History
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime
+from hashlib import sha256
+from json import dumps, loads
+from os import makedirs
+from os.path import exists, join
+from threading import Lock
+from publisher import writeAtomically
+
+
+""" Every exported week, stored once per distinct part.
+
+A version of the schedule is split into chunks: one per zone (its row, its
+playlists and their paths), one per day of the Flow Schedule and one for the
+playlists database. Each chunk is stored under the SHA-256 of its canonical
+JSON, so a chunk that did not change since an earlier version costs nothing.
+The version itself is a chunk that refers to the others by their hashes.
+
+versions.jsonl lists the versions in the order they were recorded, and
+zones.jsonl lists, for each version, only the zones that were added, changed
+or removed by it, so the history of a zone is read without loading versions.
+"""
+
+OBJECTS_DIRECTORY_NAME = 'objects'
+VERSIONS_FILE_NAME = 'versions.jsonl'
+ZONES_FILE_NAME = 'zones.jsonl'
+
+# Number of chunks kept in memory, after they are read
+CHUNK_CACHE_SIZE = 4096
+
+# Zone changes
+ADDED = 'added'
+CHANGED = 'changed'
+REMOVED = 'removed'
+
+
+class History:
+    """ A content-addressed store of schedule versions, in a directory.
+
+    Versions may be recorded and read from any thread.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.objectsDirectory = join(directory, OBJECTS_DIRECTORY_NAME)
+        self.versionsPath = join(directory, VERSIONS_FILE_NAME)
+        self.zonesPath = join(directory, ZONES_FILE_NAME)
+        # chunk id -> chunk, for the chunks read or written lately
+        self.chunks = {}
+        # zone name -> chunk id, in the last recorded version (None until read)
+        self.lastZones = None
+        self.lock = Lock()
+
+
+    # Public methods
+
+    def record(self, snapshot, label='', time=None):
+        """ Record snapshot, a ModelSnapshot, as a new version. Return the version's id.
+
+        label tells where the version went, e.g. the path it was exported to,
+        and time (a datetime) when, if not now.
+        """
+        zones = {}
+        for zone in snapshot.zones:
+            rows = snapshot.getZoneInspectorRows(zone[0])
+            zones[zone[0]] = self.storeChunk({
+                'zone': zone,
+                'playlists': rows,
+                'paths': {row[0]: snapshot.playlistPaths.get(row[0]) for row in rows}})
+        days = [self.storeChunk(sorted(snapshot.schedule[dayIndex]))
+                for dayIndex in range(7)]
+        playlists = self.storeChunk(sorted(snapshot.playlistPaths.items()))
+        versionId = self.storeChunk({'zones': zones, 'days': days, 'playlists': playlists})
+        time = (time or datetime.now()).isoformat(timespec='seconds')
+        with self.lock:
+            lastZones = self.getLastZones()
+            changes = []
+            for zoneName, chunkId in sorted(zones.items()):
+                if zoneName not in lastZones:
+                    changes.append((zoneName, ADDED, chunkId))
+                elif lastZones[zoneName] != chunkId:
+                    changes.append((zoneName, CHANGED, chunkId))
+            for zoneName in sorted(lastZones.keys() - zones.keys()):
+                changes.append((zoneName, REMOVED, None))
+            with open(self.zonesPath, 'a') as zonesFile:
+                for zoneName, change, chunkId in changes:
+                    zonesFile.write(dumps({'zone': zoneName, 'change': change,
+                                           'chunk': chunkId, 'version': versionId,
+                                           'time': time}) + '\n')
+            with open(self.versionsPath, 'a') as versionsFile:
+                versionsFile.write(dumps({'version': versionId, 'time': time,
+                                          'label': label, 'changes': len(changes)}) + '\n')
+            self.lastZones = zones
+        return versionId
+
+    def getVersions(self):
+        """ Return every recorded version, oldest first.
+
+        Each is a dictionary with its 'version' id, 'time', 'label' and the
+        number of zones it 'changes'.
+        """
+        return readLines(self.versionsPath)
+
+    def getZoneHistory(self, zoneName):
+        """ Return every change of zoneName, oldest first.
+
+        Each is a dictionary with its 'change' (ADDED, CHANGED or REMOVED),
+        the 'version' id and 'time' it was recorded, and the id of the zone's
+        'chunk' (see getZone).
+        """
+        with self.lock:
+            return [change for change in readLines(self.zonesPath)
+                    if change['zone'] == zoneName]
+
+    def getZone(self, chunkId):
+        """ Return the zone chunk with chunkId: its 'zone' row, its 'playlists' rows and
+        their 'paths'.
+        """
+        return self.loadChunk(chunkId)
+
+    def checkout(self, versionId):
+        """ Return the version with versionId as a Model state (see Model.getState). """
+        version = self.loadChunk(versionId)
+        state = {'zones': [], 'zoneInspector': {},
+                 'playlists': [list(playlist)
+                               for playlist in self.loadChunk(version['playlists'])],
+                 'schedule': [[list(row) for row in self.loadChunk(dayId)]
+                              for dayId in version['days']]}
+        for zoneName, chunkId in version['zones'].items():
+            zone = self.loadChunk(chunkId)
+            state['zones'].append(list(zone['zone']))
+            state['zoneInspector'][zoneName] = [list(row) for row in zone['playlists']]
+        return state
+
+
+    # Private methods
+
+    def storeChunk(self, chunk):
+        """ Store chunk, unless it is already stored. Return its id. """
+        data = dumps(chunk, sort_keys=True, separators=(',', ':'),
+                     ensure_ascii=False).encode('utf-8')
+        chunkId = sha256(data).hexdigest()
+        with self.lock:
+            if chunkId in self.chunks:
+                return chunkId
+        path = self.getChunkPath(chunkId)
+        if not exists(path):
+            makedirs(join(self.objectsDirectory, chunkId[:2]), exist_ok=True)
+            writeAtomically(path, data)
+        self.cacheChunk(chunkId, loads(data))
+        return chunkId
+
+    def loadChunk(self, chunkId):
+        """ Return the chunk with chunkId. Raise KeyError if it is missing or corrupt. """
+        with self.lock:
+            chunk = self.chunks.get(chunkId)
+        if chunk is not None:
+            return chunk
+        chunk = self.readChunk(chunkId)
+        self.cacheChunk(chunkId, chunk)
+        return chunk
+
+    def readChunk(self, chunkId):
+        """ Read the chunk with chunkId from its file, bypassing the cache.
+
+        Raise KeyError if it is missing or corrupt.
+        """
+        try:
+            with open(self.getChunkPath(chunkId), 'rb') as chunkFile:
+                data = chunkFile.read()
+        except OSError:
+            raise KeyError('chunk ' + chunkId + ' is missing')
+        if sha256(data).hexdigest() != chunkId:
+            raise KeyError('chunk ' + chunkId + ' is corrupt')
+        return loads(data)
+
+    def cacheChunk(self, chunkId, chunk):
+        """ Keep chunk in memory. """
+        with self.lock:
+            if len(self.chunks) >= CHUNK_CACHE_SIZE:
+                self.chunks.clear()
+            self.chunks[chunkId] = chunk
+
+    def getChunkPath(self, chunkId):
+        return join(self.objectsDirectory, chunkId[:2], chunkId[2:] + '.json')
+
+    def getLastZones(self):
+        """ Return the zone chunks of the last recorded version. Call with the lock held.
+
+        If that version cannot be read, it is as if there were no previous version:
+        every zone of the next one is recorded as added.
+        """
+        if self.lastZones is None:
+            self.lastZones = {}
+            versions = readLines(self.versionsPath)
+            if versions:
+                # Not loadChunk, which takes the lock
+                try:
+                    self.lastZones = self.readChunk(versions[-1]['version'])['zones']
+                except KeyError as e:
+                    print('Ignoring the last version of the history, as ' + e.args[0] + '.')
+        return self.lastZones
+
+
+# Functions
+
+def readLines(path):
+    """ Return the JSON lines of path, skipping a half-written last one. """
+    if not exists(path):
+        return []
+    lines = []
+    with open(path) as linesFile:
+        for line in linesFile:
+            try:
+                lines.append(loads(line))
+            except ValueError:
+                continue
+    return lines
@@ -0,0 +1,193 @@
+"""
+The Job Scheduler
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+from traceback import print_exc
+from gi.repository.GLib import idle_add
+
+
+# The resource of jobs that read or write the Model. They run one at a time.
+MODEL = 'model'
+
+# How often a job that waits for the main loop checks for shutdown
+MAIN_LOOP_POLL_SECS = 0.1
+
+# Job statuses
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """ A function to run in the background, and its status. """
+
+    __slots__ = ('name', 'function', 'args', 'resources', 'onDone', 'status', 'result',
+                 'error')
+
+    def __init__(self, name, function, args, resources, onDone):
+        self.name = name
+        self.function = function
+        self.args = args
+        self.resources = frozenset(resources)
+        self.onDone = onDone
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+
+
+class JobScheduler:
+    """ Run background jobs on a bounded pool of worker threads.
+
+    A job may name the resources it uses, e.g. MODEL. Jobs that share a
+    resource run one at a time, in the order they were submitted. Jobs that
+    share none may run in parallel, up to the size of the pool.
+
+    Whatever the jobs ask of the main loop (progress, popups, their onDone
+    callbacks) goes through post, which batches it into a single idle_add
+    callback, in order.
+    """
+
+    def __init__(self, maxWorkers):
+        self.maxWorkers = maxWorkers
+        self.executor = ThreadPoolExecutor(max_workers=maxWorkers,
+                                           thread_name_prefix='job')
+        self.queued = deque()
+        self.running = []
+        # Functions (and their arguments) to call in the main loop
+        self.posted = []
+        self.deliveryPending = False
+        self.lock = Lock()
+        # Set on shutdown, so that jobs stop waiting for the main loop
+        self.stopped = False
+
+
+    # Public methods
+
+    def submit(self, name, function, *args, resources=(), onDone=None):
+        """ Queue function(*args) to run in the background. Return its Job.
+
+        If given, onDone(job) is called in the main loop when the job ends.
+        """
+        job = Job(name, function, args, resources, onDone)
+        with self.lock:
+            self.queued.append(job)
+            self.dispatch()
+        return job
+
+    def post(self, function, *args):
+        """ Call function(*args) in the main loop. Callable from any thread. """
+        with self.lock:
+            self.posted.append((function, args))
+            if self.deliveryPending:
+                return
+            self.deliveryPending = True
+        idle_add(self.deliver)
+
+    def callInMainLoop(self, function, *args):
+        """ Call function(*args) in the main loop and return its result, or raise its exception.
+
+        Call it from a job. Raise RuntimeError if the scheduler shuts down meanwhile.
+        """
+        result = []
+        errors = []
+        called = Event()
+        def call():
+            try:
+                result.append(function(*args))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                called.set()
+        self.post(call)
+        while not called.wait(MAIN_LOOP_POLL_SECS):
+            if self.stopped:
+                raise RuntimeError('The job scheduler is shutting down.')
+        if errors:
+            raise errors[0]
+        return result[0]
+
+    def isBusy(self, resource):
+        """ Return true if a job that uses resource is queued or running. """
+        with self.lock:
+            return any(resource in job.resources for job in self.running + list(self.queued))
+
+    def getJobs(self):
+        """ Return the name and status of every queued and running job. """
+        with self.lock:
+            return [(job.name, job.status) for job in self.running + list(self.queued)]
+
+    def shutdown(self):
+        """ Drop the queued jobs and wait for the running ones. """
+        with self.lock:
+            self.stopped = True
+            self.queued.clear()
+        self.executor.shutdown(wait=True)
+
+
+    # Private methods
+
+    def dispatch(self):
+        """ Start every queued job that can run now. Call with the lock held. """
+        busy = set()
+        for job in self.running:
+            busy |= job.resources
+        for job in list(self.queued):
+            if len(self.running) >= self.maxWorkers:
+                break
+            # A job that must wait keeps its resources from later jobs too, to keep their order
+            if job.resources & busy:
+                busy |= job.resources
+                continue
+            busy |= job.resources
+            self.queued.remove(job)
+            self.running.append(job)
+            job.status = RUNNING
+            self.executor.submit(self.run, job)
+
+    def run(self, job):
+        """ Run job on a worker thread. """
+        try:
+            job.result = job.function(*job.args)
+            job.status = DONE
+        except Exception as e:
+            print('Job "' + job.name + '" failed.')
+            print_exc()
+            job.error = e
+            job.status = FAILED
+        with self.lock:
+            self.running.remove(job)
+            self.dispatch()
+        if job.onDone is not None:
+            self.post(job.onDone, job)
+
+    def deliver(self):
+        """ Call everything posted since the last delivery. Runs in the main loop. """
+        with self.lock:
+            posted = self.posted
+            self.posted = []
+            self.deliveryPending = False
+        for function, args in posted:
+            try:
+                function(*args)
+            except Exception:
+                print_exc()
+        return False
@@ -0,0 +1,202 @@
+"""
+The Journal
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from glob import glob
+from json import dump, dumps, load, loads
+from os import O_RDONLY, close, fsync, makedirs, open as openFileDescriptor, remove, replace
+from os.path import exists, join
+from threading import Lock
+
+
+SNAPSHOT_FILE_NAME = 'snapshot.json'
+JOURNAL_FILE_NAME = 'journal.{}.jsonl'
+
+# Number of records after which the journal is synced, without waiting for autosave
+SYNC_BATCH_SIZE = 256
+
+# Number of records after which autosave compacts the journal into a snapshot
+COMPACTION_THRESHOLD = 5000
+
+
+class Journal:
+    """ Record every Model mutation in an append-only file on disk.
+
+    Each record is a short JSON line that is flushed as soon as it is written,
+    so that it survives a crash of the application. Records are synced to
+    the disk in batches. From time to time, the journal is compacted, i.e.
+    replaced by a snapshot of the whole Model.
+
+    Snapshots and journals are numbered by generation: a snapshot of generation
+    g is followed by the journal of generation g, so a crash during compaction
+    never replays a journal on top of a snapshot that already contains it.
+    """
+
+    def __init__(self, model, directory, isModelBusy=None):
+        self.model = model
+        # Returns true while the Model may be mutated on another thread (see autosave)
+        self.isModelBusy = isModelBusy
+        self.directory = directory
+        self.snapshotPath = join(directory, SNAPSHOT_FILE_NAME)
+        self.generation = 0
+        self.journalFile = None
+        self.lock = Lock()
+        self.recordsSinceSync = 0
+        self.recordsSinceSnapshot = 0
+
+
+    # Public methods
+
+    def recover(self):
+        """ Load the last snapshot and replay its journal on top of it.
+
+        Return the number of replayed records.
+        Meant to be called before the journal starts recording.
+        """
+        if exists(self.snapshotPath):
+            try:
+                with open(self.snapshotPath) as snapshotFile:
+                    snapshot = load(snapshotFile)
+            except ValueError as e:
+                print('Failed to load session snapshot.\n' + str(e))
+            else:
+                self.generation = snapshot['generation']
+                self.model.loadState(snapshot['state'])
+        replayedRecords = 0
+        journalPath = self.getJournalPath(self.generation)
+        if exists(journalPath):
+            with open(journalPath) as journalFile:
+                for line in journalFile:
+                    try:
+                        operation, args = loads(line)
+                    except ValueError:
+                        # A crash may leave the last record half-written
+                        print('Ignoring incomplete journal record.')
+                        continue
+                    try:
+                        self.model.applyMutation(operation, args)
+                    except Exception as e:
+                        print('Failed to replay journal record "' + operation + '".\n' +
+                              str(e))
+                    replayedRecords += 1
+        return replayedRecords
+
+    def open(self):
+        """ Start recording on top of a fresh snapshot of the (recovered) Model. """
+        makedirs(self.directory, exist_ok=True)
+        self.compact()
+
+    def record(self, operation, args):
+        """ Append a mutation to the journal.
+
+        Meant to be used as a Model mutation listener.
+        """
+        line = dumps([operation, args], separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.journalFile is None:
+                return
+            self.journalFile.write(line)
+            self.journalFile.flush()
+            self.recordsSinceSync += 1
+            self.recordsSinceSnapshot += 1
+            if operation == 'loadState':
+                # The record holds the whole Model. Compact on next autosave.
+                self.recordsSinceSnapshot = COMPACTION_THRESHOLD
+            if self.recordsSinceSync >= SYNC_BATCH_SIZE:
+                self.syncJournalFile()
+
+    def sync(self):
+        """ Make sure that every record written so far has reached the disk. """
+        with self.lock:
+            if self.journalFile is not None:
+                self.syncJournalFile()
+
+    def autosave(self):
+        """ Sync the journal and compact it, if it has grown large.
+
+        Meant to be called periodically from the main loop.
+        Return true, to keep being called.
+
+        A mutation made on another thread is recorded after it is made, so
+        a snapshot taken in between would hold it, and the new journal would
+        replay it again. Compaction waits until the Model is not busy.
+        """
+        self.sync()
+        if self.recordsSinceSnapshot >= COMPACTION_THRESHOLD and\
+           (self.isModelBusy is None or not self.isModelBusy()):
+            self.compact()
+        return True
+
+    def compact(self):
+        """ Replace the journal with a snapshot of the whole Model. """
+        with self.lock:
+            nextGeneration = self.generation + 1
+            temporaryPath = self.snapshotPath + '.tmp'
+            with open(temporaryPath, 'w') as snapshotFile:
+                dump({'generation': nextGeneration, 'state': self.model.getState()},
+                     snapshotFile, separators=(',', ':'))
+                snapshotFile.flush()
+                fsync(snapshotFile.fileno())
+            replace(temporaryPath, self.snapshotPath)
+            if self.journalFile is not None:
+                self.journalFile.close()
+            self.generation = nextGeneration
+            self.journalFile = open(self.getJournalPath(self.generation), 'w')
+            self.syncDirectory()
+            self.recordsSinceSync = 0
+            self.recordsSinceSnapshot = 0
+            self.removeStaleJournals()
+
+    def isRecording(self):
+        """ Return true if the journal is open for recording. """
+        return self.journalFile is not None
+
+    def close(self):
+        """ Compact the journal and stop recording. """
+        self.compact()
+        with self.lock:
+            self.journalFile.close()
+            self.journalFile = None
+
+
+    # Private methods
+
+    def getJournalPath(self, generation):
+        """ Return the path of the journal that follows the snapshot of generation. """
+        return join(self.directory, JOURNAL_FILE_NAME.format(generation))
+
+    def syncJournalFile(self):
+        """ Sync the journal file. The lock must be held. """
+        if self.recordsSinceSync > 0:
+            fsync(self.journalFile.fileno())
+            self.recordsSinceSync = 0
+
+    def syncDirectory(self):
+        """ Sync the directory, so that renamed and created files survive a crash. """
+        directoryDescriptor = openFileDescriptor(self.directory, O_RDONLY)
+        try:
+            fsync(directoryDescriptor)
+        finally:
+            close(directoryDescriptor)
+
+    def removeStaleJournals(self):
+        """ Remove the journals of older generations. """
+        currentJournalPath = self.getJournalPath(self.generation)
+        for journalPath in glob(join(self.directory, JOURNAL_FILE_NAME.format('*'))):
+            if journalPath != currentJournalPath:
+                remove(journalPath)
@@ -17,6 +17,9 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from time import perf_counter
+STARTUP_TIME = perf_counter()
+
 from controller import Controller
 
 
@@ -25,4 +28,4 @@ if __name__ == '__main__':
 
     It subclasses Application.
     """
-    Controller().run()
+    Controller(STARTUP_TIME).run()
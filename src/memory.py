@@ -0,0 +1,289 @@
+"""
+Memory accounting
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime
+from functools import wraps
+from gc import collect
+from json import dumps
+from os import getpid
+from sys import getsizeof
+from threading import Lock
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+import tracemalloc
+from helpers import MEMORY_LOG_PATH, WEEK
+
+
+""" How much memory the Model and its companions hold, and how it grows.
+
+The report estimates the bytes of each subsystem. Rows of ListStores live in
+GTK, out of Python's sight, so they are estimated from their number and the
+length of their strings. Python objects are measured with sys.getsizeof,
+following their references. lxml trees live in libxml2 and are estimated
+from their number of elements.
+
+Memory growth is tracked with tracemalloc, by setting the
+FLOW_DASHBOARD_MEMORY_LOG environment variable to the path of a log file.
+Imports and exports then take a tracemalloc snapshot before and after they
+run, and append the difference to the log as a JSON line, so that the growth
+can be compared across sessions. When tracking is disabled, trackMemory
+returns a shared object that does nothing, and tracked returns the decorated
+function itself.
+"""
+
+ENABLED = MEMORY_LOG_PATH is not None
+
+# Estimated bytes of a ListStore row, of each of its cells, and of a string's allocation
+STORE_ROW_BYTES = 48
+STORE_CELL_BYTES = 16
+STRING_ALLOCATION_BYTES = 16
+
+# Estimated bytes of an lxml element, besides its text
+TREE_ELEMENT_BYTES = 120
+
+# Number of source lines reported for each memory difference
+MEMORY_DIFF_TOP = 10
+
+LOG_LOCK = Lock()
+
+
+# Functions
+
+def getMemoryReport(model, extras=()):
+    """ Return the estimated memory of the Model's stores and caches, and of extras.
+
+    extras are (name, object) pairs, e.g. indices, that are measured with deepSizeOf,
+    without what they share with each other or refer to through the Model.
+    Each entry of the report is a (name, rows, bytes) tuple, where rows is None
+    if the name has no rows.
+    """
+    report = []
+    for dayIndex in range(7):
+        report.append(('Flow Schedule, ' + WEEK[dayIndex],) +
+                      getStoreSize(model.schedule[dayIndex]))
+    report.append(('Zones',) + getStoreSize(model.zones))
+    zoneInspector = model.zoneInspector
+    report.append(('Zone Inspector, lists (' + str(len(zoneInspector.rows)) + ' zones)',
+                   sum(len(rows) for rows in zoneInspector.rows.values()),
+                   deepSizeOf(zoneInspector.rows)))
+    storeRows = storeBytes = 0
+    for store in zoneInspector.stores.values():
+        rows, size = getStoreSize(store)
+        storeRows += rows
+        storeBytes += size
+    report.append(('Zone Inspector, stores (' + str(len(zoneInspector.stores)) + ' zones)',
+                   storeRows, storeBytes))
+    # Frozen rows share their tuples with the lists, which are counted once
+    report.append(('Zone Inspector, snapshots (' + str(len(zoneInspector.frozenRows)) +
+                   ' zones)',
+                   sum(len(rows) for rows in zoneInspector.frozenRows.values()),
+                   deepSizeOf(zoneInspector.frozenRows, getSharedIds(zoneInspector.rows))))
+    report.append(('Playlists',) + getStoreSize(model.playlists))
+    seen = {id(model)}
+    for name, extra in extras:
+        report.append((name, None, deepSizeOf(extra, seen)))
+    return report
+
+def getStoreSize(store):
+    """ Return the rows and the estimated bytes of a ListStore. """
+    columns = store.get_n_columns()
+    size = len(store) * (STORE_ROW_BYTES + columns * STORE_CELL_BYTES)
+    for row in store:
+        for value in row:
+            if isinstance(value, str):
+                size += len(value.encode('utf-8')) + 1 + STRING_ALLOCATION_BYTES
+    return len(store), size
+
+def getTreeSize(root):
+    """ Return the elements and the estimated bytes of an lxml tree. """
+    elements = 0
+    size = 0
+    for element in root.iter():
+        elements += 1
+        size += TREE_ELEMENT_BYTES + len(element.text or '') + len(element.tail or '')
+        for name, value in element.attrib.items():
+            size += len(name) + len(value) + STRING_ALLOCATION_BYTES
+    return elements, size
+
+def deepSizeOf(value, seen=None):
+    """ Return the bytes of value and of everything it refers to, each counted once.
+
+    seen is a set of ids of objects that are not counted, and it is updated.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    pending = [value]
+    while pending:
+        value = pending.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += getsizeof(value)
+        if isinstance(value, dict):
+            pending.extend(value.keys())
+            pending.extend(value.values())
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            pending.extend(value)
+        elif isinstance(value, (str, bytes, int, float, bool, type, ModuleType, FunctionType,
+                                MethodType, BuiltinFunctionType)) or value is None:
+            # Code is not data, and methods would lead back to their objects
+            continue
+        else:
+            if hasattr(value, '__dict__'):
+                pending.append(value.__dict__)
+            for name in getattr(type(value), '__slots__', ()):
+                if hasattr(value, name):
+                    pending.append(getattr(value, name))
+    return size
+
+def getSharedIds(value):
+    """ Return the ids of value and of everything it refers to, for deepSizeOf to skip. """
+    seen = set()
+    deepSizeOf(value, seen)
+    return seen
+
+def getProcessMemory():
+    """ Return the resident memory of the process in bytes, or None if unknown. """
+    try:
+        with open('/proc/self/statm') as statmFile:
+            residentPages = int(statmFile.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    from os import sysconf
+    return residentPages * sysconf('SC_PAGE_SIZE')
+
+def formatReport(report):
+    """ Return a memory report as a text table. """
+    nameWidth = max(len(entry[0]) for entry in report)
+    lines = [('Subsystem'.ljust(nameWidth) + '  ' + 'Rows'.rjust(8) + '  ' +
+              'KiB'.rjust(10))]
+    for name, rows, size in report:
+        lines.append(name.ljust(nameWidth) + '  ' +
+                     ('' if rows is None else str(rows)).rjust(8) + '  ' +
+                     formatKiB(size).rjust(10))
+    lines.append('Total'.ljust(nameWidth) + '  ' + ''.rjust(8) + '  ' +
+                 formatKiB(sum(entry[2] for entry in report)).rjust(10))
+    processMemory = getProcessMemory()
+    if processMemory is not None:
+        lines.append('Process (resident)'.ljust(nameWidth) + '  ' + ''.rjust(8) + '  ' +
+                     formatKiB(processMemory).rjust(10))
+    return '\n'.join(lines)
+
+def formatKiB(size):
+    return str(round(size / 1024, 1))
+
+def formatDiff(record):
+    """ Return a memory difference, as recorded by MemoryDiff, as text. """
+    lines = [record['label'] + ': ' + ('+' if record['growth'] >= 0 else '') +
+             formatKiB(record['growth']) + ' KiB (now ' + formatKiB(record['current']) +
+             ' KiB, peak ' + formatKiB(record['peak']) + ' KiB)']
+    for entry in record['top']:
+        lines.append('  ' + ('+' if entry['size'] >= 0 else '') + formatKiB(entry['size']) +
+                     ' KiB in ' + str(entry['count']) + ' blocks  ' + entry['where'])
+    return '\n'.join(lines)
+
+def trackMemory(label):
+    """ Return a context manager that records how memory grows in the code it wraps. """
+    if ENABLED:
+        return MemoryDiff(label)
+    return NULL_DIFF
+
+def tracked(label):
+    """ Return a decorator that records how memory grows in every call of the decorated
+    function.
+    """
+    def decorator(function):
+        if not ENABLED:
+            return function
+        @wraps(function)
+        def trackedFunction(*args, **kwargs):
+            with MemoryDiff(label):
+                return function(*args, **kwargs)
+        return trackedFunction
+    return decorator
+
+def takeSnapshot():
+    """ Take a tracemalloc snapshot, without tracemalloc's own allocations. """
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        tracemalloc.Filter(False, '<unknown>')))
+
+
+# Classes
+
+class MemoryDiff:
+    """ Record the difference of two tracemalloc snapshots, from entry to exit.
+
+    Starts tracemalloc, if it is not tracing. What is still allocated on exit,
+    compared to entry, and the peak in between are kept in record, and appended
+    to the memory log, if there is one.
+    """
+
+    def __init__(self, label):
+        self.label = label
+        self.record = None
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.before = takeSnapshot()
+        tracemalloc.reset_peak()
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        # Count what is kept, not the garbage that waits for the cycle collector
+        collect()
+        statistics = takeSnapshot().compare_to(self.before, 'lineno')
+        self.before = None
+        current, peak = tracemalloc.get_traced_memory()
+        self.record = {
+            'time': datetime.now().isoformat(timespec='seconds'), 'pid': getpid(),
+            'label': self.label, 'growth': sum(stat.size_diff for stat in statistics),
+            'current': current, 'peak': peak,
+            'top': [{'where': str(stat.traceback[0]), 'size': stat.size_diff,
+                     'count': stat.count_diff}
+                    for stat in statistics[:MEMORY_DIFF_TOP]]}
+        if MEMORY_LOG_PATH is not None:
+            print(formatDiff(self.record))
+            with LOG_LOCK:
+                with open(MEMORY_LOG_PATH, 'a') as logFile:
+                    logFile.write(dumps(self.record) + '\n')
+        return False
+
+
+class NullDiff:
+    """ Do nothing, as cheaply as possible. """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        return False
+
+
+NULL_DIFF = NullDiff()
+
+
+if ENABLED:
+    # Trace from the start, so that snapshots see every allocation they compare
+    tracemalloc.start()
@@ -17,8 +17,12 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from collections import OrderedDict
 from gi.repository.Gtk import ListStore, SortType, TreePath
-from helpers import Playlist, getPlaylistNameFromPath
+from helpers import Playlist, getPlaylistNameFromPath, getDefaultPlaylists,\
+                    ZONE_INSPECTOR_CACHE_SIZE, ZONE_INSPECTOR_COLUMN_TYPES
+from tracing import traced
+from events import ChangeBus, getChangeEvent
 
 
 class Model:
@@ -29,11 +33,7 @@ class Model:
     """
 
     def __init__(self):
-        """ Initialize sub-models.
-
-        Do not initialize the zoneInspector sub-model,
-        because no zone exists on application startup.
-        """
+        """ Initialize sub-models. """
         # Weekly Schedule Model
         self.schedule = {}
         for dayIndex in range(7):
@@ -45,15 +45,125 @@ class Model:
         self.zones.set_sort_column_id(0, SortType.ASCENDING)
 
         # Zone Inspector Model
-        self.zoneInspector = {}
+        self.zoneInspector = ZoneInspector(ZONE_INSPECTOR_CACHE_SIZE)
 
         # Playlist Model
         self.playlists = ListStore(str, str)
         self.playlists.set_sort_column_id(0, SortType.ASCENDING)
 
+        # Functions called with (operation, args) after every mutation.
+        # Only the Journal listens to them, as it records replayable mutations.
+        self.mutationListeners = []
+
+        # Carries typed change events (see events.py), for everything else
+        self.changes = ChangeBus()
+
 
     # Public methods
 
+    def addMutationListener(self, listener):
+        """ Call listener after every mutation of the Model.
+
+        The listener receives the name of the mutating method and a list of
+        arguments that can be given to applyMutation, to repeat the mutation.
+        Rows are identified by their contents instead of their positions,
+        so that a recorded mutation can be applied to another Model.
+
+        This is meant for recording mutations, as the Journal does. Anything
+        that follows the Model subscribes to its change events instead.
+        """
+        self.mutationListeners.append(listener)
+
+    def subscribe(self, subscriber, batched=True):
+        """ Call subscriber with lists of typed change events (see events.py).
+
+        If batched, subscriber is called in the main loop, once per main loop
+        iteration in which the Model changed. Else, it is called on every change,
+        in the thread that made it, for indices that must be up to date as soon
+        as an edit is made.
+        """
+        self.changes.subscribe(subscriber, batched)
+
+    def applyMutation(self, operation, args):
+        """ Repeat a mutation, as it was passed to the mutation listeners. """
+        if operation == 'removeZoneFromDatabase':
+            self.removeZoneFromDatabase(self.getZoneRow(args[0]))
+        elif operation == 'editZoneInDatabase':
+            self.editZoneInDatabase(self.getZoneRow(args[0]), args[1], args[2])
+        elif operation == 'editPlaylistInDatabase':
+            self.editPlaylistInDatabase(self.getPlaylistRow(args[0]), args[1], args[2])
+        elif operation == 'removePlaylistFromDatabase':
+            self.removePlaylistFromDatabase(self.getPlaylistRow(args[0]))
+        elif operation == 'removeZoneFromSchedule':
+            self.removeZoneFromSchedule(args[0], self.getRowOfValuesInModel(
+                                                 args[1], self.schedule[args[0]]))
+        elif operation == 'editZoneInSchedule':
+            self.editZoneInSchedule(args[0], self.getRowOfValuesInModel(
+                                             args[1], self.schedule[args[0]]),
+                                    args[2], args[3])
+        elif operation == 'addPlaylistToZone':
+            self.addPlaylistToZone(args[0], Playlist.fromRow(args[1]))
+        elif operation == 'removePlaylistFromZone':
+            self.removePlaylistFromZone(args[0], self.zoneInspector.findRow(args[0],
+                                                                            args[1]))
+        elif operation == 'editPlaylistInZone':
+            self.editPlaylistInZone(args[0], self.zoneInspector.findRow(args[0], args[1]),
+                                    args[2], args[3])
+        else:
+            getattr(self, operation)(*args)
+
+    def getState(self):
+        """ Return the contents of the Model as plain lists and dictionaries. """
+        return {
+            'zones': [list(zone) for zone in self.zones],
+            'playlists': [list(playlist) for playlist in self.playlists],
+            'zoneInspector': {zoneName: [list(row) for row in
+                                         self.zoneInspector.getRows(zoneName)]
+                              for zoneName in self.zoneInspector},
+            'schedule': [[list(row) for row in self.schedule[dayIndex]]
+                         for dayIndex in range(7)]
+        }
+
+    @traced('model')
+    def getSnapshot(self):
+        """ Return an immutable copy of the Model, to be read from any thread.
+
+        Call it from the main loop. Zones whose playlists have not changed since
+        the previous snapshot share their rows with it, so it is cheap to repeat.
+        """
+        return ModelSnapshot(tuple(tuple(zone) for zone in self.zones),
+                             {playlist[0]: playlist[1] for playlist in self.playlists},
+                             {zoneName: self.zoneInspector.freeze(zoneName)
+                              for zoneName in self.zoneInspector},
+                             tuple(tuple(tuple(row) for row in self.schedule[dayIndex])
+                                   for dayIndex in range(7)))
+
+    def loadState(self, state):
+        """ Replace the contents of the Model with state, as returned by getState. """
+        for dayIndex in range(7):
+            self.schedule[dayIndex].clear()
+        self.zones.clear()
+        self.playlists.clear()
+        # Zone Inspector's view may display one of the stores, so they are refilled
+        self.zoneInspector.clear({zone[0] for zone in state['zones']})
+        for zone in state['zones']:
+            self.zones.append(tuple(zone))
+            self.zoneInspector.create(zone[0])
+        for playlist in state['playlists']:
+            self.playlists.append(tuple(playlist))
+        for zoneName, rows in state['zoneInspector'].items():
+            for row in rows:
+                self.zoneInspector.appendRow(zoneName, Playlist.fromRow(row).toRow())
+        for dayIndex, rows in enumerate(state['schedule']):
+            for row in rows:
+                self.schedule[dayIndex].append(tuple(row))
+        self.notifyMutation('loadState', state)
+
+    def isEmpty(self):
+        """ Return true if the Model holds no zones, playlists or schedule rows. """
+        return (len(self.zones) == 0 and len(self.playlists) == 0 and
+                all(len(self.schedule[dayIndex]) == 0 for dayIndex in range(7)))
+
     def addZoneToDatabase(self, zoneName, zoneMaintainers='',
                           zoneDescription='', zoneComments=''):
         """ Add a zone to the database.
@@ -61,7 +171,9 @@ class Model:
         Subsequently, initialize its inspector.
         """
         self.zones.append((zoneName, zoneDescription, zoneMaintainers, zoneComments))
-        self.initZoneInspector(zoneName)
+        self.zoneInspector.create(zoneName)
+        self.notifyMutation('addZoneToDatabase', zoneName, zoneMaintainers,
+                            zoneDescription, zoneComments)
 
     def removeZoneFromDatabase(self, zoneRow):
         """
@@ -80,8 +192,8 @@ class Model:
                     del self.schedule[dayIndex][scheduleRow]
                 else:
                     break
-        self.zoneInspector[zoneName].clear()
-        del self.zoneInspector[zoneName]
+        self.zoneInspector.remove(zoneName)
+        self.notifyMutation('removeZoneFromDatabase', zoneName)
 
     def editZoneNameInDatabase(self, oldZoneName, newZoneName):
         """ Edit a zone's name in the database.
@@ -99,14 +211,26 @@ class Model:
                     self.schedule[dayIndex][scheduleRow][1] = newZoneName
                 else:
                     break
-        self.initZoneInspector(newZoneName)
-        self.zoneInspector[newZoneName] = self.zoneInspector[oldZoneName]
-        del self.zoneInspector[oldZoneName]
+        self.zoneInspector.rename(oldZoneName, newZoneName)
+        self.notifyMutation('editZoneNameInDatabase', oldZoneName, newZoneName)
+
+    def editZoneInDatabase(self, zoneRow, column, newValue):
+        """ Edit a zone's metadata (anything but its name) in the database. """
+        zoneName = self.zones[zoneRow][0]
+        self.zones[zoneRow][column] = newValue
+        self.notifyMutation('editZoneInDatabase', zoneName, column, newValue)
 
     def addPlaylistToDatabase(self, playlistPath):
         """ Add a playlist to the database. """
         playlistName = getPlaylistNameFromPath(playlistPath)
         self.playlists.append((playlistName, playlistPath))
+        self.notifyMutation('addPlaylistToDatabase', playlistPath)
+
+    def editPlaylistInDatabase(self, playlistRow, column, newValue):
+        """ Edit a playlist's path (anything but its name) in the database. """
+        playlistName = self.playlists[playlistRow][0]
+        self.playlists[playlistRow][column] = newValue
+        self.notifyMutation('editPlaylistInDatabase', playlistName, column, newValue)
 
     def removePlaylistFromDatabase(self, playlistRow):
         """ Remove a playlist from the database.
@@ -115,80 +239,103 @@ class Model:
         """
         playlistName = self.playlists[playlistRow][0]
         del self.playlists[playlistRow]
-        for zone in self.zones:
-            zoneName = zone[0]
-            while True:
-                zoneInspectorRow = self.getRowOfItemInColumnOfModel(
-                                   playlistName, 0, self.zoneInspector[zoneName])
-                if zoneInspectorRow is not None:
-                    del self.zoneInspector[zoneName][zoneInspectorRow]
-                else:
-                    break
+        for zoneName in self.zoneInspector:
+            self.zoneInspector.removeRowsWithValue(zoneName, 0, playlistName)
+        self.notifyMutation('removePlaylistFromDatabase', playlistName)
 
     def addZoneToSchedule(self, dayIndex, zoneName, zoneStartTime='00:00'):
         """ Add zoneName to the day that corresponds to dayIndex in Flow Schedule. """
         self.schedule[dayIndex].append((zoneStartTime, zoneName))
+        self.notifyMutation('addZoneToSchedule', dayIndex, zoneName, zoneStartTime)
 
     def removeZoneFromSchedule(self, dayIndex, scheduleRow):
         """ Remove a zone from the day that corresponds to dayIndex in Flow Schedule. """
+        removedRow = list(self.schedule[dayIndex][scheduleRow])
         del self.schedule[dayIndex][scheduleRow]
+        self.notifyMutation('removeZoneFromSchedule', dayIndex, removedRow)
+
+    def editZoneInSchedule(self, dayIndex, scheduleRow, column, newValue):
+        """ Edit a zone's occurrence in the day that corresponds to dayIndex. """
+        editedRow = list(self.schedule[dayIndex][scheduleRow])
+        self.schedule[dayIndex][scheduleRow][column] = newValue
+        self.notifyMutation('editZoneInSchedule', dayIndex, editedRow, column, newValue)
 
     def addPlaylistToZone(self, zoneName, playlist):
         """ Add playlist to zoneName. """
-        self.zoneInspector[zoneName].append((
-            playlist.name, playlist.type, playlist.shuffle, playlist.schedIntervalMins,
-            playlist.numSchedItems, playlist.fadeInSecs, playlist.fadeOutSecs,
-            playlist.minLevel, playlist.maxLevel))
+        row = playlist.toRow()
+        self.zoneInspector.appendRow(zoneName, row)
+        self.notifyMutation('addPlaylistToZone', zoneName, list(row))
 
     def removePlaylistFromZone(self, zoneName, zoneInspectorRow):
         """ Remove the playlist located in zoneInspectorRow from zoneName. """
-        del self.zoneInspector[zoneName][zoneInspectorRow]
+        removedRow = list(self.zoneInspector.getRow(zoneName, zoneInspectorRow))
+        self.zoneInspector.removeRow(zoneName, zoneInspectorRow)
+        self.notifyMutation('removePlaylistFromZone', zoneName, removedRow)
 
+    def editPlaylistInZone(self, zoneName, zoneInspectorRow, column, newValue):
+        """ Edit a setting of the playlist located in zoneInspectorRow of zoneName. """
+        editedRow = list(self.zoneInspector.getRow(zoneName, zoneInspectorRow))
+        self.zoneInspector.setValue(zoneName, zoneInspectorRow, column, newValue)
+        self.notifyMutation('editPlaylistInZone', zoneName, editedRow, column, newValue)
+
+    def getZoneInspectorStore(self, zoneName):
+        """ Return the ListStore that Zone Inspector displays for zoneName. """
+        return self.zoneInspector.getStore(zoneName)
+
+    def getZoneInspectorValue(self, zoneName, zoneInspectorRow, column):
+        """ Return a setting of the playlist located in zoneInspectorRow of zoneName. """
+        return self.zoneInspector.getRow(zoneName, zoneInspectorRow)[column]
+
+    @traced('model')
     def zoneExistsInDatabase(self, zoneName):
         """ Return true if zoneName exists in database. """
         return self.itemExistsInColumnOfModel(zoneName, 0, self.zones)
 
+    @traced('model')
     def playlistExistsInDatabase(self, playlistName):
         """ Return true if playlistName exists in database. """
         return self.itemExistsInColumnOfModel(playlistName, 0, self.playlists)
 
+    @traced('model')
     def zoneHasMainPlaylist(self, zoneName):
         """ Return true if zoneName has a Main playlist. """
-        return self.itemExistsInColumnOfModel('Main', 1, self.zoneInspector[zoneName])
+        return self.zoneInspector.findValue(zoneName, 1, 'Main') is not None
 
+    @traced('model')
     def getZoneRow(self, zoneName):
         """ Return the zoneName's row in Zones. """
         return self.getRowOfItemInColumnOfModel(zoneName, 0, self.zones)
 
+    @traced('model')
     def getPlaylistRow(self, playlistName):
         """ Return the playlistName's row in Playlists. """
         return self.getRowOfItemInColumnOfModel(playlistName, 0, self.playlists)
 
+    @traced('model')
     def getMainPlaylistRow(self, zoneName):
-        """ Return the Main playlist's row of zoneName in zoneInspector. """
-        return self.getRowOfItemInColumnOfModel('Main', 1, self.zoneInspector[zoneName])
+        """ Return the values of the Main playlist's row of zoneName in zoneInspector. """
+        return self.zoneInspector.getRowWithValue(zoneName, 1, 'Main')
 
+    @traced('model')
     def getFallbackPlaylistRow(self, zoneName):
-        """ Return the Fallback playlist's row of zoneName in zoneInspector. """
-        return self.getRowOfItemInColumnOfModel('Fallback', 1,
-                                                self.zoneInspector[zoneName])
+        """ Return the values of the Fallback playlist's row of zoneName in zoneInspector. """
+        return self.zoneInspector.getRowWithValue(zoneName, 1, 'Fallback')
 
     def attemptToAddDefaultPlaylistsToZone(self, zoneName):
         """ Add default playlists to zoneName, if they exist in database. """
-        if self.playlistExistsInDatabase('fallback'):
-            playlist = Playlist('fallback', 'Fallback', True, '', '', '2', '2', '0', '1')
-            self.addPlaylistToZone(zoneName, playlist)
-        if self.playlistExistsInDatabase('Spots'):
-            playlist = Playlist('Spots', 'Intermediate', True, '70', '1', '', '', '', '')
-            self.addPlaylistToZone(zoneName, playlist)
-        if self.playlistExistsInDatabase('Jingles'):
-            playlist = Playlist('Jingles', 'Intermediate', True,
-                                '40', '1', '', '', '', '')
+        for playlist in getDefaultPlaylists({playlist[0] for playlist in self.playlists}):
             self.addPlaylistToZone(zoneName, playlist)
 
 
     # Private methods
 
+    def notifyMutation(self, operation, *args):
+        """ Pass a mutation to every mutation listener, and publish its change event. """
+        for listener in self.mutationListeners:
+            listener(operation, list(args))
+        if self.changes.hasSubscribers():
+            self.changes.publish(getChangeEvent(operation, list(args)))
+
     def itemExistsInColumnOfModel(self, item, column, model):
         """ If item exists in model's column, return true. """
         return any((row[column] == item for row in model))
@@ -201,8 +348,240 @@ class Model:
                 return treeiter
         return None
 
-    def initZoneInspector(self, zoneName):
-        """ Initialize zoneName's inspector. """
-        self.zoneInspector[zoneName] = ListStore(str, str, bool, str, str,
-                                                 str, str, str, str)
-        self.zoneInspector[zoneName].set_sort_column_id(1, SortType.DESCENDING)
+    @traced('model')
+    def getRowOfValuesInModel(self, values, model):
+        """ If a row with exactly these values exists in model, return it. """
+        values = list(values)
+        for i in range(len(model)):
+            treeiter = model.get_iter(TreePath(i))
+            if list(model[treeiter]) == values:
+                return treeiter
+        return None
+
+
+class ModelSnapshot:
+    """ An immutable copy of the Model's contents (see Model.getSnapshot).
+
+    zones: the rows of Zones, as tuples.
+    playlistPaths: playlist name -> path.
+    zoneInspector: zone name -> the rows of its Zone Inspector, as a tuple of tuples.
+    schedule: the rows of each day of the Flow Schedule, as a tuple of tuples.
+    """
+
+    __slots__ = ('zones', 'playlistPaths', 'zoneInspector', 'schedule', 'zoneIndices')
+
+    def __init__(self, zones, playlistPaths, zoneInspector, schedule):
+        self.zones = zones
+        self.playlistPaths = playlistPaths
+        self.zoneInspector = zoneInspector
+        self.schedule = schedule
+        self.zoneIndices = {zone[0]: index for index, zone in enumerate(zones)}
+
+
+    # Public methods
+
+    def getZone(self, zoneName):
+        """ Return the row of zoneName in Zones. """
+        return self.zones[self.zoneIndices[zoneName]]
+
+    def getPlaylistPath(self, playlistName):
+        """ Return the path of playlistName. """
+        return self.playlistPaths[playlistName]
+
+    def getZoneInspectorRows(self, zoneName):
+        """ Return the rows of zoneName's Zone Inspector. """
+        return self.zoneInspector[zoneName]
+
+    def getPlaylistRowOfType(self, zoneName, playlistType):
+        """ Return the first Zone Inspector row of zoneName with playlistType, or None. """
+        for row in self.zoneInspector[zoneName]:
+            if row[1] == playlistType:
+                return row
+        return None
+
+
+class ZoneInspector:
+    """ The Zone Inspector Model: the playlists of each zone.
+
+    A zone's rows are kept as a list of tuples. A ListStore is created only when
+    the zone is displayed in the Zone Inspector, and it then replaces the list.
+    Only the most recently displayed stores are kept: the rest are turned back
+    into lists.
+
+    Rows are referred to by tree iters or paths in stores, and by indices in lists.
+    Stores are sorted, so their paths are never taken for indices.
+
+    The rows of each zone are also frozen into a tuple for snapshots, which is
+    kept until the zone changes.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # zoneName -> list of rows, for zones without a store
+        self.rows = {}
+        # zoneName -> ListStore, from the least to the most recently displayed
+        self.stores = OrderedDict()
+        # zoneName -> tuple of rows, for zones unchanged since their last snapshot
+        self.frozenRows = {}
+
+    def __contains__(self, zoneName):
+        return zoneName in self.rows or zoneName in self.stores
+
+    def __iter__(self):
+        """ Iterate over zone names. """
+        return iter(list(self.rows) + list(self.stores))
+
+    def __len__(self):
+        return len(self.rows) + len(self.stores)
+
+    def clear(self, keptZoneNames=()):
+        """ Remove every zone.
+
+        The stores of keptZoneNames are emptied and kept, for the zones to be
+        created again, so that a view displaying one of them stays valid.
+        """
+        self.rows.clear()
+        self.frozenRows.clear()
+        for zoneName, store in list(self.stores.items()):
+            store.clear()
+            if zoneName not in keptZoneNames:
+                del self.stores[zoneName]
+
+    def create(self, zoneName):
+        """ Add a zone without playlists. A kept, empty store is reused. """
+        if zoneName not in self.stores:
+            self.rows[zoneName] = []
+        self.frozenRows.pop(zoneName, None)
+
+    def remove(self, zoneName):
+        """ Remove a zone. """
+        self.frozenRows.pop(zoneName, None)
+        if self.rows.pop(zoneName, None) is None:
+            self.stores.pop(zoneName).clear()
+
+    def rename(self, oldZoneName, newZoneName):
+        """ Rename a zone. A displayed zone keeps its store. """
+        frozenRows = self.frozenRows.pop(oldZoneName, None)
+        if frozenRows is not None:
+            self.frozenRows[newZoneName] = frozenRows
+        if oldZoneName in self.rows:
+            self.rows[newZoneName] = self.rows.pop(oldZoneName)
+        else:
+            self.stores[newZoneName] = self.stores.pop(oldZoneName)
+
+    def getStore(self, zoneName):
+        """ Return zoneName's store. Create it, if it does not exist. """
+        store = self.stores.get(zoneName)
+        if store is not None:
+            self.stores.move_to_end(zoneName)
+            return store
+        store = ListStore(*ZONE_INSPECTOR_COLUMN_TYPES)
+        store.set_sort_column_id(1, SortType.DESCENDING)
+        for row in self.rows.pop(zoneName):
+            store.append(row)
+        self.stores[zoneName] = store
+        while len(self.stores) > self.capacity:
+            evictedZoneName, evictedStore = self.stores.popitem(last=False)
+            self.rows[evictedZoneName] = [tuple(row) for row in evictedStore]
+        return store
+
+    def freeze(self, zoneName):
+        """ Return zoneName's rows as a tuple of tuples, shared until the zone changes. """
+        frozenRows = self.frozenRows.get(zoneName)
+        if frozenRows is None:
+            frozenRows = self.frozenRows[zoneName] = tuple(self.getRows(zoneName))
+        return frozenRows
+
+    def getRows(self, zoneName):
+        """ Return zoneName's rows as tuples. """
+        store = self.stores.get(zoneName)
+        if store is not None:
+            return [tuple(row) for row in store]
+        return self.rows[zoneName]
+
+    def getRow(self, zoneName, rowReference):
+        """ Return the values of a row as a tuple. """
+        store = self.stores.get(zoneName)
+        if store is not None:
+            return tuple(store[rowReference])
+        return self.rows[zoneName][getIndex(rowReference)]
+
+    def appendRow(self, zoneName, row):
+        """ Append a row to zoneName. """
+        self.frozenRows.pop(zoneName, None)
+        store = self.stores.get(zoneName)
+        if store is not None:
+            store.append(row)
+        else:
+            self.rows[zoneName].append(tuple(row))
+
+    def removeRow(self, zoneName, rowReference):
+        """ Remove a row from zoneName. """
+        self.frozenRows.pop(zoneName, None)
+        store = self.stores.get(zoneName)
+        if store is not None:
+            del store[rowReference]
+        else:
+            del self.rows[zoneName][getIndex(rowReference)]
+
+    def setValue(self, zoneName, rowReference, column, value):
+        """ Set a value of a row of zoneName. """
+        self.frozenRows.pop(zoneName, None)
+        store = self.stores.get(zoneName)
+        if store is not None:
+            store[rowReference][column] = value
+        else:
+            rows = self.rows[zoneName]
+            index = getIndex(rowReference)
+            rows[index] = rows[index][:column] + (value,) + rows[index][column + 1:]
+
+    def findRow(self, zoneName, values):
+        """ Return a reference to a row of zoneName with exactly these values. """
+        values = tuple(values)
+        store = self.stores.get(zoneName)
+        if store is not None:
+            for row in store:
+                if tuple(row) == values:
+                    return row.iter
+            return None
+        rows = self.rows[zoneName]
+        return rows.index(values) if values in rows else None
+
+    def findValue(self, zoneName, column, value):
+        """ Return a reference to a row of zoneName with value in column. """
+        store = self.stores.get(zoneName)
+        if store is not None:
+            for row in store:
+                if row[column] == value:
+                    return row.iter
+            return None
+        for index, row in enumerate(self.rows[zoneName]):
+            if row[column] == value:
+                return index
+        return None
+
+    def getRowWithValue(self, zoneName, column, value):
+        """ Return the values of a row of zoneName with value in column, or None. """
+        rowReference = self.findValue(zoneName, column, value)
+        return self.getRow(zoneName, rowReference) if rowReference is not None else None
+
+    def removeRowsWithValue(self, zoneName, column, value):
+        """ Remove every row of zoneName with value in column. """
+        while True:
+            rowReference = self.findValue(zoneName, column, value)
+            if rowReference is None:
+                break
+            self.removeRow(zoneName, rowReference)
+
+
+# Functions
+
+def getIndex(rowReference):
+    """ Return rowReference as an index into a zone's list of rows.
+
+    Raise TypeError if it is a tree iter or a path, which refer to rows of stores.
+    """
+    if not isinstance(rowReference, int):
+        raise TypeError('a row of a zone without a store is referred to by its index, not by ' +
+                        type(rowReference).__name__)
+    return rowReference
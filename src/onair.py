@@ -0,0 +1,161 @@
+"""
+The On-Air Index
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from threading import Lock
+from events import ScheduleRowChanged, StateLoaded, ZoneRemoved, ZoneRenamed
+from validator import START_TIME_FORMAT
+
+
+MINUTES_PER_DAY = 24 * 60
+
+
+class OnAirIndex:
+    """ Answer which zone is on air at a given time, in O(log n).
+
+    Every zone occurrence of the Flow Schedule is kept as its minute of the
+    week (0 is Monday 00:00), in a sorted list that is searched with bisect.
+    A zone stays on air until the next occurrence starts, wrapping around
+    from Sunday to Monday.
+
+    The index follows the Model's change events as they happen, so it is
+    updated row by row instead of rebuilt. Lookups may come from any thread.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        # Sorted minutes of the week, and the zone that starts at each one
+        self.minutes = []
+        self.zoneNames = []
+        self.lock = Lock()
+        self.rebuild()
+        # Immediate, so that lookups right after an edit see it
+        model.subscribe(self.onModelChanged, batched=False)
+
+
+    # Public methods
+
+    def zoneAt(self, moment):
+        """ Return the name of the zone on air at moment (a datetime), or None. """
+        minute = getMinuteOfWeek(moment)
+        with self.lock:
+            if not self.minutes:
+                return None
+            # Before the first occurrence, last week's last occurrence is still on air
+            return self.zoneNames[bisect_right(self.minutes, minute) - 1]
+
+    def upcoming(self, count, moment=None):
+        """ Return the next count zone starts after moment (default: now).
+
+        Each is a (start datetime, zone name) pair. The schedule repeats every
+        week, so there are always count of them, unless the schedule is empty.
+        """
+        if moment is None:
+            moment = datetime.now()
+        minute = getMinuteOfWeek(moment)
+        weekStart = (moment - timedelta(days=moment.weekday(), hours=moment.hour,
+                                        minutes=moment.minute, seconds=moment.second,
+                                        microseconds=moment.microsecond))
+        starts = []
+        with self.lock:
+            if not self.minutes:
+                return starts
+            index = bisect_right(self.minutes, minute)
+            for i in range(index, index + count):
+                weeks, position = divmod(i, len(self.minutes))
+                starts.append((weekStart + timedelta(weeks=weeks,
+                                                     minutes=self.minutes[position]),
+                               self.zoneNames[position]))
+        return starts
+
+    def rebuild(self):
+        """ Index the whole Flow Schedule anew. """
+        entries = []
+        for dayIndex in range(7):
+            for scheduleRow in self.model.schedule[dayIndex]:
+                minute = getMinuteOfDay(scheduleRow[0])
+                if minute is not None:
+                    entries.append((dayIndex * MINUTES_PER_DAY + minute, scheduleRow[1]))
+        entries.sort()
+        with self.lock:
+            self.minutes = [entry[0] for entry in entries]
+            self.zoneNames = [entry[1] for entry in entries]
+
+
+    # Private methods
+
+    def onModelChanged(self, events):
+        """ Update the entries that change events affect. """
+        for event in events:
+            if isinstance(event, ScheduleRowChanged):
+                if event.oldRow is not None:
+                    self.remove(event.dayIndex, event.oldRow[0], event.oldRow[1])
+                if event.newRow is not None:
+                    self.insert(event.dayIndex, event.newRow[0], event.newRow[1])
+            elif isinstance(event, ZoneRenamed):
+                with self.lock:
+                    self.zoneNames = [event.newZoneName if zoneName == event.oldZoneName
+                                      else zoneName for zoneName in self.zoneNames]
+            elif isinstance(event, ZoneRemoved):
+                with self.lock:
+                    kept = [i for i, zoneName in enumerate(self.zoneNames)
+                            if zoneName != event.zoneName]
+                    self.minutes = [self.minutes[i] for i in kept]
+                    self.zoneNames = [self.zoneNames[i] for i in kept]
+            elif isinstance(event, StateLoaded):
+                self.rebuild()
+
+    def insert(self, dayIndex, zoneStartTime, zoneName):
+        """ Add an occurrence. Ignore it if its start time is malformed. """
+        minute = getMinuteOfDay(zoneStartTime)
+        if minute is None:
+            return
+        minute += dayIndex * MINUTES_PER_DAY
+        with self.lock:
+            index = bisect_right(self.minutes, minute)
+            self.minutes.insert(index, minute)
+            self.zoneNames.insert(index, zoneName)
+
+    def remove(self, dayIndex, zoneStartTime, zoneName):
+        """ Remove an occurrence, if it is indexed. """
+        minute = getMinuteOfDay(zoneStartTime)
+        if minute is None:
+            return
+        minute += dayIndex * MINUTES_PER_DAY
+        with self.lock:
+            for index in range(bisect_left(self.minutes, minute),
+                               bisect_right(self.minutes, minute)):
+                if self.zoneNames[index] == zoneName:
+                    del self.minutes[index]
+                    del self.zoneNames[index]
+                    return
+
+
+# Functions
+
+def getMinuteOfDay(zoneStartTime):
+    """ Return the minute of the day of a HH:MM start time, or None if malformed. """
+    if START_TIME_FORMAT.match(zoneStartTime) is None:
+        return None
+    return int(zoneStartTime[:2]) * 60 + int(zoneStartTime[3:])
+
+def getMinuteOfWeek(moment):
+    """ Return the minute of the week of a datetime. """
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
@@ -0,0 +1,238 @@
+"""
+Play logs
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+""" Compare what was played on air with the plan.
+
+A play log has a line per played track, with tab-separated fields:
+
+    <start, ISO 8601>  <duration in seconds>  <playlist path>  [<track path> ...]
+
+Lines that start with # and lines that cannot be parsed are skipped.
+Logs may be gzip or xz compressed.
+
+Each log is streamed through a pipeline of generators (lines, plays, minutes
+of the week), and reduced to the airtime and track count of each playlist at
+each minute of the week. That reduction does not depend on the plan and its
+size is bounded, whatever the length of the log, so it is cached per file,
+on disk. The totals per zone and per playlist are then computed from the
+cached reductions and a snapshot of the Model, whenever the plan changes.
+"""
+
+from bisect import bisect_right
+from datetime import datetime
+from hashlib import sha1
+from io import TextIOWrapper
+from json import dumps, load
+from os import makedirs, stat
+from os.path import abspath, join
+from threading import Lock
+from helpers import PLAY_LOG_CACHE_DIR, getPlaylistNameFromPath, openScheduleFile
+from onair import MINUTES_PER_DAY, getMinuteOfDay, getMinuteOfWeek
+from publisher import writeAtomically
+
+
+# Bumped whenever the format of cached reductions changes
+CACHE_VERSION = 2
+
+
+class PlayLogTotals:
+    """ What was played, per zone and per playlist.
+
+    zoneSecs, zoneTracks: zone name -> airtime in seconds, and number of tracks.
+    playlistSecs, playlistTracks: playlist name -> the same.
+    unplannedTracks: zone name -> tracks of playlists that are not in the zone.
+    """
+
+    __slots__ = ('zoneSecs', 'zoneTracks', 'playlistSecs', 'playlistTracks',
+                 'unplannedTracks')
+
+    def __init__(self):
+        self.zoneSecs = {}
+        self.zoneTracks = {}
+        self.playlistSecs = {}
+        self.playlistTracks = {}
+        self.unplannedTracks = {}
+
+
+class PlayLogs:
+    """ The play logs loaded into the session, and their totals against the plan.
+
+    Loading and totalling run in background jobs. Lookups may come from any thread.
+    """
+
+    def __init__(self, cacheDirectory=PLAY_LOG_CACHE_DIR):
+        self.cacheDirectory = cacheDirectory
+        # Absolute path -> reduction of the log (see reduceLog)
+        self.reductions = {}
+        self.totals = None
+        self.lock = Lock()
+
+
+    # Public methods
+
+    def load(self, paths):
+        """ Reduce the logs in paths, from the cache if they have not changed. """
+        for path in paths:
+            reduction = loadReduction(path, self.cacheDirectory)
+            with self.lock:
+                self.reductions[abspath(path)] = reduction
+
+    def total(self, snapshot):
+        """ Compute the totals of the loaded logs against snapshot, a ModelSnapshot. """
+        with self.lock:
+            reductions = list(self.reductions.values())
+        totals = computeTotals(reductions, snapshot)
+        with self.lock:
+            self.totals = totals
+        return totals
+
+    def isLoaded(self):
+        """ Return true if any log is loaded. """
+        with self.lock:
+            return bool(self.reductions)
+
+    def getZoneTotals(self, zoneName):
+        """ Return the airtime in seconds, the tracks and the unplanned tracks of zoneName,
+        or None if no logs are totalled.
+        """
+        with self.lock:
+            if self.totals is None:
+                return None
+            return (self.totals.zoneSecs.get(zoneName, 0),
+                    self.totals.zoneTracks.get(zoneName, 0),
+                    self.totals.unplannedTracks.get(zoneName, 0))
+
+    def getPlaylistTotals(self, playlistName):
+        """ Return the airtime in seconds and the tracks of playlistName,
+        or None if no logs are totalled.
+        """
+        with self.lock:
+            if self.totals is None:
+                return None
+            return (self.totals.playlistSecs.get(playlistName, 0),
+                    self.totals.playlistTracks.get(playlistName, 0))
+
+
+# Functions
+
+def readLines(path):
+    """ Yield the lines of a log, decompressing it if needed. """
+    with openScheduleFile(path) as logFile:
+        for line in TextIOWrapper(logFile, encoding='utf-8', errors='replace'):
+            yield line
+
+def parsePlays(lines):
+    """ Yield a (start datetime, duration in seconds, playlist name) per valid line. """
+    for line in lines:
+        if line.startswith('#'):
+            continue
+        fields = line.rstrip('\n').split('\t')
+        if len(fields) < 3:
+            continue
+        try:
+            start = datetime.fromisoformat(fields[0])
+            durationSecs = float(fields[1])
+        except ValueError:
+            continue
+        yield start, durationSecs, getPlaylistNameFromPath(fields[2])
+
+def reduceLog(path):
+    """ Return the airtime and tracks of each playlist at each minute of the week, in path.
+
+    The reduction maps playlist names to minutes of the week, as text (like
+    JSON objects have them), to [seconds, tracks]. A track counts at the
+    minute it started.
+    """
+    reduction = {}
+    for start, durationSecs, playlistName in parsePlays(readLines(path)):
+        minutes = reduction.setdefault(playlistName, {})
+        minute = str(getMinuteOfWeek(start))
+        entry = minutes.get(minute)
+        if entry is None:
+            minutes[minute] = [durationSecs, 1]
+        else:
+            entry[0] += durationSecs
+            entry[1] += 1
+    return reduction
+
+def loadReduction(path, cacheDirectory):
+    """ Return the reduction of path, from cacheDirectory if it is still valid. """
+    fileStat = stat(path)
+    cachePath = join(cacheDirectory,
+                     sha1(abspath(path).encode('utf-8')).hexdigest() + '.json')
+    signature = [CACHE_VERSION, fileStat.st_mtime_ns, fileStat.st_size]
+    try:
+        with open(cachePath) as cacheFile:
+            cached = load(cacheFile)
+        if cached['signature'] == signature:
+            return cached['reduction']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    reduction = reduceLog(path)
+    try:
+        makedirs(cacheDirectory, exist_ok=True)
+        writeAtomically(cachePath, dumps({'signature': signature,
+                                          'reduction': reduction}).encode('utf-8'))
+    except OSError as e:
+        print('Failed to cache the reduction of ' + path + '.\n' + str(e))
+    return reduction
+
+def computeTotals(reductions, snapshot):
+    """ Return the PlayLogTotals of reductions against snapshot, a ModelSnapshot. """
+    totals = PlayLogTotals()
+    zoneOfMinute = getZoneOfMinute(snapshot)
+    plannedPlaylists = {zoneName: {row[0] for row in rows}
+                        for zoneName, rows in snapshot.zoneInspector.items()}
+    for reduction in reductions:
+        for playlistName, minutes in reduction.items():
+            for minute, (secs, tracks) in minutes.items():
+                addTo(totals.playlistSecs, playlistName, secs)
+                addTo(totals.playlistTracks, playlistName, tracks)
+                if zoneOfMinute is None:
+                    continue
+                zoneName = zoneOfMinute[int(minute)]
+                addTo(totals.zoneSecs, zoneName, secs)
+                addTo(totals.zoneTracks, zoneName, tracks)
+                if playlistName not in plannedPlaylists.get(zoneName, ()):
+                    addTo(totals.unplannedTracks, zoneName, tracks)
+    return totals
+
+def getZoneOfMinute(snapshot):
+    """ Return the zone on air at each minute of the week, or None if nothing is scheduled. """
+    starts = []
+    for dayIndex, rows in enumerate(snapshot.schedule):
+        for zoneStartTime, zoneName in rows:
+            minute = getMinuteOfDay(zoneStartTime)
+            if minute is not None:
+                starts.append((dayIndex * MINUTES_PER_DAY + minute, zoneName))
+    if not starts:
+        return None
+    starts.sort()
+    minutes = [start[0] for start in starts]
+    # Before the first start of the week, last week's last zone is on air (-1)
+    return [starts[bisect_right(minutes, minute) - 1][1]
+            for minute in range(7 * MINUTES_PER_DAY)]
+
+def addTo(totals, key, value):
+    """ Add value to totals[key]. """
+    totals[key] = totals.get(key, 0) + value
+
+def formatTotals(secs, tracks):
+    """ Return airtime and tracks as text. """
+    return '%.1f h, %d track%s' % (secs / 3600, tracks, '' if tracks == 1 else 's')
@@ -0,0 +1,245 @@
+"""
+The Publisher
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from os import O_RDONLY, close, fsync, getpid, open as openFileDescriptor, remove, replace
+from os.path import abspath, basename, dirname, join
+from sys import argv, exit
+from threading import Lock, get_ident
+from time import perf_counter, sleep
+from urllib.parse import urlsplit
+from helpers import PUBLISH_FILE_NAME, compressingWriter
+from tracing import span
+
+
+# Attempts per target, before it is reported as failed
+PUBLISH_ATTEMPTS = 3
+
+# Delay before the first retry. It doubles on every retry.
+RETRY_DELAY_SECS = 0.5
+
+# Timeout of every HTTP request
+HTTP_TIMEOUT_SECS = 10
+
+
+# Functions
+
+def writeAtomically(path, data):
+    """ Write data (bytes) to path, so that readers see either the old or the new file. """
+    with openAtomically(path) as writer:
+        writer.write(data)
+
+@contextmanager
+def openAtomically(path):
+    """ Return a context manager that gives a binary writer, whose output replaces path
+    on exit, so that readers see either the old or the new file.
+
+    The output is written to a temporary file next to path, synced, and renamed
+    over path. The directory is synced too, so that the rename survives a crash.
+    If path ends with .gz or .xz, the output is compressed on its way to the file,
+    as it is written. If the block raises, path is left as it was.
+    """
+    temporaryPath = join(dirname(abspath(path)), '.' + basename(path) + '.' + str(getpid()) +
+                         '.' + str(get_ident()) + '.tmp')
+    try:
+        with open(temporaryPath, 'wb') as temporaryFile:
+            with compressingWriter(path, temporaryFile) as writer:
+                yield writer
+            temporaryFile.flush()
+            fsync(temporaryFile.fileno())
+        replace(temporaryPath, path)
+    except BaseException:
+        try:
+            remove(temporaryPath)
+        except OSError:
+            pass
+        raise
+    directoryDescriptor = openFileDescriptor(dirname(abspath(path)), O_RDONLY)
+    try:
+        fsync(directoryDescriptor)
+    finally:
+        close(directoryDescriptor)
+
+def parseTargets(targets):
+    """ Split a whitespace or comma separated list of targets. """
+    return [target for target in targets.replace(',', ' ').split() if target]
+
+
+# Classes
+
+class PublishRejected(Exception):
+    """ A target refused the schedule, so retrying would not help. """
+
+
+class PublishResult:
+    """ The outcome of publishing to one target. """
+
+    __slots__ = ('target', 'succeeded', 'message', 'attempts', 'durationSecs')
+
+    def __init__(self, target, succeeded, message, attempts, durationSecs):
+        self.target = target
+        self.succeeded = succeeded
+        self.message = message
+        self.attempts = attempts
+        self.durationSecs = durationSecs
+
+    def __str__(self):
+        return (('OK' if self.succeeded else 'FAILED') + '  ' + self.target + ': ' +
+                self.message + ' (' + str(self.attempts) + ' attempt' +
+                ('s' if self.attempts != 1 else '') + ', ' +
+                str(round(self.durationSecs * 1000)) + ' ms)')
+
+
+class Publisher:
+    """ Write a serialized schedule to several targets in parallel.
+
+    A target is either a local directory, where fileName is written atomically,
+    or an http(s) URL, to which the schedule is PUT. URLs that end with a slash
+    get fileName appended. HTTP connections are kept open between publishes,
+    one pool per host. Failed targets are retried, with a growing delay.
+    """
+
+    def __init__(self, targets, fileName):
+        self.targets = targets
+        self.fileName = fileName
+        # (scheme, host, port) -> idle connections
+        self.connections = {}
+        self.lock = Lock()
+
+
+    # Public methods
+
+    def publish(self, data):
+        """ Publish data (bytes) to every target. Return a PublishResult per target. """
+        if not self.targets:
+            return []
+        with ThreadPoolExecutor(max_workers=len(self.targets)) as executor:
+            return list(executor.map(lambda target: self.publishToTarget(target, data),
+                                     self.targets))
+
+    def close(self):
+        """ Close the idle HTTP connections. """
+        with self.lock:
+            for connections in self.connections.values():
+                for connection in connections:
+                    connection.close()
+            self.connections.clear()
+
+
+    # Private methods
+
+    def publishToTarget(self, target, data):
+        """ Publish data to target, retrying on failure. """
+        start = perf_counter()
+        message = ''
+        for attempt in range(1, PUBLISH_ATTEMPTS + 1):
+            try:
+                with span('publish ' + target, 'publish'):
+                    if target.startswith(('http://', 'https://')):
+                        message = self.put(target, data)
+                    else:
+                        path = join(target, self.fileName)
+                        writeAtomically(path, data)
+                        message = 'written to ' + path
+            except PublishRejected as e:
+                return PublishResult(target, False, str(e), attempt, perf_counter() - start)
+            except ValueError as e:
+                # A malformed target, so retrying would not help either
+                return PublishResult(target, False, 'invalid target: ' + str(e), attempt,
+                                     perf_counter() - start)
+            except (OSError, HTTPException) as e:
+                message = str(e) or e.__class__.__name__
+                if attempt < PUBLISH_ATTEMPTS:
+                    sleep(RETRY_DELAY_SECS * 2 ** (attempt - 1))
+            else:
+                return PublishResult(target, True, message, attempt, perf_counter() - start)
+        return PublishResult(target, False, message, PUBLISH_ATTEMPTS, perf_counter() - start)
+
+    def put(self, url, data):
+        """ PUT data to url.
+
+        Raise PublishRejected if the server refuses it (4xx), OSError if the
+        server fails (5xx), or ValueError if url has no host or a bad port.
+        """
+        if not urlsplit(url).hostname:
+            raise ValueError('no host in ' + url)
+        if url.endswith('/'):
+            url += self.fileName
+        parts = urlsplit(url)
+        # port raises ValueError, if it is not a number
+        key = (parts.scheme, parts.hostname, parts.port)
+        connection = self.getConnection(key)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        try:
+            connection.request('PUT', path, body=data,
+                               headers={'Content-Type': 'application/xml'})
+            response = connection.getresponse()
+            response.read()
+        except BaseException:
+            # The connection may be half-used. Do not pool it.
+            connection.close()
+            raise
+        self.releaseConnection(key, connection, response.will_close)
+        status = 'HTTP ' + str(response.status) + ' ' + response.reason
+        if 400 <= response.status < 500:
+            raise PublishRejected(status)
+        if not 200 <= response.status < 300:
+            raise OSError(status)
+        return status
+
+    def getConnection(self, key):
+        """ Return an idle connection to the host of key, or a new one. """
+        with self.lock:
+            connections = self.connections.get(key)
+            if connections:
+                return connections.pop()
+        scheme, host, port = key
+        connectionClass = HTTPSConnection if scheme == 'https' else HTTPConnection
+        return connectionClass(host, port, timeout=HTTP_TIMEOUT_SECS)
+
+    def releaseConnection(self, key, connection, willClose):
+        """ Keep connection for the next request, unless the server closes it. """
+        if willClose:
+            connection.close()
+            return
+        with self.lock:
+            self.connections.setdefault(key, []).append(connection)
+
+
+def main():
+    if len(argv) < 3:
+        print('Usage: publisher.py <schedule file> <target> [<target> ...]\n'
+              'A target is a directory or an http(s) URL.')
+        exit(2)
+    with open(argv[1], 'rb') as scheduleFile:
+        data = scheduleFile.read()
+    publisher = Publisher(argv[2:], PUBLISH_FILE_NAME)
+    results = publisher.publish(data)
+    publisher.close()
+    for result in results:
+        print(result)
+    exit(0 if all(result.succeeded for result in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""
+The Reloader
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from os import stat
+from gi.repository.Gio import File, FileMonitorEvent, FileMonitorFlags
+from gi.repository.GLib import source_remove, timeout_add
+from gi.repository.Gtk import ResponseType
+from delta import REPLACE, diffStates, applyDelta, getMutationKey, describeKey
+from tracing import span
+
+
+# Time to wait for a burst of file changes to settle, before reloading
+RELOAD_DELAY_MS = 500
+
+# Number of conflicts listed in the conflict dialog
+MAX_REPORTED_CONFLICTS = 10
+
+
+class Reloader:
+    """ Watch the schedule file of the session and reload it when it changes on disk.
+
+    The state of the file, as last imported or exported, is kept as a base.
+    On change, the file is parsed and diffed in a background job: the changes
+    of the file since the base are applied to the Model, while the local
+    edits since the base are kept. The user is asked only when both touched
+    the same zone, playlist or schedule row.
+    """
+
+    def __init__(self, model, view, validator, xml, jobs):
+        self.model = model
+        self.view = view
+        self.validator = validator
+        self.xml = xml
+        self.jobs = jobs
+        self.path = None
+        self.baseState = None
+        self.fileSignature = None
+        self.monitor = None
+        self.pendingReload = None
+        self.reloading = False
+        self.reloadAgain = False
+        # Incremented on every Model mutation, to detect edits during a reload
+        self.revision = 0
+        model.subscribe(self.onModelChanged, batched=False)
+
+
+    # Public methods
+
+    def watch(self, path, fileState):
+        """ Start watching path, whose contents correspond to fileState.
+
+        Meant to be called from the main thread, after an import or an export.
+        """
+        if self.monitor is not None and path != self.path:
+            self.monitor.cancel()
+            self.monitor = None
+        self.baseState = fileState
+        self.fileSignature = getFileSignature(path)
+        if self.monitor is None:
+            self.path = path
+            self.monitor = File.new_for_path(path).monitor_file(FileMonitorFlags.NONE, None)
+            self.monitor.connect('changed', self.onFileChanged)
+
+    def stop(self):
+        """ Stop watching. """
+        if self.monitor is not None:
+            self.monitor.cancel()
+            self.monitor = None
+        if self.pendingReload is not None:
+            source_remove(self.pendingReload)
+            self.pendingReload = None
+        self.path = None
+
+
+    # Private methods
+
+    def onModelChanged(self, events):
+        """ Count Model changes, as they happen. """
+        self.revision += 1
+
+    def onFileChanged(self, monitor, file, otherFile, eventType):
+        """ Schedule a reload, once the file stops changing.
+
+        Trigger:
+            The watched file is written, or replaced by another file.
+        """
+        if eventType not in (FileMonitorEvent.CHANGES_DONE_HINT, FileMonitorEvent.CREATED):
+            return
+        if self.pendingReload is not None:
+            source_remove(self.pendingReload)
+        self.pendingReload = timeout_add(RELOAD_DELAY_MS, self.startReload)
+
+    def startReload(self):
+        """ Reload the file in the background, unless it has not really changed. """
+        self.pendingReload = None
+        if self.reloading:
+            self.reloadAgain = True
+            return False
+        signature = getFileSignature(self.path)
+        if signature is None or signature == self.fileSignature:
+            # Gone, e.g. in the middle of a replacement, or touched without changes
+            return False
+        self.reloading = True
+        # It works on copies of the Model's state, so it needs no exclusive access
+        self.jobs.submit('Reload', self.reload, self.path, self.baseState,
+                         self.model.getState(), self.revision, signature)
+        return False
+
+    def reload(self, path, baseState, currentState, revision, signature):
+        """ Parse the file and compute what to apply. Runs on a worker thread.
+
+        onReloadDone is always posted, even if this fails, so that reloading ends.
+        """
+        try:
+            with span('parse', 'reload'):
+                root = self.xml.parseXML(path).getroot()
+            if self.xml.xmlSchema is not None:
+                self.xml.assertValid(root)
+            with span('diff', 'reload'):
+                fileState = self.xml.readState(root)
+                remoteKeys = {getMutationKey(mutation)
+                              for mutation in diffStates(baseState, fileState, REPLACE)}
+                localKeys = {getMutationKey(mutation)
+                             for mutation in diffStates(baseState, currentState, REPLACE)}
+                delta = [mutation for mutation in diffStates(currentState, fileState, REPLACE)
+                         if getMutationKey(mutation) in remoteKeys]
+                # Where both sides made the same change, there is nothing to apply
+                conflicts = localKeys & {getMutationKey(mutation) for mutation in delta}
+        except Exception as e:
+            # Another tool may still be writing the file. Wait for its next change.
+            print('Ignoring change of ' + path + ', as it cannot be read.\n' + str(e))
+            self.jobs.post(self.onReloadDone, path, None, None, None, revision, signature)
+            return
+        self.jobs.post(self.onReloadDone, path, fileState, delta, conflicts, revision,
+                       signature)
+
+    def onReloadDone(self, path, fileState, delta, conflicts, revision, signature):
+        """ Apply the changes of the file to the Model, asking about conflicts.
+
+        If fileState is None, the file could not be read, and nothing is applied.
+        """
+        if self.isStale(path, revision):
+            self.restartReload(path)
+            return False
+        if fileState is None:
+            self.reloading = False
+            return False
+        if conflicts:
+            overwrite = self.askToOverwrite(conflicts)
+            # The dialog runs a nested main loop, where the Model or the file may change
+            if self.isStale(path, revision):
+                self.restartReload(path)
+                return False
+            if not overwrite:
+                delta = [mutation for mutation in delta
+                         if getMutationKey(mutation) not in conflicts]
+        self.reloading = False
+        with span('delta-application', 'reload'), self.view.bulkChanges(len(delta)):
+            applyDelta(self.model, delta)
+        self.baseState = fileState
+        self.fileSignature = signature
+        if delta:
+            self.validator.validateAll()
+            self.view.queue_draw()
+            print('Reloaded ' + path + ' (' + str(len(delta)) + ' changes).')
+        return False
+
+    def isStale(self, path, revision):
+        """ Return true if the Model or the watched file changed since a reload started. """
+        return path != self.path or revision != self.revision or self.reloadAgain
+
+    def restartReload(self, path):
+        """ End a stale reload, and start another one if path is still watched. """
+        self.reloading = False
+        self.reloadAgain = False
+        if path == self.path:
+            self.startReload()
+
+    def askToOverwrite(self, conflicts):
+        """ Return true if the user lets the file overwrite their conflicting edits. """
+        descriptions = sorted(describeKey(key) for key in conflicts)
+        dialog = self.view.dialogs.ReloadConflict(self.view, self.path,
+                                                  descriptions[:MAX_REPORTED_CONFLICTS])
+        response = dialog.run()
+        dialog.destroy()
+        return response == ResponseType.OK
+
+
+# Functions
+
+def getFileSignature(path):
+    """ Return what tells whether a file has changed, or None if it does not exist. """
+    try:
+        fileStat = stat(path)
+    except OSError:
+        return None
+    return (fileStat.st_mtime_ns, fileStat.st_size)
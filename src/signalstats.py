@@ -0,0 +1,230 @@
+"""
+Signal statistics
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from functools import wraps
+from threading import Lock
+from time import perf_counter_ns
+from weakref import WeakSet
+from gi.repository.GLib import PRIORITY_DEFAULT_IDLE, idle_add, timeout_add
+
+
+""" Count the signals of the Model's stores and time the redraws of their views,
+per user operation.
+
+Enabled by setting the FLOW_DASHBOARD_SIGNAL_STATS environment variable.
+An operation starts when a controller callback is called, and ends once the
+main loop is idle and the background jobs it started are done, i.e. after
+the views have redrawn. Callbacks called meanwhile are part of it. Its summary
+is then printed: the callback's time, the signals of each store, and the
+redraws of each view. Signals and redraws outside of any callback, e.g. of a
+reload, are summed as an operation too.
+"""
+
+# The signals a ListStore emits as its rows change
+STORE_SIGNALS = ('row-inserted', 'row-changed', 'row-deleted', 'rows-reordered',
+                 'sort-column-changed')
+
+# How often the end of an operation is checked for, while background jobs run
+JOB_POLL_MS = 200
+
+# Name of the operation of the signals that no callback caused
+UNATTRIBUTED = '(no callback)'
+
+
+class SignalStats:
+    """ Count store signals and time view redraws, per operation. """
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.lock = Lock()
+        # Name of the current operation, or None
+        self.operation = None
+        self.callbackNs = 0
+        # (store name, signal name) -> emissions
+        self.signals = {}
+        # view name -> [redraws, nanoseconds]
+        self.redraws = {}
+        # view name -> start of the redraw in progress
+        self.drawStarts = {}
+        # The instrumented stores and views. Zone Inspector's stores come and go,
+        # and a new one may get the id of one that is gone, so they are not kept by id.
+        self.instrumented = WeakSet()
+        self.reportPending = False
+        # Callbacks in progress. Dialogs run nested main loops, so it may be
+        # idle while a callback waits for the user.
+        self.depth = 0
+
+
+    # Public methods
+
+    def instrumentStore(self, name, store):
+        """ Count the signals of store, under name. """
+        if not self.markInstrumented(store):
+            return
+        for signal in STORE_SIGNALS:
+            store.connect(signal, self.onSignal, name, signal)
+
+    def instrumentView(self, name, treeView):
+        """ Time the redraws of treeView, under name. """
+        if not self.markInstrumented(treeView):
+            return
+        treeView.connect('draw', self.onDrawStarted, name)
+        treeView.connect_after('draw', self.onDrawEnded, name)
+
+    def instrumentCallbacks(self, callbacks):
+        """ Return callbacks as the View should get them, so that every handler
+        it connects starts an operation.
+
+        Only what the View connects is wrapped: the Model's subscribers and the
+        onDone callbacks of jobs keep using callbacks itself. Cell data callbacks
+        are left alone: they are called on every redraw.
+        """
+        return InstrumentedCallbacks(self, callbacks)
+
+
+    # Private methods
+
+    def markInstrumented(self, instance):
+        """ Return true if instance is not instrumented yet, and mark it. """
+        if instance in self.instrumented:
+            return False
+        self.instrumented.add(instance)
+        return True
+
+    def wrap(self, name, callback):
+        """ Return callback, starting an operation on every call. """
+        @wraps(callback)
+        def wrappedCallback(*args):
+            self.startOperation(name)
+            self.depth += 1
+            startNs = perf_counter_ns()
+            try:
+                return callback(*args)
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    with self.lock:
+                        self.callbackNs += perf_counter_ns() - startNs
+        return wrappedCallback
+
+    def startOperation(self, name):
+        """ Start an operation, unless one is in progress.
+
+        Callbacks called before it ends, e.g. by its signals, its change events
+        or its jobs, are part of it.
+        """
+        with self.lock:
+            if self.operation is not None and self.operation != UNATTRIBUTED:
+                return
+            self.operation = name
+        self.scheduleReport()
+
+    def onSignal(self, *args):
+        """ Count a signal. Its last two arguments are the store's and the signal's name. """
+        key = args[-2:]
+        with self.lock:
+            self.signals[key] = self.signals.get(key, 0) + 1
+            attributed = self.operation is not None
+        if not attributed:
+            with self.lock:
+                self.operation = UNATTRIBUTED
+            # Signals may come from job threads
+            idle_add(self.scheduleReport)
+
+    def onDrawStarted(self, widget, context, name):
+        self.drawStarts[name] = perf_counter_ns()
+        return False
+
+    def onDrawEnded(self, widget, context, name):
+        startNs = self.drawStarts.pop(name, None)
+        if startNs is None:
+            return False
+        with self.lock:
+            # Redraws of no operation, e.g. on scrolling, are not counted
+            if self.operation is None:
+                return False
+            redraws = self.redraws.setdefault(name, [0, 0])
+            redraws[0] += 1
+            redraws[1] += perf_counter_ns() - startNs
+        return False
+
+    def scheduleReport(self):
+        """ Report the current operation once the pending redraws are done. """
+        if not self.reportPending:
+            self.reportPending = True
+            # Redraws have a higher priority than default idle callbacks
+            idle_add(self.onIdle, priority=PRIORITY_DEFAULT_IDLE)
+        return False
+
+    def onIdle(self):
+        """ Report the current operation, unless its callbacks or background jobs still run. """
+        if self.depth > 0 or self.jobs.getJobs():
+            timeout_add(JOB_POLL_MS, self.onIdle)
+            return False
+        self.reportPending = False
+        if self.operation is not None:
+            self.report()
+        return False
+
+    def report(self):
+        """ Print the summary of the current operation and end it. """
+        with self.lock:
+            operation = self.operation
+            callbackNs = self.callbackNs
+            signals = self.signals
+            redraws = self.redraws
+            self.operation = None
+            self.callbackNs = 0
+            self.signals = {}
+            self.redraws = {}
+        print(formatReport(operation, callbackNs, signals, redraws))
+
+
+class InstrumentedCallbacks:
+    """ The controller's callbacks, with their handlers wrapped as they are looked up. """
+
+    def __init__(self, signalStats, callbacks):
+        self.signalStats = signalStats
+        self.callbacks = callbacks
+
+    def __getattr__(self, name):
+        attribute = getattr(self.callbacks, name)
+        if name.startswith('on') and not name.endswith('DataRequested'):
+            attribute = self.signalStats.wrap(name, attribute)
+            # Some handlers are connected more than once. They share a wrapper.
+            setattr(self, name, attribute)
+        return attribute
+
+
+# Functions
+
+def formatReport(operation, callbackNs, signals, redraws):
+    """ Return the summary of an operation as text. """
+    lines = [operation + ': ' + str(sum(signals.values())) + ' signals, ' +
+             str(sum(redraw[0] for redraw in redraws.values())) + ' redraws, ' +
+             formatMs(callbackNs) + ' in callbacks']
+    for (storeName, signal), count in sorted(signals.items(), key=lambda item: -item[1]):
+        lines.append('  ' + storeName + '  ' + signal + '  ' + str(count))
+    for viewName, (count, ns) in sorted(redraws.items()):
+        lines.append('  ' + viewName + '  redrawn ' + str(count) + ' time' +
+                     ('' if count == 1 else 's') + ', ' + formatMs(ns))
+    return '\n'.join(lines)
+
+def formatMs(ns):
+    return str(round(ns / 1e6, 1)) + ' ms'
@@ -0,0 +1,181 @@
+"""
+Playout simulation
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+""" Simulate a week of playout, to show what the Intermediate settings mean on air.
+
+The week is expanded into a minute-resolution timeline, with NumPy arrays:
+for each minute, the zone on air and the minutes elapsed since it started.
+An Intermediate playlist then inserts NumSchedItems items each time another
+SchedIntervalMins minutes of its zone have elapsed. The Main playlist plays
+the rest of the time. Items are assumed to last itemMins minutes. Inserted
+airtime is not capped, so settings that insert more than fits in a zone show up
+as more airtime than the zone has.
+
+What-if variants override the Intermediate settings. All variants are
+simulated at once, as rows of the same arrays. Every week plays the same
+schedule, so the results of one week hold for any number of weeks.
+
+NumPy is only needed here. Import this module only when a simulation is asked for.
+"""
+
+import numpy as np
+from helpers import SIMULATION_ITEM_MINS, Playlist, WEEK
+from onair import MINUTES_PER_DAY, getMinuteOfDay
+
+
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+HOURS_PER_WEEK = 7 * 24
+
+
+class Simulation:
+    """ The results of a simulation. Each array has one row per variant.
+
+    hourlyInserts: inserted items in each hour of the week (Monday 00:00 first).
+    playlistInserts: playlist name -> inserted items per week.
+    playlistAirtimeMins: playlist name -> minutes on air per week.
+    """
+
+    def __init__(self, hourlyInserts, playlistInserts, playlistAirtimeMins):
+        self.hourlyInserts = hourlyInserts
+        self.playlistInserts = playlistInserts
+        self.playlistAirtimeMins = playlistAirtimeMins
+
+
+# Functions
+
+def simulateWeek(state, variants=(), itemMins=SIMULATION_ITEM_MINS):
+    """ Simulate a week of the Model state (as returned by Model.getState).
+
+    Variant 0 is the schedule as it is. Each of variants adds a row to the
+    results: it is a dictionary from (zone name, playlist name) to
+    (SchedIntervalMins, NumSchedItems), where a zone name of None stands for
+    every zone.
+    """
+    numVariants = 1 + len(variants)
+    zoneNames = sorted(state['zoneInspector'])
+    zoneIndices = {zoneName: index for index, zoneName in enumerate(zoneNames)}
+    hourlyInserts = np.zeros((numVariants, HOURS_PER_WEEK))
+    playlistInserts = {}
+    playlistAirtimeMins = {}
+
+    zoneOfMinute, elapsedMins = expandTimeline(state, zoneIndices)
+    if zoneOfMinute is None:
+        return Simulation(hourlyInserts, playlistInserts, playlistAirtimeMins)
+    # Minutes of no zone are counted last, and left out of the results
+    zoneMins = np.bincount(zoneOfMinute, minlength=len(zoneNames) + 1)
+    hourOfMinute = np.arange(MINUTES_PER_WEEK) // 60
+    variantOffsets = (np.arange(numVariants) * HOURS_PER_WEEK)[:, None]
+
+    for zoneName in zoneNames:
+        zoneIndex = zoneIndices[zoneName]
+        if zoneMins[zoneIndex] == 0:
+            continue
+        onAir = zoneOfMinute == zoneIndex
+        elapsed = elapsedMins[onAir]
+        hours = hourOfMinute[onAir]
+        insertedMins = np.zeros(numVariants)
+        mainPlaylistName = None
+        for row in state['zoneInspector'][zoneName]:
+            playlist = Playlist.fromRow(row)
+            if playlist.type == 'Main':
+                mainPlaylistName = playlist.name
+            if playlist.type != 'Intermediate':
+                continue
+            intervals, items = getVariantSettings(zoneName, playlist, variants)
+            # Minutes at which this playlist inserts, for each variant
+            inserts = ((elapsed[None, :] > 0) &
+                       (elapsed[None, :] % intervals[:, None] == 0)) * items[:, None]
+            hourlyInserts += np.bincount((variantOffsets + hours[None, :]).ravel(),
+                                         weights=inserts.ravel(),
+                                         minlength=numVariants * HOURS_PER_WEEK
+                                         ).reshape(numVariants, HOURS_PER_WEEK)
+            weeklyInserts = inserts.sum(axis=1)
+            addTo(playlistInserts, playlist.name, weeklyInserts, numVariants)
+            addTo(playlistAirtimeMins, playlist.name, weeklyInserts * itemMins, numVariants)
+            insertedMins += weeklyInserts * itemMins
+        if mainPlaylistName is not None:
+            addTo(playlistAirtimeMins, mainPlaylistName,
+                  np.maximum(zoneMins[zoneIndex] - insertedMins, 0), numVariants)
+    return Simulation(hourlyInserts, playlistInserts, playlistAirtimeMins)
+
+def expandTimeline(state, zoneIndices):
+    """ Return the zone index on air and the minutes since it started, for each minute.
+
+    An occurrence of a zone missing from zoneIndices still ends the one before it,
+    but its minutes get index len(zoneIndices), which stands for no zone.
+    Return (None, None) if no zone is scheduled.
+    """
+    noZoneIndex = len(zoneIndices)
+    occurrences = []
+    for dayIndex, rows in enumerate(state['schedule']):
+        for zoneStartTime, zoneName in rows:
+            minute = getMinuteOfDay(zoneStartTime)
+            if minute is not None:
+                occurrences.append((dayIndex * MINUTES_PER_DAY + minute,
+                                    zoneIndices.get(zoneName, noZoneIndex)))
+    if not occurrences:
+        return None, None
+    occurrences.sort()
+    starts = np.array([occurrence[0] for occurrence in occurrences])
+    zones = np.array([occurrence[1] for occurrence in occurrences])
+    minutes = np.arange(MINUTES_PER_WEEK)
+    # Before the first start of the week, last week's last occurrence is on air (-1)
+    occurrenceOfMinute = np.searchsorted(starts, minutes, side='right') - 1
+    return (zones[occurrenceOfMinute],
+            (minutes - starts[occurrenceOfMinute]) % MINUTES_PER_WEEK)
+
+def getVariantSettings(zoneName, playlist, variants):
+    """ Return the SchedIntervalMins and NumSchedItems of playlist, per variant.
+
+    Invalid settings make the playlist insert nothing.
+    """
+    settings = [(playlist.schedIntervalMins, playlist.numSchedItems)]
+    for variant in variants:
+        settings.append(variant.get((zoneName, playlist.name),
+                        variant.get((None, playlist.name), settings[0])))
+    intervals = np.array([interval if interval >= 1 else 0 for interval, _ in settings])
+    items = np.array([numItems if numItems >= 1 and interval >= 1 else 0
+                      for interval, numItems in settings])
+    # Those insert 0 items; any interval will do, as long as it is not 0
+    return np.maximum(intervals, 1), items
+
+def addTo(totals, playlistName, values, numVariants):
+    """ Add values to the totals of playlistName. """
+    if playlistName not in totals:
+        totals[playlistName] = np.zeros(numVariants)
+    totals[playlistName] += values
+
+def formatReport(simulation, variantIndex=0):
+    """ Return a readable report of one variant of simulation. """
+    lines = ['Playlist'.ljust(30) + 'Inserts/week'.rjust(14) + 'Airtime h/week'.rjust(16)]
+    for playlistName in sorted(simulation.playlistAirtimeMins):
+        inserts = simulation.playlistInserts.get(playlistName)
+        lines.append(playlistName[:29].ljust(30) +
+                     (str(int(inserts[variantIndex])) if inserts is not None
+                      else '-').rjust(14) +
+                     ('%.1f' % (simulation.playlistAirtimeMins[playlistName][variantIndex]
+                                / 60)).rjust(16))
+    lines.append('')
+    lines.append('Inserts'.ljust(10) +
+                 ''.join(str(hour).rjust(4) for hour in range(24)))
+    hourly = simulation.hourlyInserts[variantIndex].reshape(7, 24)
+    for dayIndex, day in enumerate(WEEK):
+        lines.append(day[:3].ljust(10) + ''.join(str(int(count)).rjust(4)
+                                                 for count in hourly[dayIndex]))
+    return '\n'.join(lines)
@@ -0,0 +1,119 @@
+"""
+Tracing
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from atexit import register
+from functools import wraps
+from json import dump
+from os import getpid
+from threading import get_ident
+from time import perf_counter_ns
+from helpers import TRACE_PATH
+
+
+""" Spans and timers for the hot paths, dumped as a Chrome trace.
+
+Tracing is enabled by setting the FLOW_DASHBOARD_TRACE environment variable
+to the path of the trace file. The file can be opened in chrome://tracing
+or in Perfetto. When tracing is disabled, span returns a shared object that
+does nothing, and traced returns the decorated function itself.
+"""
+
+ENABLED = TRACE_PATH is not None
+
+EVENTS = []
+
+START_NS = perf_counter_ns()
+
+
+# Functions
+
+def span(name, category='app'):
+    """ Return a context manager that times the code it wraps. """
+    if ENABLED:
+        return Span(name, category)
+    return NULL_SPAN
+
+def traced(category):
+    """ Return a decorator that times every call of the decorated function. """
+    def decorator(function):
+        if not ENABLED:
+            return function
+        name = function.__qualname__
+        @wraps(function)
+        def tracedFunction(*args, **kwargs):
+            with Span(name, category):
+                return function(*args, **kwargs)
+        return tracedFunction
+    return decorator
+
+def instant(name, category='app'):
+    """ Mark a moment in the trace. """
+    if ENABLED:
+        EVENTS.append({'name': name, 'cat': category, 'ph': 'i', 's': 'p',
+                       'ts': (perf_counter_ns() - START_NS) / 1000,
+                       'pid': getpid(), 'tid': get_ident()})
+
+def dumpTrace():
+    """ Write the events recorded so far to the trace file. """
+    with open(TRACE_PATH, 'w') as traceFile:
+        dump({'traceEvents': EVENTS, 'displayTimeUnit': 'ms'}, traceFile)
+    print('Trace written to', TRACE_PATH)
+
+
+# Classes
+
+class Span:
+    """ Record a complete event, from entry to exit. """
+
+    __slots__ = ('name', 'category', 'startNs')
+
+    def __init__(self, name, category):
+        self.name = name
+        self.category = category
+
+    def __enter__(self):
+        self.startNs = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        endNs = perf_counter_ns()
+        # list.append is atomic, so worker threads can record too
+        EVENTS.append({'name': self.name, 'cat': self.category, 'ph': 'X',
+                       'ts': (self.startNs - START_NS) / 1000,
+                       'dur': (endNs - self.startNs) / 1000,
+                       'pid': getpid(), 'tid': get_ident()})
+        return False
+
+
+class NullSpan:
+    """ Do nothing, as cheaply as possible. """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+if ENABLED:
+    register(dumpTrace)
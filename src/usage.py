@@ -0,0 +1,176 @@
+"""
+The Usage Index
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from collections import Counter
+from threading import Lock
+from events import ZoneAdded, ZoneRenamed, ZoneRemoved, PlaylistRemoved,\
+                   InspectorRowChanged, ScheduleRowChanged, StateLoaded
+
+
+class UsageIndex:
+    """ Answer which playlists are used where, and how often across the week.
+
+    The zone x playlist x day usage matrix is kept sparse, as two factors:
+    the playlists of each zone, and the occurrences of each zone on each day.
+    Their product, the occurrences of each playlist on each day, is kept too,
+    so that the usage of a playlist is a dictionary lookup.
+
+    The index follows the Model's change events, in batches, so it is updated
+    row by row instead of rebuilt. Lookups may come from any thread.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        # zoneName -> Counter of playlistName -> Zone Inspector rows
+        self.zonePlaylists = {}
+        # zoneName -> occurrences in the Flow Schedule, per day
+        self.zoneDays = {}
+        # playlistName -> occurrences of the zones that include it, per day
+        self.playlistDays = {}
+        # playlistName -> zones that include it
+        self.playlistZones = Counter()
+        self.lock = Lock()
+        self.changeListeners = []
+        self.rebuild(model.getState())
+        model.subscribe(self.onModelChanged)
+
+
+    # Public methods
+
+    def addChangeListener(self, listener):
+        """ Call listener in the main loop, after every batch of changes of usage. """
+        self.changeListeners.append(listener)
+
+    def isUnused(self, playlistName):
+        """ Return true if no zone includes playlistName. """
+        with self.lock:
+            return self.playlistZones[playlistName] == 0
+
+    def getUsage(self, playlistName):
+        """ Return the number of zones that include playlistName,
+        and the number of times these zones are on air in a week.
+        """
+        with self.lock:
+            return (self.playlistZones[playlistName],
+                    sum(self.playlistDays.get(playlistName, ())))
+
+    def getMatrix(self):
+        """ Return the non-zero entries of the usage matrix.
+
+        Each maps (zone name, playlist name, day index) to the times the zone,
+        and so the playlist, is on air on that day.
+        """
+        with self.lock:
+            return {(zoneName, playlistName, dayIndex): count
+                    for zoneName, playlists in self.zonePlaylists.items()
+                    for playlistName in playlists
+                    for dayIndex, count in enumerate(self.zoneDays[zoneName])
+                    if count > 0}
+
+    def rebuild(self, state):
+        """ Index state, as returned by Model.getState, anew. """
+        with self.lock:
+            self.zonePlaylists = {zoneName: Counter(row[0] for row in rows)
+                                  for zoneName, rows in state['zoneInspector'].items()}
+            self.zoneDays = {zoneName: [0] * 7 for zoneName in self.zonePlaylists}
+            for dayIndex, rows in enumerate(state['schedule']):
+                for scheduleRow in rows:
+                    if scheduleRow[1] in self.zoneDays:
+                        self.zoneDays[scheduleRow[1]][dayIndex] += 1
+            self.playlistDays = {}
+            self.playlistZones = Counter()
+            for zoneName, playlists in self.zonePlaylists.items():
+                for playlistName in playlists:
+                    self.addZoneUsage(playlistName, zoneName, 1)
+
+
+    # Private methods
+
+    def onModelChanged(self, events):
+        """ Update the entries that a batch of change events affects. """
+        for event in events:
+            if isinstance(event, StateLoaded):
+                # The events after it apply to the loaded state, not to the live Model
+                self.rebuild(event.state)
+                continue
+            with self.lock:
+                self.applyEvent(event)
+        self.notifyChange()
+
+    def applyEvent(self, event):
+        """ Update the entries that event affects. Call with the lock held. """
+        if isinstance(event, ZoneAdded):
+            self.zonePlaylists[event.zoneName] = Counter()
+            self.zoneDays[event.zoneName] = [0] * 7
+        elif isinstance(event, ZoneRemoved):
+            for playlistName in list(self.zonePlaylists.get(event.zoneName, ())):
+                self.addZoneUsage(playlistName, event.zoneName, -1)
+            self.zonePlaylists.pop(event.zoneName, None)
+            self.zoneDays.pop(event.zoneName, None)
+        elif isinstance(event, ZoneRenamed):
+            self.zonePlaylists[event.newZoneName] = self.zonePlaylists.pop(event.oldZoneName)
+            self.zoneDays[event.newZoneName] = self.zoneDays.pop(event.oldZoneName)
+        elif isinstance(event, PlaylistRemoved):
+            for playlists in self.zonePlaylists.values():
+                playlists.pop(event.playlistName, None)
+            self.playlistDays.pop(event.playlistName, None)
+            del self.playlistZones[event.playlistName]
+        elif isinstance(event, ScheduleRowChanged):
+            if event.oldRow is not None:
+                self.addOccurrence(event.dayIndex, event.oldRow[1], -1)
+            if event.newRow is not None:
+                self.addOccurrence(event.dayIndex, event.newRow[1], 1)
+        elif isinstance(event, InspectorRowChanged):
+            if event.oldRow is not None:
+                self.addPlaylistRow(event.zoneName, event.oldRow[0], -1)
+            if event.newRow is not None:
+                self.addPlaylistRow(event.zoneName, event.newRow[0], 1)
+
+    def addOccurrence(self, dayIndex, zoneName, sign):
+        """ Count one more (sign 1) or one less (sign -1) occurrence of zoneName. """
+        if zoneName not in self.zoneDays:
+            return
+        self.zoneDays[zoneName][dayIndex] += sign
+        for playlistName in self.zonePlaylists[zoneName]:
+            self.playlistDays[playlistName][dayIndex] += sign
+
+    def addPlaylistRow(self, zoneName, playlistName, sign):
+        """ Count one more (sign 1) or one less (sign -1) row of playlistName in zoneName. """
+        playlists = self.zonePlaylists.get(zoneName)
+        if playlists is None or (sign < 0 and playlistName not in playlists):
+            return
+        playlists[playlistName] += sign
+        # Only the first row and the removal of the last one change the zone's usage
+        if sign > 0 and playlists[playlistName] == 1:
+            self.addZoneUsage(playlistName, zoneName, 1)
+        elif sign < 0 and playlists[playlistName] <= 0:
+            del playlists[playlistName]
+            self.addZoneUsage(playlistName, zoneName, -1)
+
+    def addZoneUsage(self, playlistName, zoneName, sign):
+        """ Add (sign 1) or subtract (sign -1) the occurrences of zoneName to playlistName's. """
+        days = self.playlistDays.setdefault(playlistName, [0] * 7)
+        for dayIndex, count in enumerate(self.zoneDays[zoneName]):
+            days[dayIndex] += sign * count
+        self.playlistZones[playlistName] += sign
+
+    def notifyChange(self):
+        """ Call every change listener. """
+        for listener in self.changeListeners:
+            listener()
@@ -0,0 +1,204 @@
+"""
+The Validator
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from re import compile as compileRegex
+from helpers import WEEK, ZONE_INSPECTOR_COLUMNS, UNSET
+
+
+START_TIME_FORMAT = compileRegex(r'^([01][0-9]|2[0-3]):[0-5][0-9]$')
+MAX_INTERMEDIATE_PLAYLISTS = 4
+
+
+class Validator:
+    """ Check the schema's constraints directly against the Model's rows.
+
+    Problems are kept per zone and per day, and each edit re-checks only the
+    zone or the day it touched, so that invalid cells can be highlighted
+    right away. XSD validation at export remains the final gate.
+
+    Problematic rows are identified by their values, which do not change
+    when a store is sorted or created anew.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        # zoneName -> list of (zoneInspectorRow, column, message).
+        # A row of None denotes a problem of the zone as a whole.
+        self.zoneProblems = {}
+        # dayIndex -> list of (scheduleRow, column, message)
+        self.scheduleProblems = {}
+
+
+    # Public methods
+
+    def validateAll(self):
+        """ Re-check every zone and every day. """
+        self.zoneProblems.clear()
+        for zone in self.model.zones:
+            self.validateZone(zone[0])
+        for dayIndex in range(7):
+            self.validateDay(dayIndex)
+
+    def validateInvalidZones(self):
+        """ Re-check the zones that currently have problems.
+
+        Used when a database change may have fixed them,
+        e.g. when a missing playlist is added.
+        """
+        for zoneName in list(self.zoneProblems):
+            self.validateZone(zoneName)
+
+    def validateInvalidDays(self):
+        """ Re-check the days that currently have problems. """
+        for dayIndex in list(self.scheduleProblems):
+            self.validateDay(dayIndex)
+
+    def validateZone(self, zoneName):
+        """ Re-check the rows of zoneName's inspector. """
+        if zoneName not in self.model.zoneInspector:
+            self.forgetZone(zoneName)
+            return
+        problems = []
+        typeCounts = {'Main': 0, 'Fallback': 0, 'Intermediate': 0}
+        for zoneInspectorRow in self.model.zoneInspector.getRows(zoneName):
+            playlistType = zoneInspectorRow[1]
+            if playlistType in typeCounts:
+                typeCounts[playlistType] += 1
+            if not self.model.playlistExistsInDatabase(zoneInspectorRow[0]):
+                problems.append((zoneInspectorRow, 0,
+                                 'playlist does not exist in database'))
+            for column in range(3, len(ZONE_INSPECTOR_COLUMNS)):
+                message = checkZoneInspectorCell(column, zoneInspectorRow[column],
+                                                 playlistType)
+                if message is not None:
+                    problems.append((zoneInspectorRow, column, message))
+        if typeCounts['Main'] != 1:
+            problems.append((None, None, 'exactly one Main playlist is required'))
+        if typeCounts['Fallback'] > 1:
+            problems.append((None, None, 'at most one Fallback playlist is allowed'))
+        if typeCounts['Intermediate'] > MAX_INTERMEDIATE_PLAYLISTS:
+            problems.append((None, None, 'at most ' + str(MAX_INTERMEDIATE_PLAYLISTS) +
+                                         ' Intermediate playlists are allowed'))
+        if problems:
+            self.zoneProblems[zoneName] = problems
+        else:
+            self.zoneProblems.pop(zoneName, None)
+
+    def validateDay(self, dayIndex):
+        """ Re-check the rows of the day that corresponds to dayIndex. """
+        problems = []
+        for scheduleRow in self.model.schedule[dayIndex]:
+            scheduleRow = tuple(scheduleRow)
+            message = checkScheduleCell(0, scheduleRow[0])
+            if message is not None:
+                problems.append((scheduleRow, 0, message))
+            if not self.model.zoneExistsInDatabase(scheduleRow[1]):
+                problems.append((scheduleRow, 1, 'zone does not exist in database'))
+        if problems:
+            self.scheduleProblems[dayIndex] = problems
+        else:
+            self.scheduleProblems.pop(dayIndex, None)
+
+    def renameZone(self, oldZoneName, newZoneName):
+        """ Move oldZoneName's problems under newZoneName. """
+        if oldZoneName in self.zoneProblems:
+            self.zoneProblems[newZoneName] = self.zoneProblems.pop(oldZoneName)
+
+    def forgetZone(self, zoneName):
+        """ Drop the problems of a zone that no longer exists. """
+        self.zoneProblems.pop(zoneName, None)
+
+    def zoneIsValid(self, zoneName):
+        """ Return true if zoneName has no known problems. """
+        return zoneName not in self.zoneProblems
+
+    def getZoneInspectorCellProblem(self, zoneName, zoneInspectorRow, column):
+        """ Return the problem of a Zone Inspector cell, or None if it is valid.
+
+        zoneInspectorRow is the tuple of the row's values.
+        """
+        for problemRow, problemColumn, message in self.zoneProblems.get(zoneName, ()):
+            if problemRow == zoneInspectorRow and problemColumn == column:
+                return message
+            if problemRow is None and column == 1:
+                # Zone-wide problems are shown on the Type column
+                return message
+        return None
+
+    def getScheduleCellProblem(self, dayIndex, scheduleRow, column):
+        """ Return the problem of a Flow Schedule cell, or None if it is valid.
+
+        scheduleRow is the tuple of the row's values.
+        """
+        for problemRow, problemColumn, message in self.scheduleProblems.get(dayIndex, ()):
+            if problemRow == scheduleRow and problemColumn == column:
+                return message
+        return None
+
+    def getProblems(self):
+        """ Return a readable description of every problem that affects the export.
+
+        Only zones that appear in the Flow Schedule are exported,
+        so problems of unscheduled zones are not reported.
+        """
+        descriptions = []
+        scheduledZones = set()
+        for dayIndex in range(7):
+            for scheduleRow in self.model.schedule[dayIndex]:
+                scheduledZones.add(scheduleRow[1])
+            for scheduleRow, column, message in self.scheduleProblems.get(dayIndex, ()):
+                descriptions.append(WEEK[dayIndex] + ', zone "' + scheduleRow[1] +
+                                    '" at ' + scheduleRow[0] + ': ' + message)
+        for zoneName in sorted(scheduledZones & set(self.zoneProblems)):
+            for zoneInspectorRow, column, message in self.zoneProblems[zoneName]:
+                if zoneInspectorRow is None:
+                    descriptions.append('Zone "' + zoneName + '": ' + message)
+                else:
+                    descriptions.append('Zone "' + zoneName + '", playlist "' +
+                                        zoneInspectorRow[0] + '" (' +
+                                        ZONE_INSPECTOR_COLUMNS[column] + '): ' + message)
+        return descriptions
+
+
+# Cell checks
+
+def checkScheduleCell(column, value):
+    """ Return the problem of a Flow Schedule value, or None if it is valid. """
+    if column == 0 and START_TIME_FORMAT.match(value) is None:
+        return 'start time must be formatted as HH:MM'
+    return None
+
+def checkZoneInspectorCell(column, value, playlistType):
+    """ Return the problem of a Zone Inspector value, or None if it is valid.
+
+    Unset values stand for omitted optional elements.
+    """
+    if column in (3, 4):
+        if playlistType != 'Intermediate':
+            if value != UNSET:
+                return 'only Intermediate playlists are scheduled'
+        elif value < 1:
+            return 'must be a positive integer'
+    elif column in (5, 6):
+        if value != UNSET and not 0 <= value <= 10:
+            return 'must be an integer between 0 and 10'
+    elif column in (7, 8):
+        if value != UNSET and not 0.0 <= value <= 1.0:
+            return 'must be a number between 0.0 and 1.0'
+    return None
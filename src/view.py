@@ -17,10 +17,16 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+from contextlib import contextmanager
 from gi.repository import Gtk, Gdk
 from gi.repository.Gio import SimpleAction
-from gi.repository.Pango import WrapMode
-from helpers import CSS, WEEK
+from gi.repository.Pango import EllipsizeMode, WrapMode
+from helpers import CSS, LARGE_DATASET_ROWS, WEEK
+from delta import MERGE, REPLACE
+
+
+# Width of the columns in large-dataset mode, unless they were already laid out
+LARGE_DATASET_COLUMN_WIDTH = 200
 
 
 class View(Gtk.ApplicationWindow):
@@ -41,6 +47,9 @@ class View(Gtk.ApplicationWindow):
         self.dialogs = self.Dialogs()
         self.windows = self.Windows()
 
+        # TreeView -> how its columns were laid out, while it is in large-dataset mode
+        self.normalLayouts = {}
+
     def setCallbacks(self, callbacks):
         """ Save the callbacks from controller.
 
@@ -56,6 +65,21 @@ class View(Gtk.ApplicationWindow):
         action = SimpleAction.new('export_xml', None)
         action.connect('activate', self.callbacks.onExportXMLMenuOptionSelected)
         self.add_action(action)
+        action = SimpleAction.new('publish', None)
+        action.connect('activate', self.callbacks.onPublishMenuOptionSelected)
+        self.add_action(action)
+        action = SimpleAction.new('history', None)
+        action.connect('activate', self.callbacks.onHistoryMenuOptionSelected)
+        self.add_action(action)
+        action = SimpleAction.new('load_zones', None)
+        action.connect('activate', self.callbacks.onLoadZonesMenuOptionSelected)
+        self.add_action(action)
+        action = SimpleAction.new('import_play_logs', None)
+        action.connect('activate', self.callbacks.onImportPlayLogsMenuOptionSelected)
+        self.add_action(action)
+        action = SimpleAction.new('memory_usage', None)
+        action.connect('activate', self.callbacks.onMemoryUsageMenuOptionSelected)
+        self.add_action(action)
 
     def initGUI(self):
         """ Initialize GUI components. """
@@ -122,6 +146,9 @@ class View(Gtk.ApplicationWindow):
                                  self.callbacks.onScheduleRowEditingStarted, i)
                 column = Gtk.TreeViewColumn(columnTitle, renderer, text=i)
                 column.set_sort_column_id(i)
+                column.set_cell_data_func(renderer,
+                                          self.callbacks.onScheduleCellDataRequested,
+                                          (dayIndex, i))
                 self.schedule[dayIndex].append_column(column)
             scrollview = Gtk.ScrolledWindow()
             scrollview.set_vexpand(True)
@@ -162,6 +189,7 @@ class View(Gtk.ApplicationWindow):
         renderer.connect('edited', self.callbacks.onZoneRowEdited, 0)
         column = Gtk.TreeViewColumn(columnTitle, renderer, text=0)
         column.set_sort_column_id(0)
+        column.set_cell_data_func(renderer, self.callbacks.onZoneCellDataRequested, 0)
         self.zones.append_column(column)
         for i, columnTitle in enumerate(['Description', 'Maintainers', 'Comments']):
             renderer = Gtk.CellRendererText(editable=True)
@@ -173,6 +201,12 @@ class View(Gtk.ApplicationWindow):
             column.set_sizing(Gtk.TreeViewColumnSizing.AUTOSIZE)
             column.set_resizable(True)
             self.zones.append_column(column)
+        renderer = Gtk.CellRendererText()
+        column = Gtk.TreeViewColumn('Aired', renderer)
+        column.set_cell_data_func(renderer, self.callbacks.onZoneAiredDataRequested)
+        self.zones.append_column(column)
+        self.zones.connect('query-tooltip', self.onRowTooltipQueried,
+                           ['Name', 'Description', 'Maintainers', 'Comments'])
         scrollview = Gtk.ScrolledWindow()
         scrollview.set_vexpand(True)
         scrollview.add(self.zones)
@@ -211,7 +245,12 @@ class View(Gtk.ApplicationWindow):
 
         self.zoneInspectorBox.add(self.zoneInspectorHeaderBar)
 
-        # Zone Inspector View
+        # Zone Inspector View.
+        # It stays hidden until a zone is selected, so it is built on first use.
+        self.zoneInspector = None
+
+    def initZoneInspectorView(self):
+        """ Initialize Zone Inspector's view. """
         self.zoneInspector = Gtk.TreeView()
         self.zoneInspector.get_selection().connect(
             'changed', self.callbacks.onZoneInspectorRowSelected)
@@ -222,6 +261,8 @@ class View(Gtk.ApplicationWindow):
                          self.callbacks.onZoneInspectorRowEditingStarted, 0)
         column = Gtk.TreeViewColumn(columnTitle, renderer, text=0)
         column.set_sort_column_id(0)
+        column.set_cell_data_func(renderer,
+                                  self.callbacks.onZoneInspectorCellDataRequested, 0)
         self.zoneInspector.append_column(column)
         columnTitle = 'Type'
         renderer = Gtk.CellRendererCombo()
@@ -236,6 +277,8 @@ class View(Gtk.ApplicationWindow):
         renderer.connect('edited', self.callbacks.onPlaylistTypeChanged)
         column = Gtk.TreeViewColumn(columnTitle, renderer, text=1)
         column.set_sort_column_id(1)
+        column.set_cell_data_func(renderer,
+                                  self.callbacks.onZoneInspectorCellDataRequested, 1)
         self.zoneInspector.append_column(column)
         columnTitle = 'Shuffle'
         renderer = Gtk.CellRendererToggle()
@@ -248,13 +291,33 @@ class View(Gtk.ApplicationWindow):
             'MaxLevel']):
             renderer = Gtk.CellRendererText(editable=True)
             renderer.connect('edited', self.callbacks.onZoneInspectorRowEdited, i+3)
-            column = Gtk.TreeViewColumn(columnTitle, renderer, text=i+3)
+            # The cell data function renders the typed value as text
+            column = Gtk.TreeViewColumn(columnTitle, renderer)
             column.set_sort_column_id(i+3)
+            column.set_cell_data_func(renderer,
+                                      self.callbacks.onZoneInspectorCellDataRequested, i+3)
             self.zoneInspector.append_column(column)
         scrollview = Gtk.ScrolledWindow()
         scrollview.set_vexpand(True)
         scrollview.add(self.zoneInspector)
         self.zoneInspectorBox.add(scrollview)
+        scrollview.show_all()
+
+    def showZoneInspector(self, model):
+        """ Make Zone Inspector display the contents of model.
+
+        Its view is built the first time it is shown.
+        """
+        if self.zoneInspector is None:
+            self.initZoneInspectorView()
+        self.zoneInspector.set_model(model)
+        if not self.zoneInspector.get_visible():
+            self.zoneInspector.show()
+
+    def hideZoneInspector(self):
+        """ Hide Zone Inspector's view, if it is built. """
+        if self.zoneInspector is not None:
+            self.zoneInspector.hide()
 
     def initPlaylists(self):
         """ Initialize Playlists. """
@@ -282,6 +345,10 @@ class View(Gtk.ApplicationWindow):
         button.set_tooltip_markup('Add a new <i><b>playlist</b></i> to <i><b>database</b></i>')
         button.connect('clicked', self.callbacks.onAddPlaylistButtonClicked)
         self.playlistHeaderBar.pack_end(button)
+        button = Gtk.ToggleButton(label='Unused')
+        button.set_tooltip_markup('Show only the <i><b>playlists</b></i> that no <i><b>zone</b></i> includes')
+        button.connect('toggled', self.callbacks.onUnusedPlaylistsToggled)
+        self.playlistHeaderBar.pack_start(button)
         self.playlistBox.add(self.playlistHeaderBar)
 
         # Playlist View
@@ -293,11 +360,118 @@ class View(Gtk.ApplicationWindow):
             column = Gtk.TreeViewColumn(columnTitle, renderer, text=i)
             column.set_sort_column_id(i)
             self.playlists.append_column(column)
+        renderer = Gtk.CellRendererText()
+        column = Gtk.TreeViewColumn('Usage', renderer)
+        column.set_cell_data_func(renderer, self.callbacks.onPlaylistUsageDataRequested)
+        self.playlists.append_column(column)
+        renderer = Gtk.CellRendererText()
+        column = Gtk.TreeViewColumn('Aired', renderer)
+        column.set_cell_data_func(renderer, self.callbacks.onPlaylistAiredDataRequested)
+        self.playlists.append_column(column)
+        self.playlists.connect('query-tooltip', self.onRowTooltipQueried, ['Name', 'Path'])
         scrollview = Gtk.ScrolledWindow()
         scrollview.set_vexpand(True)
         scrollview.add(self.playlists)
         self.playlistBox.add(scrollview)
 
+    def isLargeDataset(self, treeView):
+        """ Return true if treeView is in large-dataset mode. """
+        return treeView.get_fixed_height_mode()
+
+    def setLargeDataset(self, treeView, enabled):
+        """ Switch treeView to or from large-dataset mode.
+
+        In large-dataset mode every row has the same height and every column a
+        fixed width, so GTK lays out only the rows on screen instead of measuring
+        all of them. Text is ellipsized instead of wrapped, and the full text of
+        a row is shown in its tooltip.
+        """
+        if self.isLargeDataset(treeView) == enabled:
+            return
+        if enabled:
+            layout = []
+            for column in treeView.get_columns():
+                renderers = [(renderer, renderer.props.wrap_width, renderer.props.ellipsize)
+                             for renderer in column.get_cells()
+                             if isinstance(renderer, Gtk.CellRendererText)]
+                layout.append((column, column.get_sizing(), column.get_resizable(),
+                               renderers))
+                width = column.get_width()
+                column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+                column.set_fixed_width(width if width > 0 else LARGE_DATASET_COLUMN_WIDTH)
+                column.set_resizable(True)
+                for renderer, wrapWidth, ellipsize in renderers:
+                    renderer.props.wrap_width = -1
+                    renderer.props.ellipsize = EllipsizeMode.END
+            self.normalLayouts[treeView] = layout
+            # Every column must have a fixed width first
+            treeView.set_fixed_height_mode(True)
+        else:
+            treeView.set_fixed_height_mode(False)
+            for column, sizing, resizable, renderers in self.normalLayouts.pop(treeView):
+                column.set_sizing(sizing)
+                column.set_resizable(resizable)
+                for renderer, wrapWidth, ellipsize in renderers:
+                    renderer.props.wrap_width = wrapWidth
+                    renderer.props.ellipsize = ellipsize
+        treeView.set_has_tooltip(enabled)
+
+    def onRowTooltipQueried(self, treeView, x, y, keyboardMode, tooltip, columnTitles):
+        """ Show the full text of the row under the pointer, in large-dataset mode.
+
+        columnTitles are the titles of the model's first columns, in order.
+        """
+        if not self.isLargeDataset(treeView):
+            return False
+        found, x, y, model, path, treeIter = treeView.get_tooltip_context(x, y, keyboardMode)
+        if not found:
+            return False
+        lines = []
+        for columnIndex, columnTitle in enumerate(columnTitles):
+            text = model.get_value(treeIter, columnIndex)
+            if text:
+                lines.append(columnTitle + ': ' + text)
+        tooltip.set_text('\n'.join(lines))
+        treeView.set_tooltip_row(tooltip, path)
+        return True
+
+    def getTreeViews(self):
+        """ Return every TreeView that shows a store of the Model. """
+        treeViews = [self.zones, self.playlists] + list(self.schedule.values())
+        if self.zoneInspector is not None:
+            treeViews.append(self.zoneInspector)
+        return treeViews
+
+    def detachModels(self):
+        """ Detach every TreeView from its model. Return what attachModels needs. """
+        models = [(treeView, treeView.get_model()) for treeView in self.getTreeViews()]
+        for treeView, model in models:
+            treeView.set_model(None)
+        return models
+
+    def attachModels(self, models):
+        """ Attach the TreeViews to the models that detachModels detached them from. """
+        for treeView, model in models:
+            treeView.set_model(model)
+
+    @contextmanager
+    def bulkChanges(self, changes):
+        """ Detach the TreeViews from their models while the block makes changes changes,
+        if they are LARGE_DATASET_ROWS or more.
+
+        A detached view ignores the signals of its model, and lays it out once,
+        when it is attached again. Selections are lost, so small changes are
+        left to the views to follow.
+        """
+        if changes < LARGE_DATASET_ROWS:
+            yield
+            return
+        models = self.detachModels()
+        try:
+            yield
+        finally:
+            self.attachModels(models)
+
 
     class Dialogs:
         """ All the dialogs that might be displayed. """
@@ -311,7 +485,12 @@ class View(Gtk.ApplicationWindow):
                 self.format_secondary_text(message)
                 messageArea = self.get_message_area()
                 if details != '':
-                    messageArea.add(Gtk.Label(details))
+                    # Long details, e.g. a list of problems, scroll
+                    scrollview = Gtk.ScrolledWindow(propagate_natural_height=True,
+                                                    max_content_height=300)
+                    scrollview.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+                    scrollview.add(Gtk.Label(details))
+                    messageArea.add(scrollview)
                 if consequence != '':
                     messageArea.add(Gtk.Label(consequence))
                 messageArea.show_all()
@@ -321,6 +500,22 @@ class View(Gtk.ApplicationWindow):
                 self.destroy()
 
 
+        class ReloadConflict(Gtk.MessageDialog):
+
+            def __init__(self, parent, path, conflicts):
+                Gtk.MessageDialog.__init__(self, parent=parent, flags=0,
+                                           type=Gtk.MessageType.QUESTION,
+                                           buttons=Gtk.ButtonsType.NONE,
+                                           message_format='File changed on disk')
+                self.format_secondary_text(path + ' was changed by someone else. '
+                                           'Some of the changes conflict with your edits:')
+                messageArea = self.get_message_area()
+                messageArea.add(Gtk.Label('\n'.join(conflicts)))
+                messageArea.show_all()
+                self.add_button('Keep My Edits', Gtk.ResponseType.CANCEL)
+                self.add_button('Reload', Gtk.ResponseType.OK)
+
+
         class AddZone(Gtk.Dialog):
 
             def __init__(self, parent, entry):
@@ -361,13 +556,22 @@ class View(Gtk.ApplicationWindow):
 
         class ImportXML(Gtk.FileChooserDialog):
 
-            def __init__(self, parent):
+            def __init__(self, parent, showImportModes=False):
                 Gtk.FileChooserDialog.__init__(self, title='Choose an XML file',
                                                transient_for=parent, modal=True,
                                                action=Gtk.FileChooserAction.OPEN)
+                # Let the user choose how a file is re-imported into a non-empty session
+                self.importModes = None
+                if showImportModes:
+                    self.importModes = Gtk.ComboBoxText()
+                    self.importModes.append(MERGE, 'Merge into the current schedule')
+                    self.importModes.append(REPLACE, 'Replace the current schedule')
+                    self.importModes.set_active_id(MERGE)
+                    self.set_extra_widget(self.importModes)
                 xmlFilter = Gtk.FileFilter()
-                xmlFilter.set_name('XML files')
-                xmlFilter.add_pattern('*.xml')
+                xmlFilter.set_name('XML files (plain or compressed)')
+                for pattern in ('*.xml', '*.xml.gz', '*.xml.xz'):
+                    xmlFilter.add_pattern(pattern)
                 self.add_filter(xmlFilter)
                 allFilter = Gtk.FileFilter()
                 allFilter.set_name('All files')
@@ -376,6 +580,83 @@ class View(Gtk.ApplicationWindow):
                 self.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
                 self.add_button('Import', Gtk.ResponseType.OK)
 
+            def getImportMode(self):
+                """ Return the selected re-import mode, or None for a plain import. """
+                if self.importModes is None:
+                    return None
+                return self.importModes.get_active_id()
+
+
+        class History(Gtk.Dialog):
+
+            def __init__(self, parent, title, entries):
+                Gtk.Dialog.__init__(self, title=title, transient_for=parent, modal=True)
+                self.set_default_size(600, 400)
+                self.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+                self.add_button('Check Out', Gtk.ResponseType.OK)
+                # Time, description and version id of each entry, newest first
+                self.store = Gtk.ListStore(str, str, str)
+                for entry in entries:
+                    self.store.append(entry)
+                self.entries = Gtk.TreeView(model=self.store)
+                for i, columnTitle in enumerate(['Time', 'Change', 'Version']):
+                    renderer = Gtk.CellRendererText()
+                    if i == 2:
+                        renderer.props.ellipsize = EllipsizeMode.END
+                    column = Gtk.TreeViewColumn(columnTitle, renderer, text=i)
+                    column.set_resizable(True)
+                    column.set_expand(i == 2)
+                    self.entries.append_column(column)
+                scrollview = Gtk.ScrolledWindow()
+                scrollview.set_vexpand(True)
+                scrollview.add(self.entries)
+                self.get_content_area().add(scrollview)
+                self.show_all()
+
+            def getSelectedVersion(self):
+                """ Return the id of the selected version, or None. """
+                treeiter = self.entries.get_selection().get_selected()[1]
+                return self.store[treeiter][2] if treeiter is not None else None
+
+
+        class LoadZones(Gtk.FileChooserDialog):
+
+            def __init__(self, parent):
+                Gtk.FileChooserDialog.__init__(self, title='Choose a table of zones',
+                                               transient_for=parent, modal=True,
+                                               action=Gtk.FileChooserAction.OPEN)
+                tableFilter = Gtk.FileFilter()
+                tableFilter.set_name('CSV and TSV files')
+                for pattern in ('*.csv', '*.tsv', '*.txt'):
+                    tableFilter.add_pattern(pattern)
+                self.add_filter(tableFilter)
+                allFilter = Gtk.FileFilter()
+                allFilter.set_name('All files')
+                allFilter.add_pattern('*')
+                self.add_filter(allFilter)
+                self.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+                self.add_button('Load', Gtk.ResponseType.OK)
+
+
+        class ImportPlayLogs(Gtk.FileChooserDialog):
+
+            def __init__(self, parent):
+                Gtk.FileChooserDialog.__init__(self, title='Choose play logs',
+                                               transient_for=parent, modal=True,
+                                               action=Gtk.FileChooserAction.OPEN,
+                                               select_multiple=True)
+                logFilter = Gtk.FileFilter()
+                logFilter.set_name('Play logs (plain or compressed)')
+                for pattern in ('*.log', '*.log.gz', '*.log.xz'):
+                    logFilter.add_pattern(pattern)
+                self.add_filter(logFilter)
+                allFilter = Gtk.FileFilter()
+                allFilter.set_name('All files')
+                allFilter.add_pattern('*')
+                self.add_filter(allFilter)
+                self.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+                self.add_button('Import', Gtk.ResponseType.OK)
+
 
         class ExportXML(Gtk.FileChooserDialog):
 
@@ -384,10 +665,24 @@ class View(Gtk.ApplicationWindow):
                     self, title='Choose a file name for the new XML schedule',
                     transient_for=parent, modal=True, action=Gtk.FileChooserAction.SAVE)
                 self.set_do_overwrite_confirmation(True)
-                xmlFilter = Gtk.FileFilter()
-                xmlFilter.set_name('XML files')
-                xmlFilter.add_pattern('*.xml')
-                self.add_filter(xmlFilter)
+                # Let the user choose between the Audio Scheduler's format and the compact one
+                self.formats = Gtk.ComboBoxText()
+                self.formats.append('schedule', 'Week schedule (Audio Scheduler)')
+                self.formats.append('compact', 'Compact schedule (each zone defined once)')
+                self.formats.set_active_id('schedule')
+                self.set_extra_widget(self.formats)
+                # The file is compressed according to the suffix of its name,
+                # so choosing a filter gives the name the filter's suffix
+                self.suffixes = []
+                for name, suffix in (('XML files', '.xml'),
+                                     ('Gzip compressed XML files', '.xml.gz'),
+                                     ('XZ compressed XML files', '.xml.xz')):
+                    xmlFilter = Gtk.FileFilter()
+                    xmlFilter.set_name(name)
+                    xmlFilter.add_pattern('*' + suffix)
+                    self.add_filter(xmlFilter)
+                    self.suffixes.append((xmlFilter, suffix))
+                self.connect('notify::filter', self.onFilterChanged)
                 allFilter = Gtk.FileFilter()
                 allFilter.set_name('All files')
                 allFilter.add_pattern('*')
@@ -395,6 +690,46 @@ class View(Gtk.ApplicationWindow):
                 self.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
                 self.add_button('Export', Gtk.ResponseType.OK)
 
+            def isCompact(self):
+                """ Return true if the compact format is selected. """
+                return self.formats.get_active_id() == 'compact'
+
+            def getFileName(self):
+                """ Return the chosen file name, with the suffix of the chosen filter
+                if it has none of its own.
+                """
+                fileName = self.get_filename()
+                if fileName is None or fileName.endswith(('.gz', '.xz')):
+                    return fileName
+                suffix = self.getChosenSuffix()
+                if suffix is None or (suffix == '.xml' and fileName.endswith('.xml')):
+                    return fileName
+                return self.replaceSuffix(fileName, suffix)
+
+            def onFilterChanged(self, dialog, parameter):
+                """ Give the typed name the suffix of the chosen filter. """
+                name = self.get_current_name()
+                suffix = self.getChosenSuffix()
+                if name and suffix is not None:
+                    self.set_current_name(self.replaceSuffix(name, suffix))
+
+            def getChosenSuffix(self):
+                """ Return the suffix of the chosen filter, or None for all files. """
+                chosenFilter = self.get_filter()
+                for xmlFilter, suffix in self.suffixes:
+                    if xmlFilter == chosenFilter:
+                        return suffix
+                return None
+
+            def replaceSuffix(self, fileName, suffix):
+                """ Return fileName with suffix instead of the suffix of any filter. """
+                # Longest first, so that .xml.gz is not taken for .gz
+                for _, otherSuffix in sorted(self.suffixes, key=lambda entry: -len(entry[1])):
+                    if fileName.endswith(otherSuffix):
+                        fileName = fileName[:-len(otherSuffix)]
+                        break
+                return fileName + suffix
+
 
     class Windows:
         """ All the windows that might be displayed, apart from the main window. """
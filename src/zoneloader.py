@@ -0,0 +1,146 @@
+"""
+Zone Loader
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from csv import Error as CsvError, reader
+from helpers import getDefaultPlaylists, getZonePlaylist
+from validator import MAX_INTERMEDIATE_PLAYLISTS
+
+
+""" Load many zones at once from a CSV or TSV table.
+
+Each row of the table is a zone, with the columns:
+
+    name, description, maintainers, comments, playlists
+
+All but the name may be empty or left out. Playlists are names of playlists
+in the database, separated by semicolons: the first becomes the zone's Main
+playlist and the rest Intermediate ones, after the default playlists that
+every new zone gets. A playlist may not be listed twice, nor be one of the
+default playlists, and the zone may not end up with more Intermediate playlists
+than the schema allows. A first row whose name is "name" is taken as a header.
+
+The whole table is checked before anything is loaded, and the zones are
+loaded as a delta (see delta.py), so that it is all or nothing.
+"""
+
+COLUMNS = ['name', 'description', 'maintainers', 'comments', 'playlists']
+
+PLAYLIST_SEPARATOR = ';'
+
+
+class ZoneTableError(Exception):
+    """ A zone table that cannot be loaded, with every problem found in it. """
+
+    def __init__(self, problems):
+        Exception.__init__(self, '\n'.join(problems))
+        self.problems = problems
+
+
+# Functions
+
+def readZoneTable(path):
+    """ Return the rows of the zone table in path, each with its line number.
+
+    Tab-separated if its first line holds a tab, else comma-separated.
+    Raise ZoneTableError if it is not a valid table.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as tableFile:
+        firstLine = tableFile.readline()
+        tableFile.seek(0)
+        rows = reader(tableFile, delimiter='\t' if '\t' in firstLine else ',')
+        numberedRows = []
+        try:
+            for row in rows:
+                numberedRows.append((rows.line_num, row))
+        except CsvError as e:
+            raise ZoneTableError(['line ' + str(rows.line_num) + ': ' + str(e)])
+    if numberedRows and numberedRows[0][1] and\
+       numberedRows[0][1][0].strip().lower() == COLUMNS[0]:
+        del numberedRows[0]
+    return numberedRows
+
+def getZoneTableDelta(numberedRows, state):
+    """ Return the delta that adds the zones of a zone table to state.
+
+    numberedRows is as returned by readZoneTable, and state as returned by
+    Model.getState. Raise ZoneTableError with every problem of the table.
+    """
+    problems = []
+    zoneNames = {zone[0] for zone in state['zones']}
+    playlistNames = {playlist[0] for playlist in state['playlists']}
+    defaultPlaylists = getDefaultPlaylists(playlistNames)
+    # zoneName -> line where the table defines it
+    zoneLines = {}
+    delta = []
+    for line, row in numberedRows:
+        if not any(cell.strip() for cell in row):
+            continue
+        prefix = 'line ' + str(line) + ': '
+        if len(row) > len(COLUMNS):
+            problems.append(prefix + 'expected at most ' + str(len(COLUMNS)) +
+                            ' columns, found ' + str(len(row)))
+            continue
+        zoneName, description, maintainers, comments, playlists =\
+            [cell.strip() for cell in row] + [''] * (len(COLUMNS) - len(row))
+        if zoneName == '':
+            problems.append(prefix + 'the zone has no name')
+            continue
+        if zoneName in zoneNames:
+            problems.append(prefix + 'zone "' + zoneName + '" already exists')
+            continue
+        if zoneName in zoneLines:
+            problems.append(prefix + 'zone "' + zoneName + '" is already on line ' +
+                            str(zoneLines[zoneName]))
+            continue
+        zoneLines[zoneName] = line
+        delta.append(['addZoneToDatabase', [zoneName, maintainers, description, comments]])
+        zonePlaylistNames = set()
+        intermediatePlaylists = 0
+        for playlist in defaultPlaylists:
+            delta.append(['addPlaylistToZone', [zoneName, list(playlist.toRow())]])
+            zonePlaylistNames.add(playlist.name)
+            if playlist.type == 'Intermediate':
+                intermediatePlaylists += 1
+        hasMainPlaylist = False
+        for playlistName in playlists.split(PLAYLIST_SEPARATOR):
+            playlistName = playlistName.strip()
+            if playlistName == '':
+                continue
+            if playlistName in zonePlaylistNames:
+                problems.append(prefix + 'duplicate playlist "' + playlistName + '"' +
+                                (', it is a default playlist'
+                                 if any(playlist.name == playlistName
+                                        for playlist in defaultPlaylists) else ''))
+                continue
+            if playlistName not in playlistNames:
+                problems.append(prefix + 'playlist "' + playlistName + '" does not exist')
+                continue
+            playlist = getZonePlaylist(playlistName, hasMainPlaylist)
+            delta.append(['addPlaylistToZone', [zoneName, list(playlist.toRow())]])
+            zonePlaylistNames.add(playlistName)
+            if playlist.type == 'Intermediate':
+                intermediatePlaylists += 1
+            hasMainPlaylist = True
+        if intermediatePlaylists > MAX_INTERMEDIATE_PLAYLISTS:
+            problems.append(prefix + 'too many Intermediate playlists: ' +
+                            str(intermediatePlaylists) + ' with the default ones, at most ' +
+                            str(MAX_INTERMEDIATE_PLAYLISTS) + ' are allowed')
+    if problems:
+        raise ZoneTableError(problems)
+    return delta
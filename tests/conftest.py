@@ -0,0 +1,102 @@
+"""
+Test fixtures
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+from os.path import dirname, join
+
+import gi
+gi.require_version('Gtk', '3.0')
+import pytest
+
+# The modules of src/ import each other by their plain names
+sys.path.insert(0, join(dirname(dirname(__file__)), 'src'))
+
+from helpers import Playlist
+from model import Model
+
+
+""" The tests need GTK's ListStore, but no display. Run them from the repository's
+root with `python3 -m pytest tests`.
+"""
+
+
+# Functions
+
+def getPlaylistRow(name, playlistType, schedIntervalMins=30):
+    """ Return a Zone Inspector row, as a list, like Model.getState has them. """
+    if playlistType == 'Intermediate':
+        return list(Playlist(name, playlistType, True, schedIntervalMins, 1).toRow())
+    return list(Playlist(name, playlistType, True).toRow())
+
+def normalizeState(state):
+    """ Return state with its rows sorted, so that states are compared regardless of order. """
+    return {
+        'zones': sorted(tuple(zone) for zone in state['zones']),
+        'playlists': sorted(tuple(playlist) for playlist in state['playlists']),
+        'zoneInspector': {zoneName: sorted(tuple(row) for row in rows)
+                          for zoneName, rows in state['zoneInspector'].items()},
+        'schedule': [sorted(tuple(row) for row in rows) for rows in state['schedule']]}
+
+def getModel(state):
+    """ Return a new Model that holds state. """
+    model = Model()
+    model.loadState(state)
+    return model
+
+
+# Fixtures
+
+@pytest.fixture
+def stateA():
+    """ A week with three zones, four playlists and a few occurrences. """
+    schedule = [[] for dayIndex in range(7)]
+    schedule[0] = [['08:00', 'Morning'], ['20:00', 'Night']]
+    schedule[2] = [['08:00', 'Morning'], ['12:00', 'Noon']]
+    schedule[6] = [['00:00', 'Night']]
+    return {
+        'zones': [['Morning', 'Wake-up music', 'Alice', ''],
+                  ['Noon', 'Lunch', 'Bob', 'Quiet'],
+                  ['Night', '', '', '']],
+        'playlists': [['Pop', '/music/Pop.m3u'], ['Jazz', '/music/Jazz.m3u'],
+                      ['Spots', '/music/Spots.m3u'], ['News', '/music/News.m3u']],
+        'zoneInspector': {
+            'Morning': [getPlaylistRow('Pop', 'Main'), getPlaylistRow('Spots', 'Intermediate')],
+            'Noon': [getPlaylistRow('Jazz', 'Main')],
+            'Night': [getPlaylistRow('Jazz', 'Main'), getPlaylistRow('News', 'Intermediate')]},
+        'schedule': schedule}
+
+@pytest.fixture
+def stateB():
+    """ stateA, with zones and playlists added, edited and removed. """
+    schedule = [[] for dayIndex in range(7)]
+    schedule[0] = [['08:00', 'Morning'], ['21:00', 'Night']]
+    schedule[3] = [['18:00', 'Evening']]
+    schedule[6] = [['00:00', 'Night']]
+    return {
+        'zones': [['Morning', 'Wake-up music', 'Alice, Carol', ''],
+                  ['Night', '', '', 'Late'],
+                  ['Evening', 'After work', 'Dan', '']],
+        'playlists': [['Pop', '/music/pop/Pop.m3u'], ['Jazz', '/music/Jazz.m3u'],
+                      ['Spots', '/music/Spots.m3u'], ['Rock', '/music/Rock.m3u']],
+        'zoneInspector': {
+            'Morning': [getPlaylistRow('Pop', 'Main'),
+                        getPlaylistRow('Spots', 'Intermediate', 45)],
+            'Night': [getPlaylistRow('Jazz', 'Main')],
+            'Evening': [getPlaylistRow('Rock', 'Main'), getPlaylistRow('Spots', 'Intermediate')]},
+        'schedule': schedule}
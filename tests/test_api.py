@@ -0,0 +1,104 @@
+"""
+Tests of the API's mutation checks and transactions
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from contextlib import contextmanager
+import pytest
+from conftest import getModel, getPlaylistRow, normalizeState
+from api import ApiError, ApiServer
+from delta import applyDelta, getInverseDelta
+from jobs import JobScheduler
+from validator import Validator
+
+
+class StubView:
+    """ The parts of View that ApiServer uses, without a display. """
+
+    @contextmanager
+    def bulkChanges(self, changes):
+        yield
+
+    def queue_draw(self):
+        pass
+
+
+@pytest.fixture
+def server(stateA):
+    """ An ApiServer, not serving, whose Model holds stateA. """
+    model = getModel(stateA)
+    jobs = JobScheduler(1)
+    yield ApiServer(model, StubView(), Validator(model), None, jobs, 0)
+    jobs.shutdown()
+
+@pytest.mark.parametrize('mutation', [
+    ['editPlaylistInZone', ['Morning', getPlaylistRow('Spots', 'Intermediate'), 3, 2.5]],
+    ['editPlaylistInZone', ['Morning', getPlaylistRow('Spots', 'Intermediate'), 5, -2]],
+    ['editPlaylistInZone', ['Morning', getPlaylistRow('Pop', 'Main'), 0, 'Rock']],
+    ['addZoneToSchedule', [1, 'Evening', '18:00']],
+    ['addZoneToSchedule', [1, 'Morning', '8:00']],
+    ['addZoneToSchedule', [1, 'Morning', '25:00']],
+    ['editZoneInSchedule', [0, ['08:00', 'Morning'], 0, '08:00:00']],
+    ['editZoneInSchedule', [0, ['08:00', 'Morning'], 1, 'Evening']],
+    ['addPlaylistToZone', ['Evening', getPlaylistRow('Pop', 'Main')]],
+    ['addPlaylistToZone', ['Noon', getPlaylistRow('Rock', 'Main')]]])
+def testCheckMutationRejectsWhatTheGuiRejects(server, mutation):
+    with pytest.raises(ValueError):
+        server.checkMutation(*mutation)
+
+def testCheckMutationConvertsIntegralNumbers(server):
+    args = ['Morning', getPlaylistRow('Spots', 'Intermediate'), 3, 45.0]
+    server.checkMutation('editPlaylistInZone', args)
+    assert args[3] == 45 and isinstance(args[3], int)
+
+def testFailedTransactionLeavesStateUnchanged(server, stateA):
+    mutations = [
+        ['removeZoneFromDatabase', ['Noon']],
+        ['removePlaylistFromDatabase', ['News']],
+        ['removeZoneFromSchedule', [0, ['20:00', 'Night']]],
+        ['editPlaylistInZone', ['Morning', getPlaylistRow('Spots', 'Intermediate'), 3, 45]],
+        ['addZoneToDatabase', ['Evening', 'Dan', 'After work']],
+        ['addPlaylistToZone', ['Evening', getPlaylistRow('Jazz', 'Main')]],
+        ['addZoneToSchedule', [3, 'Evening', '6 PM']]]
+    with pytest.raises(ApiError) as raised:
+        server.applyTransaction(mutations)
+    assert raised.value.status == 409
+    assert 'mutation 6' in str(raised.value)
+    assert normalizeState(server.model.getState()) == normalizeState(stateA)
+
+def testInverseDeltasUndoMutations(stateA):
+    model = getModel(stateA)
+    mutations = [
+        ['removeZoneFromDatabase', ['Morning']],
+        ['editZoneNameInDatabase', ['Night', 'Late Night']],
+        ['editPlaylistInZone', ['Late Night', getPlaylistRow('News', 'Intermediate'), 3, 60]],
+        ['removePlaylistFromDatabase', ['Jazz']],
+        ['addPlaylistToDatabase', ['/music/Rock.m3u']],
+        ['addZoneToDatabase', ['Evening', 'Dan', 'After work', '']],
+        ['addPlaylistToZone', ['Evening', getPlaylistRow('Rock', 'Main')]],
+        ['editZoneInDatabase', ['Noon', 3, '']],
+        ['editPlaylistInDatabase', ['Rock', 1, '/music/rock/Rock.m3u']],
+        ['addZoneToSchedule', [4, 'Evening', '18:00']],
+        ['editZoneInSchedule', [4, ['18:00', 'Evening'], 0, '19:00']],
+        ['removeZoneFromSchedule', [6, ['00:00', 'Late Night']]]]
+    inverseDeltas = []
+    for operation, args in mutations:
+        inverseDeltas.append(getInverseDelta(model, operation, args))
+        model.applyMutation(operation, args)
+    for inverseDelta in reversed(inverseDeltas):
+        applyDelta(model, inverseDelta)
+    assert normalizeState(model.getState()) == normalizeState(stateA)
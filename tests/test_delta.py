@@ -0,0 +1,55 @@
+"""
+Tests of the deltas
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from conftest import getModel, getPlaylistRow, normalizeState
+from delta import MERGE, REPLACE, applyDelta, diffStates
+
+
+def testReplaceDeltaGivesIncomingState(stateA, stateB):
+    model = getModel(stateA)
+    applyDelta(model, diffStates(model.getState(), stateB, REPLACE))
+    assert normalizeState(model.getState()) == normalizeState(stateB)
+
+def testReplaceDeltaGivesIncomingStateBack(stateA, stateB):
+    model = getModel(stateB)
+    applyDelta(model, diffStates(model.getState(), stateA, REPLACE))
+    assert normalizeState(model.getState()) == normalizeState(stateA)
+
+def testMergeDeltaKeepsWhatIncomingStateLacks(stateA, stateB):
+    model = getModel(stateA)
+    applyDelta(model, diffStates(model.getState(), stateB, MERGE))
+    state = normalizeState(model.getState())
+    # Noon and News are only in stateA, and its schedule rows are kept
+    assert ('Noon', 'Lunch', 'Bob', 'Quiet') in state['zones']
+    assert ('News', '/music/News.m3u') in state['playlists']
+    assert ('12:00', 'Noon') in state['schedule'][2]
+    # What stateB has wins
+    assert ('Evening', 'After work', 'Dan', '') in state['zones']
+    assert ('Pop', '/music/pop/Pop.m3u') in state['playlists']
+    assert state['zoneInspector']['Night'] == normalizeState(stateB)['zoneInspector']['Night']
+
+def testDeltaOfEqualStatesIsEmpty(stateA):
+    assert diffStates(stateA, stateA, REPLACE) == []
+
+def testDeltaEditsChangedPlaylistSettingsInPlace(stateA, stateB):
+    delta = diffStates(stateA, stateB, REPLACE)
+    assert ['editPlaylistInZone',
+            ['Morning', getPlaylistRow('Spots', 'Intermediate'), 3, 45]] in delta
+    assert not any(operation == 'removePlaylistFromZone' and args[0] == 'Morning'
+                   for operation, args in delta)
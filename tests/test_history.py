@@ -0,0 +1,72 @@
+"""
+Tests of the History
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from datetime import datetime
+from conftest import getModel, normalizeState
+from history import ADDED, CHANGED, REMOVED, History
+
+
+def testCheckoutGivesRecordedState(stateA, stateB, tmp_path):
+    history = History(str(tmp_path))
+    firstVersionId = history.record(getModel(stateA).getSnapshot(), 'first')
+    secondVersionId = history.record(getModel(stateB).getSnapshot(), 'second')
+    assert normalizeState(history.checkout(firstVersionId)) == normalizeState(stateA)
+    assert normalizeState(history.checkout(secondVersionId)) == normalizeState(stateB)
+
+def testCheckoutReadsFromDisk(stateA, tmp_path):
+    versionId = History(str(tmp_path)).record(getModel(stateA).getSnapshot())
+    # A new History has nothing cached
+    assert normalizeState(History(str(tmp_path)).checkout(versionId)) ==\
+        normalizeState(stateA)
+
+def testUnchangedVersionChangesNoZones(stateA, tmp_path):
+    history = History(str(tmp_path))
+    snapshot = getModel(stateA).getSnapshot()
+    firstVersionId = history.record(snapshot, time=datetime(2018, 1, 1))
+    secondVersionId = history.record(snapshot, time=datetime(2018, 1, 8))
+    assert firstVersionId == secondVersionId
+    versions = history.getVersions()
+    assert [version['changes'] for version in versions] == [3, 0]
+    assert [version['time'] for version in versions] ==\
+        ['2018-01-01T00:00:00', '2018-01-08T00:00:00']
+
+def testZoneHistory(stateA, stateB, tmp_path):
+    history = History(str(tmp_path))
+    history.record(getModel(stateA).getSnapshot())
+    history.record(getModel(stateB).getSnapshot())
+    assert [change['change'] for change in history.getZoneHistory('Morning')] ==\
+        [ADDED, CHANGED]
+    assert [change['change'] for change in history.getZoneHistory('Noon')] ==\
+        [ADDED, REMOVED]
+    assert [change['change'] for change in history.getZoneHistory('Evening')] == [ADDED]
+    lastChange = history.getZoneHistory('Morning')[-1]
+    assert history.getZone(lastChange['chunk'])['zone'] ==\
+        ['Morning', 'Wake-up music', 'Alice, Carol', '']
+
+def testCorruptLastVersionCountsAsNoVersion(stateA, stateB, tmp_path):
+    history = History(str(tmp_path))
+    versionId = history.record(getModel(stateA).getSnapshot())
+    with open(history.getChunkPath(versionId), 'ab') as chunkFile:
+        chunkFile.write(b' ')
+    # A new History reads the last version from disk, and finds it corrupt
+    history = History(str(tmp_path))
+    history.record(getModel(stateB).getSnapshot())
+    assert [version['changes'] for version in history.getVersions()] == [3, 3]
+    assert [change['change'] for change in history.getZoneHistory('Morning')] ==\
+        [ADDED, ADDED]
@@ -0,0 +1,124 @@
+"""
+Tests of the job scheduler
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from threading import Event
+from time import monotonic, sleep
+import pytest
+import jobs
+from jobs import DONE, FAILED, MODEL, QUEUED, RUNNING, JobScheduler
+
+
+""" There is no main loop here: what the jobs post is delivered by calling deliver(). """
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(jobs, 'idle_add', lambda function: None)
+    scheduler = JobScheduler(3)
+    yield scheduler
+    scheduler.shutdown()
+
+def waitFor(condition):
+    """ Wait until condition() is true, for a few seconds at most. """
+    deadline = monotonic() + 5
+    while not condition():
+        assert monotonic() < deadline, 'timed out'
+        sleep(0.01)
+
+def submitBlocked(scheduler, name, resources, started):
+    """ Submit a job that records its start in started and waits for its release. """
+    release = Event()
+    def function():
+        started.append(name)
+        release.wait(5)
+    return scheduler.submit(name, function, resources=resources), release
+
+def testJobsOfAResourceRunInOrder(scheduler):
+    started = []
+    first, releaseFirst = submitBlocked(scheduler, 'first', (MODEL,), started)
+    second, releaseSecond = submitBlocked(scheduler, 'second', (MODEL,), started)
+    other, releaseOther = submitBlocked(scheduler, 'other', (), started)
+    # The job that uses nothing does not wait for the Model's jobs
+    waitFor(lambda: 'other' in started)
+    assert (first.status, second.status) == (RUNNING, QUEUED)
+    assert scheduler.isBusy(MODEL)
+    releaseFirst.set()
+    waitFor(lambda: second.status == RUNNING)
+    releaseSecond.set()
+    releaseOther.set()
+    waitFor(lambda: not scheduler.getJobs())
+    assert started.index('first') < started.index('second')
+    assert not scheduler.isBusy(MODEL)
+
+def testBlockedJobKeepsItsResourcesFromLaterJobs(scheduler):
+    started = []
+    first, releaseFirst = submitBlocked(scheduler, 'first', (MODEL,), started)
+    second, releaseSecond = submitBlocked(scheduler, 'second', (MODEL, 'history'), started)
+    third, releaseThird = submitBlocked(scheduler, 'third', ('history',), started)
+    waitFor(lambda: started == ['first'])
+    # The history is free, but the second job waits for it, and it came first
+    assert (second.status, third.status) == (QUEUED, QUEUED)
+    releaseFirst.set()
+    waitFor(lambda: started == ['first', 'second'])
+    assert third.status == QUEUED
+    releaseSecond.set()
+    waitFor(lambda: started == ['first', 'second', 'third'])
+    releaseThird.set()
+    waitFor(lambda: third.status == DONE)
+
+def testPoolIsBounded(scheduler):
+    started = []
+    submitted = [submitBlocked(scheduler, str(index), (), started) for index in range(4)]
+    waitFor(lambda: len(started) == 3)
+    sleep(0.05)
+    assert len(started) == 3
+    assert [job.status for job, release in submitted].count(QUEUED) == 1
+    for job, release in submitted:
+        release.set()
+    waitFor(lambda: all(job.status == DONE for job, release in submitted))
+
+def testOnDoneIsCalledOnDelivery(scheduler):
+    done = []
+    job = scheduler.submit('add', lambda a, b: a + b, 1, 2, onDone=done.append)
+    waitFor(lambda: scheduler.posted)
+    assert done == []
+    scheduler.deliver()
+    assert done == [job] and job.result == 3
+
+def testCallInMainLoopReturnsAndRaises(scheduler):
+    def function():
+        assert scheduler.callInMainLoop(lambda: 'result') == 'result'
+        scheduler.callInMainLoop(int, 'not a number')
+    job = scheduler.submit('call', function)
+    waitFor(lambda: scheduler.posted)
+    scheduler.deliver()
+    waitFor(lambda: scheduler.posted)
+    scheduler.deliver()
+    waitFor(lambda: job.status == FAILED)
+    assert isinstance(job.error, ValueError)
+
+def testCallInMainLoopStopsOnShutdown(monkeypatch):
+    monkeypatch.setattr(jobs, 'idle_add', lambda function: None)
+    scheduler = JobScheduler(1)
+    job = scheduler.submit('call', scheduler.callInMainLoop, lambda: None)
+    waitFor(lambda: scheduler.posted)
+    # Nothing is delivered, so only the shutdown ends the wait
+    scheduler.shutdown()
+    assert job.status == FAILED
+    assert isinstance(job.error, RuntimeError)
@@ -0,0 +1,89 @@
+"""
+Tests of the edit journal
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from conftest import getModel, getPlaylistRow, normalizeState
+from helpers import Playlist
+from journal import COMPACTION_THRESHOLD, Journal
+from model import Model
+
+
+def recordEdits(model, directory):
+    """ Journal a few edits of model in directory, and leave the journal open. """
+    journal = Journal(model, directory)
+    journal.open()
+    model.addMutationListener(journal.record)
+    model.addZoneToDatabase('Evening', 'Dan', 'After work')
+    model.addPlaylistToZone('Evening', Playlist.fromRow(getPlaylistRow('Jazz', 'Main')))
+    model.addZoneToSchedule(3, 'Evening', '18:00')
+    model.removeZoneFromDatabase(model.getZoneRow('Noon'))
+    journal.sync()
+    return journal
+
+def testRecoverReplaysJournal(stateA, tmp_path):
+    model = getModel(stateA)
+    recordEdits(model, str(tmp_path))
+    recoveredModel = Model()
+    assert Journal(recoveredModel, str(tmp_path)).recover() == 4
+    assert normalizeState(recoveredModel.getState()) == normalizeState(model.getState())
+
+def testRecoverSkipsTornLastRecord(stateA, tmp_path):
+    model = getModel(stateA)
+    journal = recordEdits(model, str(tmp_path))
+    # A crash in the middle of a write leaves half a record
+    with open(journal.getJournalPath(journal.generation), 'a') as journalFile:
+        journalFile.write('["addZoneToDatabase",["Nig')
+    recoveredModel = Model()
+    assert Journal(recoveredModel, str(tmp_path)).recover() == 4
+    assert normalizeState(recoveredModel.getState()) == normalizeState(model.getState())
+
+def testRecoverAfterCompaction(stateA, tmp_path):
+    model = getModel(stateA)
+    journal = recordEdits(model, str(tmp_path))
+    journal.compact()
+    model.editZoneInDatabase(model.getZoneRow('Evening'), 3, 'Moved')
+    journal.sync()
+    recoveredModel = Model()
+    # Only the edit after the snapshot is replayed
+    assert Journal(recoveredModel, str(tmp_path)).recover() == 1
+    assert normalizeState(recoveredModel.getState()) == normalizeState(model.getState())
+
+def testAutosaveDoesNotCompactWhileModelIsBusy(stateA, tmp_path):
+    model = getModel(stateA)
+    busy = [True]
+    journal = Journal(model, str(tmp_path), lambda: busy[0])
+    journal.open()
+    generation = journal.generation
+    # A job mutates the Model, and autosave runs on the main loop before the record
+    def autosaveBeforeRecord(operation, args):
+        journal.recordsSinceSnapshot = COMPACTION_THRESHOLD
+        journal.autosave()
+    model.addMutationListener(autosaveBeforeRecord)
+    model.addMutationListener(journal.record)
+    model.addZoneToDatabase('Evening', 'Dan', 'After work')
+    assert journal.generation == generation
+    recoveredModel = Model()
+    # The mutation is replayed once, from the journal
+    assert Journal(recoveredModel, str(tmp_path)).recover() == 1
+    assert normalizeState(recoveredModel.getState()) == normalizeState(model.getState())
+    busy[0] = False
+    journal.autosave()
+    assert journal.generation == generation + 1
+    recoveredModel = Model()
+    assert Journal(recoveredModel, str(tmp_path)).recover() == 0
+    assert normalizeState(recoveredModel.getState()) == normalizeState(model.getState())
@@ -0,0 +1,63 @@
+"""
+Tests of the Model
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pytest
+from conftest import getModel, getPlaylistRow, normalizeState
+from helpers import UNSET, Playlist, parseSetting
+
+
+def testLoadStateRefillsDisplayedStore(stateA, stateB):
+    model = getModel(stateA)
+    store = model.getZoneInspectorStore('Morning')
+    model.loadState(stateB)
+    # Zone Inspector's view keeps displaying the same store
+    assert model.getZoneInspectorStore('Morning') is store
+    assert sorted(tuple(row) for row in store) ==\
+        normalizeState(stateB)['zoneInspector']['Morning']
+    assert normalizeState(model.getState()) == normalizeState(stateB)
+
+def testLoadStateDropsStoresOfRemovedZones(stateA, stateB):
+    model = getModel(stateA)
+    store = model.getZoneInspectorStore('Noon')
+    model.loadState(stateB)
+    assert len(store) == 0
+    assert 'Noon' not in model.zoneInspector
+
+def testRowsWithoutStoreRefuseStorePaths(stateA):
+    model = getModel(stateA)
+    with pytest.raises(TypeError):
+        model.zoneInspector.getRow('Noon', '0')
+
+def testRowsWithoutStoreAreEditedByIndex(stateA):
+    model = getModel(stateA)
+    rowReference = model.zoneInspector.findRow('Morning',
+                                               getPlaylistRow('Spots', 'Intermediate'))
+    model.editPlaylistInZone('Morning', rowReference, 3, 50)
+    assert model.getZoneInspectorValue('Morning', rowReference, 3) == 50
+    model.addPlaylistToZone('Morning', Playlist.fromRow(getPlaylistRow('News', 'Fallback')))
+    assert model.getFallbackPlaylistRow('Morning')[0] == 'News'
+
+def testParseSettingRejectsNegativeSettings():
+    # A negative setting would read back as unset
+    with pytest.raises(ValueError):
+        parseSetting(3, '-1')
+    with pytest.raises(ValueError):
+        parseSetting(7, '-0.5')
+    assert parseSetting(4, ' ') == UNSET
+    assert parseSetting(8, '0.0') == 0.0
@@ -0,0 +1,109 @@
+"""
+Tests of the publisher
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import pytest
+import publisher
+from publisher import PUBLISH_ATTEMPTS, Publisher, openAtomically, writeAtomically
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """ Answer PUTs with the status in their path: /201, /404, /503, ... """
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, body))
+        self.send_response(int(self.path.split('/')[1]))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    """ An HTTP server on localhost that records the requests it is sent. """
+    monkeypatch.setattr(publisher, 'RETRY_DELAY_SECS', 0)
+    httpServer = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    httpServer.requests = []
+    thread = Thread(target=httpServer.serve_forever, daemon=True)
+    thread.start()
+    yield httpServer
+    httpServer.shutdown()
+    httpServer.server_close()
+
+def getUrl(server, path):
+    return 'http://127.0.0.1:' + str(server.server_address[1]) + path
+
+def testWriteAtomicallyReplacesFile(tmp_path):
+    path = tmp_path / 'schedule.xml'
+    path.write_bytes(b'old')
+    writeAtomically(str(path), b'new')
+    assert path.read_bytes() == b'new'
+    assert [entry.name for entry in tmp_path.iterdir()] == ['schedule.xml']
+
+def testWriteAtomicallyCompresses(tmp_path):
+    path = tmp_path / 'schedule.xml.gz'
+    writeAtomically(str(path), b'<WeekSchedule/>')
+    assert gzip.decompress(path.read_bytes()) == b'<WeekSchedule/>'
+
+def testFailedWriteLeavesOldFile(tmp_path):
+    path = tmp_path / 'schedule.xml'
+    path.write_bytes(b'old')
+    with pytest.raises(RuntimeError):
+        with openAtomically(str(path)) as writer:
+            writer.write(b'half of the new')
+            raise RuntimeError('serialization failed')
+    assert path.read_bytes() == b'old'
+    # The temporary file is removed
+    assert [entry.name for entry in tmp_path.iterdir()] == ['schedule.xml']
+
+def testPublishToDirectory(tmp_path):
+    results = Publisher([str(tmp_path)], 'schedule.xml').publish(b'<WeekSchedule/>')
+    assert results[0].succeeded and results[0].attempts == 1
+    assert (tmp_path / 'schedule.xml').read_bytes() == b'<WeekSchedule/>'
+
+def testPublishPutsToServer(server):
+    publisherOfSchedule = Publisher([getUrl(server, '/201/')], 'schedule.xml')
+    results = publisherOfSchedule.publish(b'<WeekSchedule/>')
+    publisherOfSchedule.close()
+    assert results[0].succeeded and results[0].attempts == 1
+    assert server.requests == [('/201/schedule.xml', b'<WeekSchedule/>')]
+
+def testRejectedPublishIsNotRetried(server):
+    results = Publisher([getUrl(server, '/404')], 'schedule.xml').publish(b'x')
+    assert not results[0].succeeded and results[0].attempts == 1
+    assert 'HTTP 404' in results[0].message
+    assert len(server.requests) == 1
+
+def testFailedPublishIsRetried(server):
+    results = Publisher([getUrl(server, '/503')], 'schedule.xml').publish(b'x')
+    assert not results[0].succeeded and results[0].attempts == PUBLISH_ATTEMPTS
+    assert 'HTTP 503' in results[0].message
+    assert len(server.requests) == PUBLISH_ATTEMPTS
+
+@pytest.mark.parametrize('target', ['http://', 'http:///schedule.xml',
+                                    'http://127.0.0.1:port/'])
+def testMalformedTargetFailsAtOnce(target):
+    results = Publisher([target], 'schedule.xml').publish(b'x')
+    assert not results[0].succeeded and results[0].attempts == 1
+    assert results[0].message.startswith('invalid target')
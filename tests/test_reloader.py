@@ -0,0 +1,139 @@
+"""
+Tests of the reloader's three-way merge
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from contextlib import contextmanager
+from copy import deepcopy
+import pytest
+from conftest import getModel
+from reloader import Reloader
+from validator import Validator
+
+
+class StubView:
+    """ The parts of View that Reloader uses, without a display. """
+
+    @contextmanager
+    def bulkChanges(self, changes):
+        yield
+
+    def queue_draw(self):
+        pass
+
+
+class StubXml:
+    """ Reads fileState, whatever the file holds, or raises error if set. """
+
+    xmlSchema = None
+
+    def __init__(self, fileState):
+        self.fileState = fileState
+        self.error = None
+
+    def parseXML(self, path):
+        return self
+
+    def getroot(self):
+        return self
+
+    def readState(self, root):
+        if self.error is not None:
+            raise self.error
+        return deepcopy(self.fileState)
+
+
+class ImmediateJobs:
+    """ Runs jobs and main loop calls at once, on the calling thread. """
+
+    def submit(self, name, function, *args, **keywords):
+        function(*args)
+
+    def post(self, function, *args):
+        function(*args)
+
+
+@pytest.fixture
+def fileState(stateA):
+    """ stateA, as edited by another tool: Pop moved and Noon described. """
+    fileState = deepcopy(stateA)
+    fileState['playlists'][0] = ['Pop', '/music/pop/Pop.m3u']
+    fileState['zones'][1] = ['Noon', 'Lunch break', 'Bob', 'Quiet']
+    return fileState
+
+@pytest.fixture
+def reloader(stateA, fileState, tmp_path):
+    """ A Reloader of a Model that holds stateA, as last read from its file. """
+    path = tmp_path / 'schedule.xml'
+    path.write_bytes(b'<WeekSchedule/>')
+    model = getModel(stateA)
+    reloader = Reloader(model, StubView(), Validator(model), StubXml(fileState),
+                        ImmediateJobs())
+    reloader.path = str(path)
+    reloader.baseState = deepcopy(stateA)
+    return reloader
+
+def getZone(model, zoneName):
+    return list(model.zones[model.getZoneRow(zoneName)])
+
+def testReloadKeepsLocalEdits(reloader, fileState):
+    model = reloader.model
+    model.editZoneInDatabase(model.getZoneRow('Night'), 3, 'Local')
+    reloader.startReload()
+    assert list(model.playlists[model.getPlaylistRow('Pop')]) == ['Pop', '/music/pop/Pop.m3u']
+    assert getZone(model, 'Noon')[1] == 'Lunch break'
+    assert getZone(model, 'Night')[3] == 'Local'
+    assert reloader.baseState == fileState and not reloader.reloading
+
+@pytest.mark.parametrize('overwrite, description', [(False, 'Local lunch'),
+                                                    (True, 'Lunch break')])
+def testConflictsAreLeftToTheUser(reloader, overwrite, description):
+    model = reloader.model
+    model.editZoneInDatabase(model.getZoneRow('Noon'), 1, 'Local lunch')
+    asked = []
+    reloader.askToOverwrite = lambda conflicts: asked.append(conflicts) or overwrite
+    reloader.startReload()
+    assert len(asked) == 1
+    assert getZone(model, 'Noon')[1] == description
+    # Changes without conflicts are applied either way
+    assert list(model.playlists[model.getPlaylistRow('Pop')]) == ['Pop', '/music/pop/Pop.m3u']
+
+def testEditDuringConflictDialogRestartsReload(reloader):
+    model = reloader.model
+    model.editZoneInDatabase(model.getZoneRow('Noon'), 1, 'Local lunch')
+    asked = []
+    def askToOverwrite(conflicts):
+        asked.append(conflicts)
+        if len(asked) == 1:
+            # The user edits another zone while the dialog is up
+            model.editZoneInDatabase(model.getZoneRow('Night'), 3, 'Local')
+        return True
+    reloader.askToOverwrite = askToOverwrite
+    reloader.startReload()
+    assert len(asked) == 2
+    assert getZone(model, 'Noon')[1] == 'Lunch break'
+    assert getZone(model, 'Night')[3] == 'Local'
+    assert not reloader.reloading
+
+def testFailedReloadEnds(reloader, stateA):
+    reloader.xml.error = ValueError('not a number')
+    reloader.startReload()
+    assert not reloader.reloading
+    assert reloader.baseState == stateA
+    reloader.xml.error = None
+    reloader.startReload()
+    assert getZone(reloader.model, 'Noon')[1] == 'Lunch break'
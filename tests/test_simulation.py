@@ -0,0 +1,63 @@
+"""
+Tests of the playout simulation
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from conftest import getPlaylistRow
+from onair import MINUTES_PER_DAY
+from simulation import expandTimeline, simulateWeek
+
+
+def getState(schedule):
+    """ Return a state with Morning and Night, each inserting Spots every 30 minutes. """
+    return {
+        'zones': [['Morning', '', '', ''], ['Night', '', '', '']],
+        'playlists': [['Pop', '/music/Pop.m3u'], ['Jazz', '/music/Jazz.m3u'],
+                      ['Spots', '/music/Spots.m3u']],
+        'zoneInspector': {
+            'Morning': [getPlaylistRow('Pop', 'Main'), getPlaylistRow('Spots', 'Intermediate')],
+            'Night': [getPlaylistRow('Jazz', 'Main'), getPlaylistRow('Spots', 'Intermediate')]},
+        'schedule': schedule}
+
+def testUnknownZoneEndsThePreviousOne():
+    schedule = [[] for dayIndex in range(7)]
+    schedule[0] = [['08:00', 'Morning'], ['10:00', 'Ghost']]
+    state = getState(schedule)
+    zoneIndices = {'Morning': 0, 'Night': 1}
+    zoneOfMinute, elapsedMins = expandTimeline(state, zoneIndices)
+    assert zoneOfMinute[10 * 60 - 1] == 0
+    assert zoneOfMinute[10 * 60] == 2
+    simulation = simulateWeek(state, itemMins=3)
+    # Morning is on air for two hours only, and Spots inserts at 30, 60 and 90 minutes
+    assert simulation.playlistInserts['Spots'][0] == 3
+    assert simulation.playlistAirtimeMins['Pop'][0] == 120 - 3 * 3
+    assert 'Jazz' not in simulation.playlistAirtimeMins
+
+def testSundayZoneIsOnAirUntilMondaysFirstStart():
+    schedule = [[] for dayIndex in range(7)]
+    schedule[0] = [['01:00', 'Morning']]
+    schedule[6] = [['23:00', 'Night']]
+    zoneOfMinute, elapsedMins = expandTimeline(getState(schedule), {'Morning': 0, 'Night': 1})
+    assert zoneOfMinute[0] == 1 and elapsedMins[0] == 60
+    assert zoneOfMinute[59] == 1 and elapsedMins[59] == 119
+    assert zoneOfMinute[60] == 0 and elapsedMins[60] == 0
+    assert zoneOfMinute[6 * MINUTES_PER_DAY + 23 * 60] == 1
+    simulation = simulateWeek(getState(schedule))
+    # Night inserts at 23:30 on Sunday, then at 00:00 and 00:30 on Monday
+    assert simulation.hourlyInserts[0][7 * 24 - 1] == 1
+    assert simulation.hourlyInserts[0][0] == 2
+    assert simulation.playlistAirtimeMins['Jazz'][0] > 0
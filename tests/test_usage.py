@@ -0,0 +1,59 @@
+"""
+Tests of the usage index
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+from conftest import getModel, getPlaylistRow
+from helpers import Playlist
+from usage import UsageIndex
+
+
+def assertSameUsage(usageIndex, model, playlistNames):
+    rebuiltIndex = UsageIndex(model)
+    assert usageIndex.getMatrix() == rebuiltIndex.getMatrix()
+    for playlistName in playlistNames:
+        assert usageIndex.getUsage(playlistName) == rebuiltIndex.getUsage(playlistName)
+        assert usageIndex.isUnused(playlistName) == rebuiltIndex.isUnused(playlistName)
+
+def testIncrementalUsageEqualsRebuild(stateA):
+    model = getModel(stateA)
+    usageIndex = UsageIndex(model)
+    model.addPlaylistToDatabase('/music/Rock.m3u')
+    model.addZoneToDatabase('Evening')
+    model.addPlaylistToZone('Evening', Playlist.fromRow(getPlaylistRow('Rock', 'Main')))
+    model.addPlaylistToZone('Evening', Playlist.fromRow(getPlaylistRow('Jazz', 'Fallback')))
+    model.addZoneToSchedule(3, 'Evening', '18:00')
+    model.addZoneToSchedule(4, 'Evening', '18:00')
+    model.editZoneNameInDatabase('Night', 'Late Night')
+    model.removePlaylistFromDatabase(model.getPlaylistRow('Spots'))
+    model.removeZoneFromSchedule(2, model.getRowOfValuesInModel(['12:00', 'Noon'],
+                                                                model.schedule[2]))
+    model.removeZoneFromDatabase(model.getZoneRow('Morning'))
+    # Deliver the batched change events, as the main loop would
+    model.changes.deliver()
+    assertSameUsage(usageIndex, model, ['Pop', 'Jazz', 'Spots', 'News', 'Rock'])
+    assert usageIndex.isUnused('Pop')
+    # Noon, Late Night and Evening, on air twice each, but Noon no more
+    assert usageIndex.getUsage('Jazz') == (3, 4)
+
+def testUsageFollowsLoadState(stateA, stateB):
+    model = getModel(stateA)
+    usageIndex = UsageIndex(model)
+    model.loadState(stateB)
+    model.addZoneToSchedule(5, 'Evening', '18:00')
+    model.changes.deliver()
+    assertSameUsage(usageIndex, model, ['Pop', 'Jazz', 'Spots', 'News', 'Rock'])
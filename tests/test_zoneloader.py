@@ -0,0 +1,70 @@
+"""
+Tests of the Zone Loader
+
+Copyright (C) 2018 Elias Papavasileiou <eliaspap@protonmail.com>
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import pytest
+from zoneloader import ZoneTableError, getZoneTableDelta, readZoneTable
+
+
+def getState(playlistNames):
+    return {'zones': [['Morning', '', '', '']],
+            'playlists': [[playlistName, '/music/' + playlistName + '.m3u']
+                          for playlistName in playlistNames],
+            'zoneInspector': {'Morning': []}, 'schedule': [[] for dayIndex in range(7)]}
+
+def testReadCsvTableWithHeader(tmp_path):
+    tablePath = tmp_path / 'zones.csv'
+    tablePath.write_text('name,description,maintainers,comments,playlists\n'
+                         'Noon,"Lunch, quiet",Bob,,Jazz;News\n', encoding='utf-8')
+    assert readZoneTable(str(tablePath)) ==\
+        [(2, ['Noon', 'Lunch, quiet', 'Bob', '', 'Jazz;News'])]
+
+def testReadTsvTable(tmp_path):
+    tablePath = tmp_path / 'zones.tsv'
+    tablePath.write_text('Noon\tLunch\n', encoding='utf-8')
+    assert readZoneTable(str(tablePath)) == [(1, ['Noon', 'Lunch'])]
+
+def testDeltaAddsZonesWithTheirPlaylists():
+    delta = getZoneTableDelta([(1, ['Noon', 'Lunch', 'Bob', '', 'Jazz; News'])],
+                              getState(['Jazz', 'News', 'Spots']))
+    assert delta[0] == ['addZoneToDatabase', ['Noon', 'Bob', 'Lunch', '']]
+    addedPlaylists = [(args[1][0], args[1][1]) for operation, args in delta[1:]]
+    assert addedPlaylists == [('Spots', 'Intermediate'), ('Jazz', 'Main'),
+                              ('News', 'Intermediate')]
+
+def testEveryProblemIsReported():
+    numberedRows = [
+        (1, ['Morning']),
+        (2, ['', 'Nameless']),
+        (3, ['Noon', '', '', '', 'Rock']),
+        (4, ['Night']),
+        (5, ['Night']),
+        (6, ['Late', '', '', '', 'Spots;Jazz']),
+        (7, ['Early', '', '', '', 'Jazz;A;B;C']),
+        (8, ['a', 'b', 'c', 'd', 'e', 'f'])]
+    with pytest.raises(ZoneTableError) as error:
+        getZoneTableDelta(numberedRows, getState(['Jazz', 'Spots', 'Jingles', 'A', 'B', 'C']))
+    problems = error.value.problems
+    assert len(problems) == 7
+    assert problems[0].startswith('line 1: ') and 'already exists' in problems[0]
+    assert problems[1].startswith('line 2: ') and 'no name' in problems[1]
+    assert problems[2].startswith('line 3: ') and 'does not exist' in problems[2]
+    assert problems[3].startswith('line 5: ') and 'already on line 4' in problems[3]
+    assert problems[4].startswith('line 6: ') and 'duplicate playlist "Spots"' in problems[4]
+    assert problems[5].startswith('line 7: ') and 'too many Intermediate' in problems[5]
+    assert problems[6].startswith('line 8: ') and 'columns' in problems[6]